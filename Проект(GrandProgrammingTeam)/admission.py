@@ -0,0 +1,152 @@
+"""Допуск запросов анализа: общий лимит, справедливость между пользователями и очередь.
+
+Анализ документа занимает рабочий поток на секунды или минуты. Без ограничений
+один пользователь, отправивший подряд несколько больших документов, занимает все
+потоки процесса. Поэтому перед анализом запрос получает допуск:
+
+- корзина токенов пользователя (token bucket). Стоимость запроса - число страниц
+  документа (не больше USER_BURST_PAGES). Корзина пополняется на
+  USER_PAGES_PER_SECOND страниц в секунду до USER_BURST_PAGES. Если страниц
+  не хватает, запрос получает 429 и Retry-After: через сколько секунд их хватит;
+- общий лимит одновременных анализов MAX_CONCURRENT;
+- очередь ожидания не длиннее MAX_QUEUE. Освободившееся место получает самый
+  дешевый из ожидающих запросов (меньше страниц). Каждая секунда ожидания
+  снижает стоимость на AGING_PAGES_PER_SECOND, поэтому большой документ не
+  ждет бесконечно. Если очередь заполнена или ожидание дольше MAX_WAIT,
+  запрос получает 429 и Retry-After по средней скорости анализа.
+
+Ограничения действуют в пределах процесса: в serve.py у каждого рабочего
+процесса свои.
+"""
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+MAX_CONCURRENT = min(4, os.cpu_count() or 1)
+MAX_QUEUE = 16
+MAX_WAIT = 120
+USER_BURST_PAGES = 100
+USER_PAGES_PER_SECOND = 0.5
+AGING_PAGES_PER_SECOND = 1.0
+# Начальная оценка времени анализа страницы (уточняется по завершенным анализам)
+SECONDS_PER_PAGE = 1.0
+
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен к анализу; retry_after - через сколько секунд повторить"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(f'{message}. Повторите через {retry_after} с')
+        self.retry_after = retry_after
+
+
+def count_pages(source) -> int:
+    """Число страниц PDF (путь или содержимое в памяти; читается только дерево страниц);
+    1, если файл не открывается"""
+    from itog import open_pdf
+
+    try:
+        with open_pdf(source) as pdf:
+            return max(1, pdf.page_count)
+    except Exception:
+        return 1  # ошибку файла сообщит сам анализ
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT, max_queue: int = MAX_QUEUE,
+                 max_wait: float = MAX_WAIT, user_burst: float = USER_BURST_PAGES,
+                 user_rate: float = USER_PAGES_PER_SECOND, aging: float = AGING_PAGES_PER_SECOND):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.user_burst = user_burst
+        self.user_rate = user_rate
+        self.aging = aging
+        self._condition = threading.Condition()
+        self._active = 0
+        self._active_pages = 0
+        # Очередь ожидания: куча (стоимость с учетом ожидания, номер, страницы)
+        self._waiting = []
+        self._sequence = itertools.count()
+        # Корзины пользователей: {пользователь: (страниц, время пополнения)}
+        self._buckets = {}
+        self._seconds_per_page = SECONDS_PER_PAGE
+
+    def _take_tokens(self, user_key, cost: float, now: float):
+        tokens, updated = self._buckets.get(user_key, (self.user_burst, now))
+        tokens = min(self.user_burst, tokens + (now - updated) * self.user_rate)
+        if tokens < cost:
+            self._buckets[user_key] = (tokens, now)
+            raise AdmissionRejected('Превышен лимит анализа страниц для пользователя',
+                                    math.ceil((cost - tokens) / self.user_rate))
+        self._buckets[user_key] = (tokens - cost, now)
+
+    def _return_tokens(self, user_key, cost: float):
+        tokens, updated = self._buckets[user_key]
+        self._buckets[user_key] = (min(self.user_burst, tokens + cost), updated)
+
+    def _busy_retry_after(self) -> int:
+        """Оценка времени, за которое освободится место: страницы в работе и в очереди
+        по средней скорости анализа страницы"""
+        pages = self._active_pages + sum(entry[2] for entry in self._waiting)
+        return max(1, math.ceil(pages * self._seconds_per_page / self.max_concurrent))
+
+    def _enter(self, user_key, pages: int):
+        cost = min(max(1, pages), self.user_burst)
+        with self._condition:
+            now = time.monotonic()
+            if self._active < self.max_concurrent and not self._waiting:
+                self._take_tokens(user_key, cost, now)
+                self._active += 1
+                self._active_pages += pages
+                return
+            if len(self._waiting) >= self.max_queue:
+                raise AdmissionRejected('Сервер занят: очередь анализа заполнена', self._busy_retry_after())
+            self._take_tokens(user_key, cost, now)
+
+            # Стоимость с учетом ожидания: pages - (t - now) * aging = (pages + now * aging) - t * aging.
+            # Вычитаемое t * aging у всех ожидающих общее, поэтому ключ кучи - pages + now * aging:
+            # запрос, пришедший раньше, при той же стоимости получает место раньше
+            entry = (pages + now * self.aging, next(self._sequence), pages)
+            heapq.heappush(self._waiting, entry)
+            deadline = now + self.max_wait
+            while self._active >= self.max_concurrent or self._waiting[0] is not entry:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._return_tokens(user_key, cost)
+                    self._condition.notify_all()
+                    raise AdmissionRejected('Сервер занят: время ожидания в очереди истекло',
+                                            self._busy_retry_after())
+                self._condition.wait(remaining)
+            heapq.heappop(self._waiting)
+            self._active += 1
+            self._active_pages += pages
+            # Мест может быть свободно несколько - проверяет следующий в очереди
+            self._condition.notify_all()
+
+    def _leave(self, pages: int, seconds: float):
+        with self._condition:
+            self._active -= 1
+            self._active_pages -= pages
+            # Скользящее среднее времени анализа страницы - для Retry-After
+            self._seconds_per_page = 0.8 * self._seconds_per_page + 0.2 * seconds / max(1, pages)
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, user_key, pages: int):
+        """Допуск к анализу документа из pages страниц; AdmissionRejected - ответить 429"""
+        self._enter(user_key, pages)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._leave(pages, time.monotonic() - started)
+
+
+analysis_admission = AdmissionController()
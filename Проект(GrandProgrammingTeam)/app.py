@@ -1,35 +1,232 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import Flask, Blueprint, Response, render_template, request, jsonify, session, redirect, url_for, send_file, current_app, stream_with_context
+import hashlib
+import json
 import os
+import shutil
 import uuid
-import sqlite3
+from contextlib import ExitStack
+from urllib.parse import quote
 from werkzeug.utils import secure_filename
 
+import settings
+
 # Импортируем систему аутентификации
 from auth import auth_system
 
 # Импортируем Blueprint нормоконтроля
-from normcontrol import normcontrol_bp
+from normcontrol import normcontrol_bp, AnalysisRequest, upload_buffer
+
+# Импортируем функционал из itog.py (PyMuPDF загружается при первом анализе)
+from itog import doc_analyzer, rule_engine, allowed_file, Config, DESIGNATIONS
+
+# События для обновления страниц без перезагрузки (server-sent events)
+from events import event_broker, stream_events
+
+from ttl_cache import TTLCache
+
+from document_search import index_document, search_fields_from_text_data
+from designation_codes import document_designations, index_designations, normalize_designation
+from workload_stats import record_document_violations
+import chunked_upload
+import batch_upload
+from admission import analysis_admission, AdmissionRejected, count_pages
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# Маршруты веб-интерфейса; приложение собирается в create_app()
+web_bp = Blueprint('web', __name__)
+
+class NormcontrolRequest(AnalysisRequest):
+    @property
+    def max_content_length(self):
+        # Пакет чертежей (много PDF или ZIP) больше общего ограничения MAX_CONTENT_LENGTH
+        if self.endpoint == 'web.analyze_batch':
+            return batch_upload.BATCH_MAX_CONTENT_LENGTH
+        return super().max_content_length
+
+@web_bp.app_context_processor
+def inject_status_groups():
+    """Статусы очереди нормоконтроля - для обновления счетчиков на страницах по событиям"""
+    return {'CONTROLLER_QUEUE_STATUSES': auth_system.CONTROLLER_QUEUE_STATUSES}
+
+def store_page_features(storage_file_path, text_data):
+    """Сохранение признаков страниц рядом с документом для повторных проверок"""
+    from page_features import save_features
+    
+    try:
+        save_features(storage_file_path, text_data)
+    except Exception as e:
+        # Признаки - только кэш: при ошибке повторная проверка разберет PDF заново
+        print(f"⚠️ Не удалось сохранить признаки страниц {storage_file_path}: {e}")
+
+def remove_page_features(storage_file_path):
+    """Удаление признаков страниц вместе с документом"""
+    from page_features import remove_features
+    remove_features(storage_file_path)
+
+def schedule_page_previews(storage_file_path):
+    """Фоновый рендер миниатюр и тайлов страниц для экрана проверки"""
+    from page_previews import schedule_previews
+    schedule_previews(storage_file_path)
+
+def remove_page_previews(storage_file_path):
+    """Удаление превью страниц вместе с документом"""
+    from page_previews import remove_previews
+    remove_previews(storage_file_path)
+
+def publish_document_event(event_type, document_id, previous_status=None, **extra):
+    """Уведомление владельца документа и нормоконтролёров (если документ в их очереди) об изменении документа"""
+    document = auth_system.get_document(document_id)
+    if not document:
+        return
+    data = {
+        'document_id': document['id'],
+        'filename': document['original_filename'],
+        'status': document['status'],
+        'previous_status': previous_status,
+        'controller_id': document['current_controller_id']
+    }
+    data.update(extra)
+    # Нормоконтролёрам - только о документах их очереди: документ в ней сейчас
+    # или был до изменения (страница убирает его из списка)
+    visible_to_controllers = any(
+        auth_system.is_document_visible({**document, 'status': status}, None, 'controller')
+        for status in (document['status'], previous_status) if status
+    )
+    event_broker.publish(event_type, data, user_ids=[document['developer_id']],
+                         roles=['controller'] if visible_to_controllers else [])
+
+# Кэш ответов /document_history и /document_violations: (ETag, данные) по документу.
+# В этом процессе записи сбрасываются при смене статуса и замене документа,
+# изменения из других процессов становятся видны не позже чем через DOCUMENT_CACHE_TTL
+DOCUMENT_CACHE_SIZE = 512
+DOCUMENT_CACHE_TTL = 30
+document_cache = TTLCache(DOCUMENT_CACHE_SIZE, DOCUMENT_CACHE_TTL)
+
+def invalidate_document_cache(document_id):
+    document_id = int(document_id)
+    document_cache.invalidate(('history', document_id), ('violations', document_id), ('file', document_id))
+
+def get_cached_document_data(kind, document_id, loader):
+    """(ETag, данные) о документе из кэша или loader(document_id).
+    
+    ETag строится по числу и времени смен статуса, файлу и версии правил;
+    версия читается до данных, поэтому ETag никогда не новее данных.
+    """
+    key = (kind, document_id)
+    cached = document_cache.get(key)
+    if cached is None:
+        version = auth_system.get_document_version(document_id)
+        etag = hashlib.sha1(f'{kind}|{document_id}|{version}'.encode()).hexdigest()[:20]
+        cached = (etag, loader(document_id))
+        document_cache.set(key, cached)
+    return cached
+
+def conditional_json_response(etag, payload):
+    """JSON-ответ с ETag; 304 без тела, если у клиента та же версия (If-None-Match)"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    # Данные пользовательские: браузер хранит их у себя, но каждый раз сверяет версию
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
-# Импортируем функционал из itog.py
-from itog import doc_analyzer, rule_engine, allowed_file
+def find_designation_duplicates(document_id, designations):
+    """Другие документы с теми же обозначениями:
+    {обозначение: {'documents': [документы пользователя], 'hidden_documents': N}}"""
+    duplicates = {}
+    for designation in designations:
+        found = auth_system.find_documents_by_designation(designation, session['user_id'],
+                                                          session['user_data']['role'],
+                                                          exclude_document_id=document_id)
+        if found['documents'] or found['hidden_documents']:
+            duplicates[designation] = found
+            hidden = f" и еще в {found['hidden_documents']} чужих" if found['hidden_documents'] else ''
+            print(f"⚠️ Обозначение {designation} документа {document_id} уже есть в документах "
+                  f"{[doc['id'] for doc in found['documents']]}{hidden}")
+    return duplicates
 
-app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['STORAGE_FOLDER'] = 'storage'
-app.config['SECRET_KEY'] = 'normcontrol-secret-key-2024-auth'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+def file_sha256(file_path):
+    """SHA-256 содержимого файла (читается блоками по 1 МБ)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-# Создаем необходимые папки
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['STORAGE_FOLDER'], exist_ok=True)
+def get_stored_file(document_id):
+    """(путь, исходное имя, SHA-256) файла документа или None.
+    
+    Сохраненные файлы не изменяются (замена создает новый файл), поэтому запись
+    кэшируется; если файл из кэша уже удален заменой в другом процессе, запись
+    перечитывается из базы.
+    """
+    key = ('file', document_id)
+    stored = document_cache.get(key)
+    if stored is not None and os.path.exists(stored[0]):
+        return stored
+    
+    document = auth_system.get_document_file(document_id)
+    if not document:
+        return None
+    file_path = settings.resolve_data_path(document['filename'])
+    if not os.path.exists(file_path):
+        return None
+    file_hash = document['file_hash']
+    if not file_hash:
+        # Документ загружен до появления хэшей - считаем один раз и сохраняем
+        file_hash = file_sha256(file_path)
+        auth_system.set_document_file_hash(document_id, file_hash)
+    stored = (file_path, document['original_filename'], file_hash)
+    document_cache.set(key, stored)
+    return stored
 
-# Регистрируем Blueprint нормоконтроля
-app.register_blueprint(normcontrol_bp)
+def send_stored_document(document_id, as_attachment):
+    """Отдача сохраненного PDF со строгим ETag (SHA-256), Last-Modified и поддержкой Range.
+    
+    В режиме SENDFILE_MODE тело ответа и диапазоны отдает фронтальный прокси:
+    nginx по X-Accel-Redirect или Apache/lighttpd по X-Sendfile; проверка
+    If-None-Match и If-Modified-Since все равно выполняется здесь.
+    """
+    stored = get_stored_file(document_id)
+    if not stored:
+        return jsonify({'error': 'Документ или файл не найден'}), 404
+    file_path, original_filename, file_hash = stored
+    last_modified = os.path.getmtime(file_path)
+    
+    sendfile_mode = current_app.config.get('SENDFILE_MODE')
+    relative_path = os.path.relpath(file_path, current_app.config['STORAGE_FOLDER'])
+    if sendfile_mode == 'x-accel' and relative_path.startswith(os.pardir):
+        # nginx отдает только файлы из папки storage; старые записи с другими путями - сами
+        sendfile_mode = None
+    
+    if sendfile_mode in ('x-accel', 'x-sendfile'):
+        disposition = 'attachment' if as_attachment else 'inline'
+        response = Response(mimetype='application/pdf')
+        if sendfile_mode == 'x-accel':
+            response.headers['X-Accel-Redirect'] = (current_app.config['ACCEL_REDIRECT_PREFIX'].rstrip('/') + '/'
+                                                    + quote(relative_path.replace(os.sep, '/')))
+        else:
+            response.headers['X-Sendfile'] = file_path
+        response.headers['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(original_filename)}"
+        response.set_etag(file_hash)
+        response.last_modified = last_modified
+        response.make_conditional(request)
+    else:
+        # send_file сам отвечает 304/206/416 по If-None-Match, If-Modified-Since, Range и If-Range
+        response = send_file(file_path, mimetype='application/pdf', as_attachment=as_attachment,
+                             download_name=original_filename, etag=file_hash, last_modified=last_modified,
+                             conditional=True)
+    # Файл документа меняется при замене: браузер хранит копию, но каждый раз сверяет ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 def get_controller_name(controller_id):
     """Получение имени нормоконтролёра по ID"""
     try:
-        conn = sqlite3.connect('users.db')
+        conn = auth_system.get_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT first_name, last_name FROM users WHERE id = ?', (controller_id,))
         controller = cursor.fetchone()
@@ -43,14 +240,14 @@ def get_controller_name(controller_id):
         return None
 
 # Главная страница - редирект на аутентификацию
-@app.route('/')
+@web_bp.route('/')
 def index():
     if 'user_id' in session:
-        return redirect(url_for('main_page'))
-    return redirect(url_for('login'))
+        return redirect(url_for('web.main_page'))
+    return redirect(url_for('web.login'))
 
 # Страница входа
-@app.route('/login', methods=['GET', 'POST'])
+@web_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -60,14 +257,14 @@ def login():
         if result['success']:
             session['user_id'] = result['user']['id']
             session['user_data'] = result['user']
-            return jsonify({'success': True, 'redirect': url_for('main_page')})
+            return jsonify({'success': True, 'redirect': url_for('web.main_page')})
         else:
             return jsonify({'success': False, 'error': result['error']})
     
     return render_template('login.html')
 
 # Страница регистрации
-@app.route('/register', methods=['GET', 'POST'])
+@web_bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -86,10 +283,10 @@ def register():
     return render_template('register.html')
 
 # Главная страница приложения
-@app.route('/main')
+@web_bp.route('/main')
 def main_page():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('web.login'))
     
     # Получаем документы пользователя
     documents = auth_system.get_user_documents(session['user_id'], session['user_data']['role'])
@@ -99,10 +296,10 @@ def main_page():
                          documents=documents)
 
 # Личный кабинет
-@app.route('/profile')
+@web_bp.route('/profile')
 def profile():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('web.login'))
     
     # Получаем документы пользователя
     documents = auth_system.get_user_documents(session['user_id'], session['user_data']['role'])
@@ -113,10 +310,10 @@ def profile():
 
 # Страница истории загрузок
 # История загрузок
-@app.route('/history')
+@web_bp.route('/history')
 def history():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('web.login'))
     
     # Получаем документы пользователя
     documents = auth_system.get_user_documents(session['user_id'], session['user_data']['role'])
@@ -127,7 +324,7 @@ def history():
                          get_controller_name=get_controller_name,
                          get_document_violations=get_document_violations)  # Добавляем новую функцию
 # Анализ документа
-@app.route('/analyze_document', methods=['POST'])
+@web_bp.route('/analyze_document', methods=['POST'])
 def analyze_document():
     if 'user_id' not in session:
         return jsonify({'error': 'Требуется авторизация'}), 401
@@ -140,18 +337,36 @@ def analyze_document():
         return jsonify({'error': 'Требуется PDF-файл'}), 400
 
     filename = secure_filename(file.filename)
-    unique_filename = f"{uuid.uuid4()}_{filename}"
+    # Файл анализируется из памяти; на диск он записывается только в хранилище
+    with upload_buffer(file) as pdf_data:
+        # Допуск к анализу: лимит страниц пользователя и общая очередь (меньшие документы - раньше)
+        try:
+            with analysis_admission.admit(session['user_id'], count_pages(pdf_data)):
+                payload, status_code = analyze_and_store_document(pdf_data, filename)
+        except AdmissionRejected as e:
+            return admission_rejected_response(e)
+    return jsonify(payload), status_code
+
+def admission_rejected_response(error):
+    """429 с заголовком Retry-After: запрос не допущен к анализу"""
+    response = jsonify({'success': False, 'error': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+def analyze_and_store_document(source, filename, file_hash=None):
+    """Анализ загруженного файла, сохранение в хранилище и запись документа в базу.
     
-    # Временный путь для анализа
-    temp_file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+    source - путь к временному файлу (переносится в хранилище или удаляется при
+    ошибке) или содержимое PDF в памяти (записывается в хранилище только после
+    успешного анализа). file_hash - SHA-256 файла, если он уже посчитан при приеме.
+    Возвращает (ответ JSON, HTTP-код).
+    """
     # Постоянный путь для хранения
-    storage_file_path = os.path.join(app.config['STORAGE_FOLDER'], unique_filename)
-    
-    file.save(temp_file_path)
+    storage_file_path = os.path.join(current_app.config['STORAGE_FOLDER'], f"{uuid.uuid4()}_{filename}")
     
     try:
         # Анализируем файл
-        text_data = doc_analyzer.extract_text_from_pdf(temp_file_path)
+        text_data = doc_analyzer.extract_text_from_pdf(source)
         document_data = {'text_data': text_data}
         result = rule_engine.run_all_checks(document_data)
         
@@ -159,9 +374,18 @@ def analyze_document():
         has_violations = any(v['severity'] in ['high', 'medium'] for v in result['violations'])
         auto_status = 'Требует доработки' if has_violations else 'Нет замечаний'
         
-        # Сохраняем файл в постоянное хранилище
-        file.seek(0)  # Перемещаем указатель в начало файла
-        file.save(storage_file_path)
+        if isinstance(source, str):
+            # Переносим файл в постоянное хранилище (без повторной записи, если папки на одном диске)
+            shutil.move(source, storage_file_path)
+        else:
+            with open(storage_file_path, 'wb') as f:
+                f.write(source)
+            if file_hash is None:
+                file_hash = hashlib.sha256(source).hexdigest()
+        store_page_features(storage_file_path, text_data)
+        if file_hash is None:
+            file_hash = file_sha256(storage_file_path)
+        designations = document_designations(DESIGNATIONS, text_data)
         
         # Сохраняем документ в базу данных
         developer_name = f"{session['user_data']['first_name']} {session['user_data']['last_name']}"
@@ -170,7 +394,12 @@ def analyze_document():
             filename, 
             session['user_id'], 
             developer_name,
-            str(result)
+            str(result),
+            Config.RULES_VERSION,
+            file_hash,
+            search_fields_from_text_data(text_data),
+            designations,
+            result['violations']
         )
         
         if not doc_result['success']:
@@ -179,7 +408,7 @@ def analyze_document():
         # Если нет замечаний, назначаем нормоконтролера
         if auto_status == 'Нет замечаний':
             # Находим случайного нормоконтролера
-            conn = sqlite3.connect('users.db')
+            conn = auth_system.get_connection()
             cursor = conn.cursor()
             cursor.execute('SELECT id, first_name, last_name FROM users WHERE role = "controller" LIMIT 1')
             controller = cursor.fetchone()
@@ -201,81 +430,290 @@ def analyze_document():
             
             conn.close()
         
-        # Удаляем временный файл
-        os.remove(temp_file_path)
+        schedule_page_previews(storage_file_path)
         
-        return jsonify({
+        # Новый документ появляется в списках владельца и (если назначен) нормоконтролёров
+        publish_document_event('analysis_completed', doc_result['document_id'],
+                               total_violations=result['statistics']['total_violations'])
+        if auto_status == 'Нет замечаний':
+            publish_document_event('document_assigned', doc_result['document_id'])
+        
+        return {
             'success': True,
             'result': result,
             'auto_status': auto_status,
-            'document_id': doc_result['document_id']
-        })
+            'document_id': doc_result['document_id'],
+            'designations': designations,
+            'designation_duplicates': find_designation_duplicates(doc_result['document_id'], designations)
+        }, 200
         
     except Exception as e:
         # Удаляем временные файлы в случае ошибки
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        if isinstance(source, str) and os.path.exists(source):
+            os.remove(source)
         if os.path.exists(storage_file_path):
             os.remove(storage_file_path)
-        return jsonify({'error': f'Ошибка анализа: {str(e)}'}), 500
+        remove_page_features(storage_file_path)
+        return {'error': f'Ошибка анализа: {str(e)}'}, 500
+
+# Пакетная загрузка: много PDF (поле files) или ZIP-архив с PDF.
+# Файлы анализируются в пуле процессов, результат по каждому файлу отправляется
+# строкой JSON (application/x-ndjson) по мере готовности; документы пакета
+# записываются в базу одной транзакцией, итоговая строка содержит их id
+@web_bp.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    uploads = request.files.getlist('files')
+    if not uploads:
+        return jsonify({'error': 'Файлы не загружены'}), 400
+    try:
+        files, skipped = batch_upload.collect_batch_files(uploads, current_app.config['UPLOAD_FOLDER'])
+    except batch_upload.BatchError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not files:
+        return jsonify({'success': False, 'error': 'В пакете нет PDF-файлов', 'skipped': skipped}), 400
+    
+    developer_id = session['user_id']
+    developer_name = f"{session['user_data']['first_name']} {session['user_data']['last_name']}"
+    storage_folder = current_app.config['STORAGE_FOLDER']
+    
+    # Допуск пакета как одного анализа: все страницы пакета списываются с лимита
+    # пользователя (не больше USER_BURST_PAGES), место занято до конца ответа
+    admission = ExitStack()
+    try:
+        admission.enter_context(analysis_admission.admit(
+            developer_id, sum(count_pages(temp_path) for _, temp_path in files)))
+    except AdmissionRejected as e:
+        batch_upload.remove_files([temp_path for _, temp_path in files])
+        return admission_rejected_response(e)
+    print(f"📦 Пакет из {len(files)} файлов от {developer_name}")
+    
+    def ndjson(record):
+        return json.dumps(record, ensure_ascii=False) + '\n'
+    
+    def generate():
+        submitted = []
+        # Пакет записан в базу (или уже убран после ошибки записи)
+        finished = False
+        try:
+            for item in skipped:
+                yield ndjson({'type': 'file', 'success': False, **item})
+            
+            futures = {}
+            for index, (name, temp_path) in enumerate(files):
+                filename = secure_filename(name)
+                storage_path = os.path.join(storage_folder, f"{uuid.uuid4()}_{filename}")
+                try:
+                    future, executor = batch_upload.submit_upload(temp_path, storage_path)
+                except Exception as e:
+                    # Пул не запустился (сломан, нет ресурсов) - файл не проверен
+                    batch_upload.remove_files([temp_path])
+                    yield ndjson({'type': 'file', 'filename': name, 'success': False,
+                                  'error': f'Ошибка анализа: {e}'})
+                    continue
+                futures[future] = (index, name, filename, storage_path, executor)
+                submitted.append((future, temp_path, storage_path))
+            
+            analysed = []
+            for future in as_completed(futures):
+                index, name, filename, storage_path, executor = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # Процесс пула аварийно завершился - файл не проверен, пул заменяется новым
+                    if isinstance(e, BrokenProcessPool):
+                        batch_upload.reset_executor(executor)
+                    batch_upload.discard_upload(files[index][1], storage_path)
+                    record = {'error': str(e)}
+                if 'error' in record:
+                    yield ndjson({'type': 'file', 'filename': name, 'success': False,
+                                  'error': f"Ошибка анализа: {record['error']}"})
+                    continue
+                result = record['result']
+                has_violations = any(v['severity'] in ['high', 'medium'] for v in result['violations'])
+                record.update(index=index, filename=filename, storage_path=storage_path,
+                              auto_status='Требует доработки' if has_violations else 'Нет замечаний')
+                analysed.append(record)
+                yield ndjson({'type': 'file', 'filename': name, 'success': True, 'auto_status': record['auto_status'],
+                              'pages': record['pages'], 'seconds': record['seconds'], 'result': result})
+            
+            # Документы пакета - в порядке файлов запроса, одной транзакцией
+            analysed.sort(key=lambda record: record['index'])
+            added = auth_system.add_documents([
+                {
+                    'filename': record['storage_path'],
+                    'original_filename': record['filename'],
+                    'auto_check_result': str(record['result']),
+                    'auto_status': record['auto_status'],
+                    'file_hash': record['file_hash'],
+                    'search_fields': record['search_fields'],
+                    'designations': record['designations'],
+                    'violations': record['result']['violations']
+                }
+                for record in analysed
+            ], developer_id, developer_name, Config.RULES_VERSION)
+            finished = True
+            
+            if not added['success']:
+                for record in analysed:
+                    batch_upload.remove_files([record['storage_path']])
+                    remove_page_features(record['storage_path'])
+                yield ndjson({'type': 'summary', 'success': False, 'error': f"Ошибка сохранения пакета: {added['error']}"})
+                return
+            
+            documents = []
+            for record, document_id in zip(analysed, added['document_ids']):
+                schedule_page_previews(record['storage_path'])
+                publish_document_event('analysis_completed', document_id,
+                                       total_violations=record['result']['statistics']['total_violations'])
+                if record['auto_status'] == 'Нет замечаний' and added['controller_id']:
+                    publish_document_event('document_assigned', document_id)
+                documents.append({
+                    'filename': record['filename'],
+                    'document_id': document_id,
+                    'auto_status': record['auto_status'],
+                    'designations': record['designations'],
+                    'designation_duplicates': find_designation_duplicates(document_id, record['designations'])
+                })
+            print(f"✅ Пакет сохранен: документов {len(documents)}, с ошибками {len(files) - len(documents)}")
+            yield ndjson({
+                'type': 'summary',
+                'success': True,
+                'documents': documents,
+                'failed': len(files) - len(documents) + len(skipped)
+            })
+        finally:
+            if not finished:
+                # Клиент отключился до записи пакета в базу - файлы без документов не оставляем
+                print(f"⚠️ Пакет от {developer_name} прерван до сохранения - файлы удалены")
+                batch_upload.discard_batch(submitted, files)
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.call_on_close(admission.close)
+    return response
+
+# Загрузка больших документов частями с возобновлением (chunked_upload.py):
+# POST /uploads - новая сессия, PUT /uploads/<id>?offset=N - часть файла телом запроса,
+# GET /uploads/<id> - сколько байт принято, DELETE /uploads/<id> - отмена.
+# Анализ запускается, когда принята последняя часть; если анализ не допущен (429),
+# собранный файл анализируется повторным PUT /uploads/<id>?offset=<size> с пустым телом
+def upload_error_response(error):
+    payload = {'success': False, 'error': str(error)}
+    if error.received is not None:
+        payload['received'] = error.received
+    return jsonify(payload), error.status
+
+@web_bp.route('/uploads', methods=['POST'])
+def create_upload():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    data = request.get_json(silent=True) or request.form
+    original_filename = data.get('filename', '')
+    if not original_filename or not allowed_file(original_filename):
+        return jsonify({'error': 'Требуется PDF-файл'}), 400
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Не указан размер файла'}), 400
+    
+    try:
+        upload = chunked_upload.create_session(current_app.config['UPLOAD_FOLDER'], session['user_id'],
+                                               secure_filename(original_filename), size, data.get('sha256') or None)
+    except chunked_upload.UploadError as e:
+        return upload_error_response(e)
+    return jsonify({'success': True, **upload}), 201
+
+@web_bp.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    try:
+        meta = chunked_upload.load_session(upload_folder, upload_id, session['user_id'])
+        received = chunked_upload.received_size(upload_folder, upload_id)
+    except chunked_upload.UploadError as e:
+        return upload_error_response(e)
+    return jsonify({'success': True, **chunked_upload.describe(upload_id, meta, received)})
+
+@web_bp.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    offset = request.args.get('offset', type=int)
+    if offset is None or request.content_length is None:
+        return jsonify({'error': 'Нужны смещение части (offset) и заголовок Content-Length'}), 400
+    try:
+        meta = chunked_upload.load_session(upload_folder, upload_id, session['user_id'])
+        if request.content_length == 0:
+            # Повтор анализа собранного файла (после ответа 429) - без новой части
+            received = chunked_upload.received_size(upload_folder, upload_id)
+        else:
+            received = chunked_upload.write_chunk(upload_folder, upload_id, meta, offset,
+                                                  request.stream, request.content_length)
+        if received < meta['size']:
+            return jsonify({'success': True, **chunked_upload.describe(upload_id, meta, received)})
+        file_path, file_hash = chunked_upload.finish_session(upload_folder, upload_id, meta)
+    except chunked_upload.UploadError as e:
+        return upload_error_response(e)
+    
+    # Последняя часть: файл собран - после допуска к анализу переносим из сессии и анализируем.
+    # Без допуска собранный файл остается в сессии: клиент повторяет PUT с пустым телом
+    try:
+        with analysis_admission.admit(session['user_id'], count_pages(file_path)):
+            temp_file_path = os.path.join(upload_folder, f"{uuid.uuid4()}_{meta['filename']}")
+            os.replace(file_path, temp_file_path)
+            chunked_upload.remove_session(upload_folder, upload_id)
+            print(f"📦 Загрузка {upload_id} завершена: {meta['filename']}, {meta['size']} байт")
+            
+            payload, status_code = analyze_and_store_document(temp_file_path, meta['filename'], file_hash)
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    payload['upload_id'] = upload_id
+    return jsonify(payload), status_code
+
+@web_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def cancel_upload(upload_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    try:
+        chunked_upload.load_session(upload_folder, upload_id, session['user_id'])
+    except chunked_upload.UploadError as e:
+        return upload_error_response(e)
+    chunked_upload.remove_session(upload_folder, upload_id)
+    return jsonify({'success': True})
 
 # Скачивание документа
-@app.route('/download_document/<int:document_id>')
+@web_bp.route('/download_document/<int:document_id>')
 def download_document(document_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Требуется авторизация'}), 401
     
     try:
-        # Получаем информацию о документе из базы
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT filename, original_filename FROM documents WHERE id = ?', (document_id,))
-        document = cursor.fetchone()
-        conn.close()
-        
-        if not document:
-            return jsonify({'error': 'Документ не найден'}), 404
-        
-        file_path = document[0]
-        original_filename = document[1]
-        
-        if not os.path.exists(file_path):
-            return jsonify({'error': 'Файл не найден на сервере'}), 404
-        
-        return send_file(file_path, as_attachment=True, download_name=original_filename)
-        
+        return send_stored_document(document_id, as_attachment=True)
     except Exception as e:
         return jsonify({'error': f'Ошибка загрузки: {str(e)}'}), 500
 
-# Просмотр документа
-@app.route('/view_document/<int:document_id>')
+# Просмотр документа (встроенный просмотрщик PDF запрашивает части файла через Range)
+@web_bp.route('/view_document/<int:document_id>')
 def view_document(document_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Требуется авторизация'}), 401
     
     try:
-        # Получаем информацию о документе из базы
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT filename FROM documents WHERE id = ?', (document_id,))
-        document = cursor.fetchone()
-        conn.close()
-        
-        if not document:
-            return jsonify({'error': 'Документ не найден'}), 404
-        
-        file_path = document[0]
-        
-        if not os.path.exists(file_path):
-            return jsonify({'error': 'Файл не найден на сервере'}), 404
-        
-        return send_file(file_path)
-        
+        return send_stored_document(document_id, as_attachment=False)
     except Exception as e:
         return jsonify({'error': f'Ошибка загрузки: {str(e)}'}), 500
 
 # Обновление статуса документа
-@app.route('/update_document_status', methods=['POST'])
+@web_bp.route('/update_document_status', methods=['POST'])
 def update_document_status():
     if 'user_id' not in session:
         return jsonify({'error': 'Требуется авторизация'}), 401
@@ -286,6 +724,7 @@ def update_document_status():
     
     user_name = f"{session['user_data']['first_name']} {session['user_data']['last_name']}"
     
+    document = auth_system.get_document(document_id)
     result = auth_system.update_document_status(
         document_id, 
         new_status, 
@@ -295,21 +734,137 @@ def update_document_status():
     )
     
     if result['success']:
+        invalidate_document_cache(document_id)
+        publish_document_event('document_status', document_id,
+                               previous_status=document['status'] if document else None)
         return jsonify({'success': True, 'message': 'Статус обновлен'})
     else:
         return jsonify({'success': False, 'error': result['error']})
 
+# Смена статуса нескольких документов нормоконтролёром (одна транзакция на пакет)
+BULK_STATUS_MAX_DOCUMENTS = 500
+
+@web_bp.route('/update_documents_status', methods=['POST'])
+def update_documents_status():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    if session['user_data']['role'] != 'controller':
+        return jsonify({'error': 'Пакетная смена статуса доступна только нормоконтролёру'}), 403
+    
+    # document_ids - повторяющееся поле формы или список через запятую
+    raw_ids = [part.strip() for value in request.form.getlist('document_ids') for part in value.split(',')]
+    raw_ids = [part for part in raw_ids if part]
+    new_status = request.form.get('new_status')
+    notes = request.form.get('notes', '')
+    if not raw_ids or not new_status:
+        return jsonify({'success': False, 'error': 'Не указаны документы или новый статус'}), 400
+    if new_status not in auth_system.REVIEW_STATUSES:
+        return jsonify({'success': False, 'error': f"Недопустимый статус. Допустимые: {', '.join(auth_system.REVIEW_STATUSES)}"}), 400
+    if len(raw_ids) > BULK_STATUS_MAX_DOCUMENTS:
+        return jsonify({'success': False,
+                        'error': f'Не больше {BULK_STATUS_MAX_DOCUMENTS} документов за один запрос'}), 400
+    
+    document_ids = []
+    invalid = []
+    for raw_id in raw_ids:
+        if raw_id.isdigit() and int(raw_id) not in document_ids:
+            document_ids.append(int(raw_id))
+        elif not raw_id.isdigit():
+            invalid.append({'document_id': raw_id, 'success': False, 'error': 'Некорректный id документа'})
+    
+    user_name = f"{session['user_data']['first_name']} {session['user_data']['last_name']}"
+    result = auth_system.update_documents_status(document_ids, new_status, session['user_id'], user_name, notes)
+    if not result['success']:
+        return jsonify({'success': False, 'error': result['error']})
+    
+    for outcome in result['results']:
+        if outcome['success']:
+            invalidate_document_cache(outcome['document_id'])
+            publish_document_event('document_status', outcome['document_id'],
+                                   previous_status=outcome['previous_status'])
+    return jsonify({
+        'success': True,
+        'message': f"Статус обновлен у {result['updated']} из {len(document_ids) + len(invalid)} документов",
+        'updated': result['updated'],
+        'results': result['results'] + invalid
+    })
+
 # Получение истории статусов документа
-@app.route('/document_history/<int:document_id>')
+@web_bp.route('/document_history/<int:document_id>')
 def document_history(document_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Требуется авторизация'}), 401
     
-    history = auth_system.get_document_status_history(document_id)
-    return jsonify({'success': True, 'history': history})
+    etag, history = get_cached_document_data('history', document_id, auth_system.get_document_status_history)
+    return conditional_json_response(etag, {'success': True, 'history': history})
+
+# Полнотекстовый поиск по тексту документов (основная надпись, техтребования, поле чертежа)
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+@web_bp.route('/search_documents')
+def search_documents():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
+    if not query:
+        return jsonify({'success': False, 'error': 'Пустой поисковый запрос'}), 400
+    
+    found = auth_system.search_documents(session['user_id'], session['user_data']['role'], query, page, per_page)
+    return jsonify({
+        'success': True,
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'total': found['total'],
+        'pages': (found['total'] + per_page - 1) // per_page,
+        'results': found['results']
+    })
+
+# Документы с заданным обозначением (латинские двойники букв и дефисы приводятся к общему виду)
+@web_bp.route('/designations/<path:designation>')
+def designation_documents(designation):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    designation = normalize_designation(designation)
+    found = auth_system.find_documents_by_designation(designation, session['user_id'],
+                                                      session['user_data']['role'])
+    return jsonify({'success': True, 'designation': designation, **found})
+
+# Обозначения, встречающиеся в нескольких документах
+@web_bp.route('/designation_conflicts')
+def designation_conflicts():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    document_id = request.args.get('document_id', type=int)
+    if document_id is not None:
+        document = auth_system.get_document(document_id)
+        if not document or not auth_system.is_document_visible(document, session['user_id'],
+                                                               session['user_data']['role']):
+            return jsonify({'error': 'Документ не найден'}), 404
+    conflicts = auth_system.get_designation_conflicts(session['user_id'], session['user_data']['role'],
+                                                      document_id)
+    return jsonify({'success': True, 'conflicts': conflicts})
+
+# Сводка для панели статистики: очереди и время проверки нормоконтролёров, частота замечаний.
+# Читает только агрегаты (workload_stats.py), без просмотра документов и истории
+@web_bp.route('/controller_stats')
+def controller_stats():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    result = auth_system.get_workload_stats()
+    if not result['success']:
+        return jsonify(result), 500
+    return jsonify(result)
 
 # Замена документа (для повторной загрузки исправленной версии)
-@app.route('/replace_document/<int:document_id>', methods=['POST'])
+@web_bp.route('/replace_document/<int:document_id>', methods=['POST'])
 def replace_document(document_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Требуется авторизация'}), 401
@@ -323,7 +878,7 @@ def replace_document(document_id):
     
     try:
         # Получаем информацию о старом документе
-        conn = sqlite3.connect('users.db')
+        conn = auth_system.get_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT filename, developer_id, status FROM documents WHERE id = ?', (document_id,))
         old_doc = cursor.fetchone()
@@ -339,20 +894,28 @@ def replace_document(document_id):
         if old_doc[2] != 'Требует доработки':
             return jsonify({'error': 'Документ не требует доработки'}), 400
             
-        old_file_path = old_doc[0]
+        old_file_path = settings.resolve_data_path(old_doc[0])
         
         # Создаем новое имя файла
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4()}_{filename}"
-        new_file_path = os.path.join(app.config['STORAGE_FOLDER'], unique_filename)
+        new_file_path = os.path.join(current_app.config['STORAGE_FOLDER'], unique_filename)
         
         # Сохраняем новый файл
         file.save(new_file_path)
         
-        # Анализируем новый файл
-        text_data = doc_analyzer.extract_text_from_pdf(new_file_path)
-        document_data = {'text_data': text_data}
-        result = rule_engine.run_all_checks(document_data)
+        # Анализируем новый файл (после допуска к анализу, как при загрузке)
+        try:
+            with analysis_admission.admit(session['user_id'], count_pages(new_file_path)):
+                text_data = doc_analyzer.extract_text_from_pdf(new_file_path)
+                document_data = {'text_data': text_data}
+                result = rule_engine.run_all_checks(document_data)
+        except AdmissionRejected as e:
+            os.remove(new_file_path)
+            conn.close()
+            return admission_rejected_response(e)
+        store_page_features(new_file_path, text_data)
+        file_hash = file_sha256(new_file_path)
         
         # Определяем статус на основе результатов автоматической проверки
         has_violations = any(v['severity'] in ['high', 'medium'] for v in result['violations'])
@@ -371,9 +934,10 @@ def replace_document(document_id):
             UPDATE documents 
             SET filename = ?, original_filename = ?, status = ?, 
                 status_change_count = status_change_count + 1, last_status_change = CURRENT_TIMESTAMP,
-                auto_check_result = ?, current_controller_id = ?
+                auto_check_result = ?, rules_version = ?, current_controller_id = ?, file_hash = ?
             WHERE id = ?
-        ''', (new_file_path, filename, auto_status, str(result), controller_id, document_id))
+        ''', (new_file_path, filename, auto_status, str(result), Config.RULES_VERSION, controller_id, file_hash,
+              document_id))
         
         # Добавляем запись в историю
         user_name = f"{session['user_data']['first_name']} {session['user_data']['last_name']}"
@@ -388,32 +952,56 @@ def replace_document(document_id):
             VALUES (?, ?, ?, ?, ?)
         ''', (document_id, auto_status, session['user_id'], user_name, history_notes))
         
+        # Текст и обозначения новой версии в индексах - в той же транзакции
+        index_document(cursor, document_id, filename, search_fields_from_text_data(text_data))
+        designations = document_designations(DESIGNATIONS, text_data)
+        index_designations(cursor, document_id, designations)
+        record_document_violations(cursor, document_id, result['violations'])
+        
         # Удаляем старый файл
         if os.path.exists(old_file_path):
             os.remove(old_file_path)
+        remove_page_features(old_file_path)
+        remove_page_previews(old_file_path)
             
         conn.commit()
         conn.close()
         
+        invalidate_document_cache(document_id)
+        schedule_page_previews(new_file_path)
+        publish_document_event('analysis_completed', document_id, previous_status=old_doc[2],
+                               total_violations=result['statistics']['total_violations'])
+        if controller_id:
+            publish_document_event('document_assigned', document_id, previous_status=old_doc[2])
+        
         return jsonify({
             'success': True,
             'message': f'Исправленная версия документа успешно загружена. Статус: {auto_status}',
-            'auto_status': auto_status
+            'auto_status': auto_status,
+            'designations': designations,
+            'designation_duplicates': find_designation_duplicates(document_id, designations)
         })
         
     except Exception as e:
         # Удаляем новый файл в случае ошибки
-        if 'new_file_path' in locals() and os.path.exists(new_file_path):
-            os.remove(new_file_path)
+        if 'new_file_path' in locals():
+            if os.path.exists(new_file_path):
+                os.remove(new_file_path)
+            remove_page_features(new_file_path)
         return jsonify({'error': f'Ошибка замены документа: {str(e)}'}), 500
 
 
 # Добавьте эту функцию в app.py после функции get_controller_name
 
 def get_document_violations(document_id):
-    """Получение информации о нарушениях документа"""
+    """Получение информации о нарушениях документа (через кэш: результат проверки
+    не разбирается заново при каждом показе)"""
+    return get_cached_document_data('violations', document_id, load_document_violations)[1]
+
+def load_document_violations(document_id):
+    """Разбор сохраненного результата автоматической проверки документа"""
     try:
-        conn = sqlite3.connect('users.db')
+        conn = auth_system.get_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT auto_check_result FROM documents WHERE id = ?', (document_id,))
         result = cursor.fetchone()
@@ -434,24 +1022,155 @@ def get_document_violations(document_id):
 # Добавьте этот маршрут в app.py
 
 # Получение информации об ошибках документа
-@app.route('/document_violations/<int:document_id>')
+@web_bp.route('/document_violations/<int:document_id>')
 def document_violations(document_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Требуется авторизация'}), 401
     
     try:
-        violations = get_document_violations(document_id)
-        return jsonify({'success': True, 'violations': violations})
+        etag, violations = get_cached_document_data('violations', document_id, load_document_violations)
+        return conditional_json_response(etag, {'success': True, 'violations': violations})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
+
+# Превью страниц документа: размеры, уровни тайлов и замечания для наложения
+@web_bp.route('/document_preview/<int:document_id>')
+def document_preview(document_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    from page_previews import load_manifest, schedule_previews, violation_overlays
+    
+    stored = get_stored_file(document_id)
+    if not stored:
+        return jsonify({'success': False, 'error': 'Документ или файл не найден'}), 404
+    file_path, original_filename, file_hash = stored
+    
+    manifest = load_manifest(file_path)
+    if manifest is None:
+        # Превью еще строятся (или документ загружен до их появления) - ставим в очередь
+        schedule_previews(file_path)
+        return jsonify({'success': False, 'pending': True}), 202
+    
+    overlays = violation_overlays(get_document_violations(document_id), manifest)
+    pages = [dict(page, overlays=overlays[page['number']]) for page in manifest['pages']]
+    return jsonify({
+        'success': True,
+        'filename': original_filename,
+        'tile_size': manifest['tile_size'],
+        # Версия в адресах картинок: после замены документа браузер запросит новые
+        'version': file_hash[:16],
+        'pages': pages
+    })
+
+def send_preview_image(document_id, image_path):
+    """Отдача миниатюры или тайла; адреса с актуальной версией кэшируются браузером надолго"""
+    stored = get_stored_file(document_id)
+    if not stored:
+        return jsonify({'error': 'Документ не найден'}), 404
+    path = image_path(stored[0])
+    if not os.path.exists(path):
+        return jsonify({'error': 'Превью не найдено'}), 404
+    
+    response = send_file(path, mimetype='image/png', conditional=True)
+    if request.args.get('v') == stored[2][:16]:
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@web_bp.route('/document_preview/<int:document_id>/<int:page_number>/thumb.png')
+def document_thumbnail(document_id, page_number):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    from page_previews import thumbnail_path
+    return send_preview_image(document_id, lambda pdf_path: thumbnail_path(pdf_path, page_number))
+
+@web_bp.route('/document_preview/<int:document_id>/<int:page_number>/<int:level>/<int:x>_<int:y>.png')
+def document_tile(document_id, page_number, level, x, y):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    from page_previews import tile_path
+    return send_preview_image(document_id, lambda pdf_path: tile_path(pdf_path, page_number, level, x, y))
+
+# Поток событий для страниц (server-sent events)
+@web_bp.route('/events')
+def events():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    subscription = event_broker.subscribe(session['user_id'], session['user_data']['role'])
+    return Response(stream_events(subscription, event_broker), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Строка таблицы истории для одного документа (обновление без перерисовки всего списка)
+@web_bp.route('/document_row/<int:document_id>')
+def document_row(document_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    
+    document = auth_system.get_document(document_id)
+    if not document or not auth_system.is_document_visible(document, session['user_id'],
+                                                           session['user_data']['role']):
+        # Документа больше нет в списке пользователя - строку нужно убрать
+        return '', 204
+    
+    return render_template('_document_row.html',
+                           doc=document,
+                           user=session['user_data'],
+                           get_controller_name=get_controller_name,
+                           get_document_violations=get_document_violations)
+
 # Выход из системы
-@app.route('/logout')
+@web_bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('login'))
+    return redirect(url_for('web.login'))
+
+def create_app(config=None):
+    """Фабрика приложения: настройки, папки и база данных готовятся при вызове, а не при импорте"""
+    app = Flask(__name__)
+    app.request_class = NormcontrolRequest
+    app.config['DATABASE'] = settings.DATABASE_PATH
+    app.config['UPLOAD_FOLDER'] = settings.UPLOAD_FOLDER
+    app.config['STORAGE_FOLDER'] = settings.STORAGE_FOLDER
+    app.config['SECRET_KEY'] = 'normcontrol-secret-key-2024-auth'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+    # Отдача файлов документов фронтальным прокси (см. settings.py)
+    app.config['SENDFILE_MODE'] = settings.SENDFILE_MODE
+    app.config['ACCEL_REDIRECT_PREFIX'] = settings.ACCEL_REDIRECT_PREFIX
+    if config:
+        app.config.update(config)
+    
+    # Создаем необходимые папки
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['STORAGE_FOLDER'], exist_ok=True)
+    
+    # Таблицы базы данных создаются один раз при сборке приложения;
+    # в многопроцессном режиме create_app() вызывается в каждом рабочем процессе
+    auth_system.db_path = app.config['DATABASE']
+    auth_system.init_database()
+    
+    # Несколько рабочих процессов: события передаются между ними через базу
+    if app.config.get('EVENTS_RELAY'):
+        event_broker.enable_relay(app.config['DATABASE'])
+    
+    app.register_blueprint(web_bp)
+    # Регистрируем Blueprint нормоконтроля
+    app.register_blueprint(normcontrol_bp)
+    return app
 
 if __name__ == '__main__':
+    from recheck_documents import start_background_recheck
+    
+    app = create_app()
     print("🎯 NormControl с системой хранения файлов запущен!")
-    print("📁 Файлы сохраняются в папку 'storage'")
+    print(f"📁 Файлы сохраняются в папку {app.config['STORAGE_FOLDER']}")
     print("🔐 Доступны регистрация и вход")
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Фоновая перепроверка документов, проверенных прежней версией правил.
+    # В режиме отладки запускаем только в рабочем процессе перезагрузчика
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_recheck(app.config['DATABASE'])
+    app.run(host='0.0.0.0', port=5000, debug=True)
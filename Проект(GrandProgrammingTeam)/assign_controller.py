@@ -1,9 +1,9 @@
-import sqlite3
+from db import connect
 
 def assign_controller_to_document(document_id, controller_id=None):
     """Назначение нормоконтролера документу"""
     try:
-        conn = sqlite3.connect('users.db')
+        conn = connect()
         cursor = conn.cursor()
         
         if not controller_id:
@@ -34,7 +34,7 @@ def assign_controller_to_document(document_id, controller_id=None):
 def reassign_all_documents():
     """Перераспределение всех документов между нормоконтролерами"""
     try:
-        conn = sqlite3.connect('users.db')
+        conn = connect()
         cursor = conn.cursor()
         
         # Получаем все документы, ожидающие проверки
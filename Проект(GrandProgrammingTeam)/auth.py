@@ -3,14 +3,30 @@ import hashlib
 import os
 from datetime import datetime
 
+from db import connect, enable_wal
+from designation_codes import DESIGNATIONS_TABLE, create_designations_table, index_designations
+from history_archive import create_history_index, read_archived_history
+from document_search import (SNIPPET_MARKERS, build_match_query, create_search_table, index_document,
+                             search_sql, snippet_html)
+from settings import DATABASE_PATH
+from workload_stats import (create_stats_tables, read_stats, rebuild_stats, record_document_violations, record_review,
+                            record_reviews)
+
 class AuthSystem:
-    def __init__(self, db_path='users.db'):
+    # Статусы документов, которые видит нормоконтролёр (очередь проверки)
+    CONTROLLER_QUEUE_STATUSES = ('Нет замечаний', 'Исправлено')
+    # Решения нормоконтролёра, для которых считается время проверки
+    REVIEW_STATUSES = ('Отклонено', 'Согласовано', 'Снято')
+    
+    def __init__(self, db_path=DATABASE_PATH, initialize=True):
         self.db_path = db_path
-        self.init_database()
+        if initialize:
+            self.init_database()
     
     def init_database(self):
         """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_path)
+        enable_wal(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         # Таблица пользователей
@@ -63,9 +79,36 @@ class AuthSystem:
             )
         ''')
         
+        # Версия набора правил, по которой получен auto_check_result (для старых баз)
+        cursor.execute('PRAGMA table_info(documents)')
+        document_columns = {row[1] for row in cursor.fetchall()}
+        if 'rules_version' not in document_columns:
+            cursor.execute('ALTER TABLE documents ADD COLUMN rules_version INTEGER')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_rules_version ON documents (rules_version)')
+        # SHA-256 сохраненного файла - строгий ETag при скачивании и просмотре
+        if 'file_hash' not in document_columns:
+            cursor.execute('ALTER TABLE documents ADD COLUMN file_hash TEXT')
+        # История завершенного документа перенесена в архив (history_archive.py)
+        if 'history_archived' not in document_columns:
+            cursor.execute('ALTER TABLE documents ADD COLUMN history_archived INTEGER NOT NULL DEFAULT 0')
+        create_history_index(cursor)
+        
+        # Полнотекстовый индекс текста документов (document_search.py)
+        create_search_table(cursor)
+        # Обозначения из основных надписей - поиск документов с тем же обозначением
+        create_designations_table(cursor)
+        # Статистика нагрузки нормоконтролёров и замечаний (workload_stats.py);
+        # в старой базе заполняется по уже сохраненным документам
+        if create_stats_tables(cursor):
+            rebuild_stats(cursor)
+        
         conn.commit()
         conn.close()
     
+    def get_connection(self):
+        """Соединение с базой на одну операцию (busy timeout и повторы при блокировке)"""
+        return connect(self.db_path)
+    
     def hash_password(self, password):
         """Хеширование пароля"""
         return hashlib.sha256(password.encode()).hexdigest()
@@ -73,7 +116,7 @@ class AuthSystem:
     def register_user(self, username, password, email, first_name, last_name, role):
         """Регистрация нового пользователя"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
             hashed_password = self.hash_password(password)
@@ -97,7 +140,7 @@ class AuthSystem:
     def login_user(self, username, password):
         """Авторизация пользователя"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
             hashed_password = self.hash_password(password)
@@ -129,44 +172,101 @@ class AuthSystem:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def add_document(self, filename, original_filename, developer_id, developer_name, auto_check_result):
-        """Добавление нового документа"""
+    def add_document(self, filename, original_filename, developer_id, developer_name, auto_check_result, rules_version=None,
+                     file_hash=None, search_fields=None, designations=None, violations=None):
+        """Добавление нового документа (search_fields - текст для полнотекстового поиска,
+        designations - нормализованные обозначения из основной надписи,
+        violations - замечания автопроверки для статистики по правилам)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_connection()
             cursor = conn.cursor()
+            document_id = self._insert_document(cursor, filename, original_filename, developer_id, developer_name,
+                                                auto_check_result, rules_version, file_hash, search_fields,
+                                                designations, violations)
+            conn.commit()
+            conn.close()
             
-            # Определяем начальный статус на основе результатов автоматической проверки
-            # Если есть замечания - ставим "Требует доработки", если нет - "Нет замечаний"
-            has_violations = 'high' in auto_check_result or 'medium' in auto_check_result
-            initial_status = 'Требует доработки' if has_violations else 'Нет замечаний'
-            
-            cursor.execute('''
-                INSERT INTO documents 
-                (filename, original_filename, developer_id, developer_name, auto_check_result, status, status_change_count)
-                VALUES (?, ?, ?, ?, ?, ?, 1)
-            ''', (filename, original_filename, developer_id, developer_name, auto_check_result, initial_status))
+            return {'success': True, 'document_id': document_id}
             
-            document_id = cursor.lastrowid
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def add_documents(self, documents, developer_id, developer_name, rules_version=None):
+        """Добавление пакета документов в одной транзакции: либо все, либо ни одного.
+        
+        documents - словари с ключами filename, original_filename, auto_check_result,
+        auto_status и необязательными file_hash, search_fields, designations, violations.
+        Документы со статусом автопроверки 'Нет замечаний' сразу назначаются
+        нормоконтролёру (как при одиночной загрузке).
+        Возвращает id документов в порядке documents и id нормоконтролёра.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM users WHERE role = 'controller' LIMIT 1")
+            controller = cursor.fetchone()
+            controller_id = controller[0] if controller else None
             
-            # Добавляем запись в историю статусов
-            cursor.execute('''
-                INSERT INTO document_status_history 
-                (document_id, status, changed_by, changed_by_name, notes)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (document_id, initial_status, developer_id, developer_name, 'Документ загружен'))
+            document_ids = []
+            for document in documents:
+                document_id = self._insert_document(
+                    cursor, document['filename'], document['original_filename'], developer_id, developer_name,
+                    document['auto_check_result'], rules_version, document.get('file_hash'),
+                    document.get('search_fields'), document.get('designations'), document.get('violations'))
+                document_ids.append(document_id)
+            passed = [document_id for document_id, document in zip(document_ids, documents)
+                      if document['auto_status'] == 'Нет замечаний']
+            if controller_id is not None and passed:
+                placeholders = ', '.join('?' for _ in passed)
+                cursor.execute(f'''
+                    UPDATE documents SET current_controller_id = ?, status = 'Нет замечаний'
+                    WHERE id IN ({placeholders})
+                ''', (controller_id, *passed))
             
             conn.commit()
             conn.close()
-            
-            return {'success': True, 'document_id': document_id}
+            return {'success': True, 'document_ids': document_ids, 'controller_id': controller_id}
             
         except Exception as e:
             return {'success': False, 'error': str(e)}
+    
+    def _insert_document(self, cursor, filename, original_filename, developer_id, developer_name, auto_check_result,
+                         rules_version, file_hash, search_fields, designations, violations):
+        """Строка документа, первая запись истории и индексы - в транзакции вызывающего"""
+        # Определяем начальный статус на основе результатов автоматической проверки
+        # Если есть замечания - ставим "Требует доработки", если нет - "Нет замечаний"
+        has_violations = 'high' in auto_check_result or 'medium' in auto_check_result
+        initial_status = 'Требует доработки' if has_violations else 'Нет замечаний'
+        
+        cursor.execute('''
+            INSERT INTO documents 
+            (filename, original_filename, developer_id, developer_name, auto_check_result, status, status_change_count,
+             rules_version, file_hash)
+            VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
+        ''', (filename, original_filename, developer_id, developer_name, auto_check_result, initial_status,
+              rules_version, file_hash))
+        
+        document_id = cursor.lastrowid
+        
+        # Добавляем запись в историю статусов
+        cursor.execute('''
+            INSERT INTO document_status_history 
+            (document_id, status, changed_by, changed_by_name, notes)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (document_id, initial_status, developer_id, developer_name, 'Документ загружен'))
+        
+        if search_fields is not None:
+            index_document(cursor, document_id, original_filename, search_fields)
+        if designations:
+            index_designations(cursor, document_id, designations)
+        if violations is not None:
+            record_document_violations(cursor, document_id, violations)
+        return document_id
 
     def update_document_status(self, document_id, new_status, user_id, user_name, notes=None):
         """Обновление статуса документа"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
             # Получаем текущий статус и время последнего изменения
@@ -210,6 +310,7 @@ class AuthSystem:
                     UPDATE documents SET controller_review_time = ?, current_controller_id = ?, status = 'Требует доработки'
                     WHERE id = ?
                 ''', (review_hours, user_id, document_id))
+                record_review(cursor, user_id, review_hours)
                 
                 # Добавляем автоматическую запись в историю о возврате разработчику
                 cursor.execute('''
@@ -228,6 +329,7 @@ class AuthSystem:
                     UPDATE documents SET controller_review_time = ?, current_controller_id = ?
                     WHERE id = ?
                 ''', (review_hours, user_id, document_id))
+                record_review(cursor, user_id, review_hours)
             
             conn.commit()
             conn.close()
@@ -236,10 +338,100 @@ class AuthSystem:
             
         except Exception as e:
             return {'success': False, 'error': str(e)}
+    def update_documents_status(self, document_ids, new_status, user_id, user_name, notes=None):
+        """Решение нормоконтролёра по нескольким документам в одной транзакции.
+        
+        new_status - одно из REVIEW_STATUSES; меняются только документы очереди
+        нормоконтролёра (CONTROLLER_QUEUE_STATUSES), остальные возвращаются с
+        ошибкой. Переходы те же, что в update_document_status, но время проверки,
+        обновления документов и записи истории считаются одним оператором на
+        все документы. Возвращает результат по каждому id в порядке document_ids.
+        """
+        if new_status not in self.REVIEW_STATUSES:
+            return {'success': False, 'error': f'Недопустимый статус: {new_status}'}
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            # Документы пакета с прежним статусом и временем с последней смены статуса (в часах);
+            # время считается один раз, до изменения last_status_change
+            cursor.execute('''
+                CREATE TEMP TABLE status_batch (
+                    document_id INTEGER PRIMARY KEY,
+                    previous_status TEXT,
+                    hours REAL
+                )
+            ''')
+            cursor.executemany('INSERT OR IGNORE INTO temp.status_batch (document_id) VALUES (?)',
+                               [(document_id,) for document_id in document_ids])
+            cursor.execute('''
+                UPDATE temp.status_batch
+                SET previous_status = d.status,
+                    hours = (julianday(CURRENT_TIMESTAMP) - julianday(d.last_status_change)) * 24
+                FROM documents d
+                WHERE d.id = status_batch.document_id
+            ''')
+            cursor.execute('SELECT document_id, previous_status, hours FROM temp.status_batch '
+                           'WHERE previous_status IS NOT NULL')
+            found = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+            # Документы не из очереди проверки и ненайденные не меняются
+            queue = ', '.join('?' * len(self.CONTROLLER_QUEUE_STATUSES))
+            cursor.execute(f'DELETE FROM temp.status_batch WHERE previous_status IS NULL '
+                           f'OR previous_status NOT IN ({queue})', self.CONTROLLER_QUEUE_STATUSES)
+            updated = {document_id: found[document_id] for document_id in found
+                       if found[document_id][0] in self.CONTROLLER_QUEUE_STATUSES}
+            batch = 'SELECT document_id FROM temp.status_batch'
+            
+            # Отклоненный документ сразу возвращается разработчику
+            final_status = 'Требует доработки' if new_status == 'Отклонено' else new_status
+            cursor.execute(f'''
+                UPDATE documents
+                SET status = ?, status_change_count = status_change_count + 1, last_status_change = CURRENT_TIMESTAMP
+                WHERE id IN ({batch})
+            ''', (final_status,))
+            
+            cursor.execute(f'''
+                INSERT INTO document_status_history (document_id, status, changed_by, changed_by_name, notes)
+                SELECT document_id, ?, ?, ?, ? FROM ({batch}) ORDER BY document_id
+            ''', (new_status, user_id, user_name, notes))
+            
+            cursor.execute('''
+                UPDATE documents SET controller_review_time = b.hours, current_controller_id = ?
+                FROM temp.status_batch b
+                WHERE documents.id = b.document_id
+            ''', (user_id,))
+            record_reviews(cursor, user_id, [hours for _, hours in updated.values()])
+            
+            if new_status == 'Отклонено':
+                cursor.execute(f'''
+                    INSERT INTO document_status_history (document_id, status, changed_by, changed_by_name, notes)
+                    SELECT document_id, 'Требует доработки', ?, ?, 'Документ отклонен и требует повторной загрузки'
+                    FROM ({batch}) ORDER BY document_id
+                ''', (user_id, user_name))
+            
+            cursor.execute('DROP TABLE temp.status_batch')
+            conn.commit()
+            conn.close()
+            
+            results = []
+            for document_id in document_ids:
+                if document_id in updated:
+                    results.append({'document_id': document_id, 'success': True,
+                                    'previous_status': updated[document_id][0], 'status': final_status})
+                elif document_id in found:
+                    results.append({'document_id': document_id, 'success': False,
+                                    'error': f'Документ не в очереди проверки (статус: {found[document_id][0]})'})
+                else:
+                    results.append({'document_id': document_id, 'success': False, 'error': 'Документ не найден'})
+            return {'success': True, 'updated': len(updated), 'results': results}
+            
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
     def get_user_documents(self, user_id, user_role):
         """Получение документов пользователя"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
             if user_role == 'developer':
@@ -254,56 +446,283 @@ class AuthSystem:
                 # (не только те, что ему назначены)
                 cursor.execute('''
                     SELECT * FROM documents 
-                    WHERE status IN ('Нет замечаний', 'Исправлено')
+                    WHERE status IN (?, ?)
                     ORDER BY upload_date DESC
-                ''')
+                ''', self.CONTROLLER_QUEUE_STATUSES)
             
             documents = cursor.fetchall()
             conn.close()
             
-            return [
+            return [self._document_from_row(doc) for doc in documents]
+        except Exception as e:
+            print(f"Ошибка при получении документов: {e}")
+            return []
+    
+    def get_document(self, document_id):
+        """Получение одного документа (None, если не найден)"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM documents WHERE id = ?', (document_id,))
+            doc = cursor.fetchone()
+            conn.close()
+            
+            return self._document_from_row(doc) if doc else None
+        except Exception as e:
+            print(f"Ошибка при получении документа: {e}")
+            return None
+    
+    def get_document_version(self, document_id):
+        """Признаки изменения документа для ETag: (число смен статуса, время последней смены,
+        файл, версия правил); None, если документ не найден"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT status_change_count, last_status_change, filename, rules_version
+                FROM documents WHERE id = ?
+            ''', (document_id,))
+            version = cursor.fetchone()
+            conn.close()
+            return tuple(version) if version else None
+        except Exception as e:
+            print(f"Ошибка при получении версии документа: {e}")
+            return None
+    
+    def get_document_file(self, document_id):
+        """Файл документа: путь, исходное имя и SHA-256 (None, если документ не найден)"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT filename, original_filename, file_hash FROM documents WHERE id = ?',
+                           (document_id,))
+            document = cursor.fetchone()
+            conn.close()
+            
+            if not document:
+                return None
+            return {'filename': document[0], 'original_filename': document[1], 'file_hash': document[2]}
+        except Exception as e:
+            print(f"Ошибка при получении файла документа: {e}")
+            return None
+    
+    def set_document_file_hash(self, document_id, file_hash):
+        """Сохранение хэша файла для документов, загруженных до появления столбца file_hash"""
+        try:
+            conn = self.get_connection()
+            conn.execute('UPDATE documents SET file_hash = ? WHERE id = ? AND file_hash IS NULL',
+                         (file_hash, document_id))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Ошибка при сохранении хэша файла: {e}")
+    
+    def search_documents(self, user_id, user_role, query, page=1, per_page=20):
+        """Полнотекстовый поиск среди документов пользователя (как в get_user_documents).
+        
+        Возвращает {'total': число совпадений, 'results': [...]} для страницы page,
+        результаты упорядочены по релевантности, snippet - HTML с <mark>.
+        """
+        match = build_match_query(query)
+        if match is None:
+            return {'total': 0, 'results': []}
+        
+        visibility_sql, visibility_params = self._visibility_condition(user_id, user_role)
+        page_sql, count_sql = search_sql(visibility_sql)
+        
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(count_sql, (match, *visibility_params))
+            total = cursor.fetchone()[0]
+            cursor.execute(page_sql, (*SNIPPET_MARKERS, match, *visibility_params,
+                                      per_page, (page - 1) * per_page))
+            rows = cursor.fetchall()
+            conn.close()
+        except sqlite3.OperationalError as e:
+            print(f"Ошибка полнотекстового поиска: {e}")
+            return {'total': 0, 'results': []}
+        
+        return {
+            'total': total,
+            'results': [
                 {
-                    'id': doc[0],
-                    'filename': doc[1],
-                    'original_filename': doc[2],
-                    'developer_id': doc[3],
-                    'developer_name': doc[4],
-                    'upload_date': doc[5],
-                    'status': doc[6],
-                    'auto_check_result': doc[7],
-                    'developer_correction_time': doc[8],
-                    'controller_review_time': doc[9],
-                    'status_change_count': doc[10],
-                    'current_controller_id': doc[11],
-                    'last_status_change': doc[12]
+                    'id': row[0],
+                    'original_filename': row[1],
+                    'status': row[2],
+                    'upload_date': row[3],
+                    'developer_name': row[4],
+                    'snippet': snippet_html(row[5]),
+                    'rank': row[6]
                 }
-                for doc in documents
+                for row in rows
             ]
+        }
+    
+    def _visibility_condition(self, user_id, user_role):
+        """Условие SQL (для псевдонима d) и параметры: документ входит в список пользователя
+        (как в get_user_documents и is_document_visible)"""
+        if user_role == 'developer':
+            return 'd.developer_id = ?', (user_id,)
+        return (f"d.status IN ({', '.join('?' * len(self.CONTROLLER_QUEUE_STATUSES))})",
+                tuple(self.CONTROLLER_QUEUE_STATUSES))
+    
+    def find_documents_by_designation(self, designation, user_id, user_role, exclude_document_id=None):
+        """Документы с обозначением designation (нормализованным) в основной надписи.
+        
+        Возвращает {'documents': [...], 'hidden_documents': N}: сведения только о
+        документах из списка пользователя, остальные - только числом.
+        """
+        visibility_sql, visibility_params = self._visibility_condition(user_id, user_role)
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT d.id, d.original_filename, d.developer_name, d.status, d.upload_date,
+                       {visibility_sql}
+                FROM {DESIGNATIONS_TABLE} dd
+                JOIN documents d ON d.id = dd.document_id
+                WHERE dd.designation = ? AND dd.document_id != ?
+                ORDER BY d.id
+            ''', (*visibility_params, designation,
+                  exclude_document_id if exclude_document_id is not None else -1))
+            documents = cursor.fetchall()
+            conn.close()
+            return {
+                'documents': [
+                    {
+                        'id': doc[0],
+                        'original_filename': doc[1],
+                        'developer_name': doc[2],
+                        'status': doc[3],
+                        'upload_date': doc[4]
+                    }
+                    for doc in documents if doc[5]
+                ],
+                'hidden_documents': sum(1 for doc in documents if not doc[5])
+            }
         except Exception as e:
-            print(f"Ошибка при получении документов: {e}")
-            return []
+            print(f"Ошибка при поиске по обозначению: {e}")
+            return {'documents': [], 'hidden_documents': 0}
+    
+    def get_designation_conflicts(self, user_id, user_role, document_id=None):
+        """Обозначения, встречающиеся в нескольких документах:
+        {обозначение: {'document_ids': [id документов пользователя], 'hidden_documents': N}}.
+        
+        С document_id - только обозначения этого документа.
+        """
+        visibility_sql, visibility_params = self._visibility_condition(user_id, user_role)
+        select_sql = f'''
+            SELECT dd.designation,
+                   group_concat(CASE WHEN {visibility_sql} THEN dd.document_id END),
+                   SUM(CASE WHEN {visibility_sql} THEN 0 ELSE 1 END)
+            FROM {DESIGNATIONS_TABLE} dd
+            JOIN documents d ON d.id = dd.document_id
+        '''
+        params = (*visibility_params, *visibility_params)
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            if document_id is None:
+                cursor.execute(f'''{select_sql}
+                    GROUP BY dd.designation HAVING COUNT(*) > 1
+                    ORDER BY dd.designation
+                ''', params)
+            else:
+                cursor.execute(f'''{select_sql}
+                    WHERE dd.designation IN (SELECT designation FROM {DESIGNATIONS_TABLE} WHERE document_id = ?)
+                    GROUP BY dd.designation HAVING COUNT(*) > 1
+                    ORDER BY dd.designation
+                ''', (*params, document_id))
+            conflicts = cursor.fetchall()
+            conn.close()
+            return {
+                designation: {
+                    'document_ids': sorted(int(i) for i in ids.split(',')) if ids else [],
+                    'hidden_documents': hidden
+                }
+                for designation, ids, hidden in conflicts
+            }
+        except Exception as e:
+            print(f"Ошибка при поиске повторяющихся обозначений: {e}")
+            return {}
+    
+    def get_workload_stats(self):
+        """Нагрузка нормоконтролёров и частота замечаний по правилам (из таблиц статистики)"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            stats = read_stats(cursor, self.CONTROLLER_QUEUE_STATUSES)
+            cursor.execute("SELECT id, first_name, last_name FROM users WHERE role = 'controller'")
+            controllers = cursor.fetchall()
+            conn.close()
+            
+            # Нормоконтролёры без проверок и очереди тоже попадают в сводку
+            for controller_id, first_name, last_name in controllers:
+                entry = stats['controllers'].setdefault(controller_id, {
+                    'controller_id': controller_id, 'queue_length': 0, 'reviews': 0,
+                    'mean_review_hours': None, 'p50_review_hours': None, 'p90_review_hours': None
+                })
+                entry['controller_name'] = f"{first_name} {last_name}"
+            stats['controllers'] = sorted(stats['controllers'].values(), key=lambda entry: entry['controller_id'])
+            return {'success': True, 'stats': stats}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def is_document_visible(self, document, user_id, user_role):
+        """Входит ли документ в список документов пользователя (как в get_user_documents)"""
+        if user_role == 'developer':
+            return document['developer_id'] == user_id
+        return document['status'] in self.CONTROLLER_QUEUE_STATUSES
+    
+    @staticmethod
+    def _document_from_row(doc):
+        return {
+            'id': doc[0],
+            'filename': doc[1],
+            'original_filename': doc[2],
+            'developer_id': doc[3],
+            'developer_name': doc[4],
+            'upload_date': doc[5],
+            'status': doc[6],
+            'auto_check_result': doc[7],
+            'developer_correction_time': doc[8],
+            'controller_review_time': doc[9],
+            'status_change_count': doc[10],
+            'current_controller_id': doc[11],
+            'last_status_change': doc[12]
+        }
+    
     def get_document_status_history(self, document_id):
         """Получение истории статусов документа"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
+            # Запрос читает только покрывающий индекс (document_id, change_date, id, ...)
             cursor.execute('''
-                SELECT status, changed_by_name, change_date, notes 
+                SELECT id, status, changed_by_name, change_date, notes 
                 FROM document_status_history 
                 WHERE document_id = ? 
-                ORDER BY change_date
+                ORDER BY change_date, id
             ''', (document_id,))
-            
             history = cursor.fetchall()
+            cursor.execute('SELECT history_archived FROM documents WHERE id = ?', (document_id,))
+            archived = cursor.fetchone()
             conn.close()
             
+            if archived and archived[0]:
+                # Записи, перенос которых прервался, есть в обеих базах - берем одну
+                rows = {item[0]: item for item in read_archived_history(self.db_path, document_id)}
+                rows.update((item[0], item) for item in history)
+                history = sorted(rows.values(), key=lambda item: (item[3] or '', item[0]))
+            
             return [
                 {
-                    'status': item[0],
-                    'changed_by': item[1],
-                    'change_date': item[2],
-                    'notes': item[3]
+                    'status': item[1],
+                    'changed_by': item[2],
+                    'change_date': item[3],
+                    'notes': item[4]
                 }
                 for item in history
             ]
@@ -311,5 +730,6 @@ class AuthSystem:
             print(f"Ошибка при получении истории: {e}")
             return []
 
-# Создаем глобальный экземпляр системы аутентификации
-auth_system = AuthSystem()
\ No newline at end of file
+# Создаем глобальный экземпляр системы аутентификации;
+# таблицы создаются в create_app() (app.py), а не при импорте модуля
+auth_system = AuthSystem(initialize=False)
\ No newline at end of file
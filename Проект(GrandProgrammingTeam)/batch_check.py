@@ -0,0 +1,207 @@
+"""Пакетный нормоконтроль папки с чертежами без веб-интерфейса.
+
+Обходит каталог, проверяет PDF в пуле процессов и пишет по одной JSON-строке
+на документ. Файл результатов одновременно служит контрольной точкой:
+при повторном запуске уже проверенные документы пропускаются.
+
+Пример: python batch_check.py /archive/drawings -o results.jsonl -j 8
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+WORKER_CRASH_ERROR = 'Процесс проверки аварийно завершился на этом файле'
+
+
+def find_pdf_files(root: str) -> list:
+    """Все PDF-файлы каталога (рекурсивно), в стабильном порядке"""
+    from itog import allowed_file
+
+    pdf_files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if allowed_file(filename):
+                pdf_files.append(os.path.abspath(os.path.join(dirpath, filename)))
+    return pdf_files
+
+
+def _init_worker():
+    """Процесс пула распознает сканы сам, без вложенного пула OCR"""
+    from ocr_fallback import run_ocr_inline
+    run_ocr_inline()
+
+
+def check_document(pdf_path: str) -> dict:
+    """Проверка одного документа (выполняется в дочернем процессе)"""
+    from itog import doc_analyzer, rule_engine
+
+    started = time.perf_counter()
+    try:
+        # Подробная диагностика анализатора в пакетном режиме не нужна
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            text_data = doc_analyzer.extract_text_from_pdf(pdf_path)
+            result = rule_engine.run_all_checks({'text_data': text_data})
+    except Exception as e:
+        return {'path': pdf_path, 'error': str(e), 'seconds': round(time.perf_counter() - started, 3)}
+
+    record = {
+        'path': pdf_path,
+        'pages': text_data.get('total_pages', 0),
+        'is_compliant': result['is_compliant'],
+        'statistics': result['statistics'],
+        'violations': result['violations'],
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+    if text_data.get('error'):
+        record['error'] = text_data['error']
+    return record
+
+
+def load_checkpoint(output_path: str) -> dict:
+    """Уже записанные результаты {путь: запись}; записи с ошибкой проверяются заново"""
+    done = {}
+    if output_path == '-' or not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Оборванная последняя строка после аварийного завершения
+            if 'error' not in record:
+                done[record['path']] = record
+    return done
+
+
+class BatchSummary:
+    def __init__(self):
+        self.documents = 0
+        self.compliant = 0
+        self.errors = 0
+        self.violations_by_rule = Counter()
+        self.documents_by_rule = Counter()
+
+    def add(self, record: dict):
+        self.documents += 1
+        if 'error' in record:
+            self.errors += 1
+        if record.get('is_compliant'):
+            self.compliant += 1
+        rules = Counter(v['rule_id'] for v in record.get('violations', []))
+        self.violations_by_rule.update(rules)
+        self.documents_by_rule.update(rules.keys())
+
+    def print_report(self, processed: int, elapsed: float, stream=sys.stderr):
+        print(f"\n📊 ИТОГИ ПАКЕТНОЙ ПРОВЕРКИ", file=stream)
+        print(f"   Документов в результатах: {self.documents}", file=stream)
+        print(f"   Без замечаний: {self.compliant}", file=stream)
+        print(f"   С ошибками обработки: {self.errors}", file=stream)
+        print(f"   Нарушения по пунктам (нарушений / документов):", file=stream)
+        for rule_id, count in sorted(self.violations_by_rule.items()):
+            print(f"      • {rule_id}: {count} / {self.documents_by_rule[rule_id]}", file=stream)
+        throughput = processed / elapsed if elapsed > 0 else 0.0
+        print(f"   Обработано за запуск: {processed} за {elapsed:.1f} с ({throughput:.2f} док/с)", file=stream)
+
+
+def run_batch(root: str, output_path: str, workers: int = None) -> BatchSummary:
+    pdf_files = find_pdf_files(root)
+    done = load_checkpoint(output_path)
+    pending = [path for path in pdf_files if path not in done]
+
+    summary = BatchSummary()
+    for record in done.values():
+        summary.add(record)
+
+    print(f"📁 Найдено PDF: {len(pdf_files)}, уже проверено: {len(pdf_files) - len(pending)}, "
+          f"к проверке: {len(pending)}", file=sys.stderr)
+
+    workers = workers or os.cpu_count() or 1
+    output = sys.stdout if output_path == '-' else open(output_path, 'a', encoding='utf-8')
+    started = time.perf_counter()
+    processed = 0
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    try:
+        # Ограничиваем число задач в очереди, чтобы не держать в памяти весь архив
+        paths = iter(pending)
+        in_flight = {}
+        # Файлы, которые проверялись в упавшем пуле: виновника не определить,
+        # поэтому они проверяются повторно по одному
+        suspects = []
+        isolated = False
+        while True:
+            if suspects:
+                if not in_flight:
+                    path = suspects.pop(0)
+                    in_flight[executor.submit(check_document, path)] = path
+                    isolated = True
+            else:
+                isolated = False
+                while len(in_flight) < workers * 4:
+                    path = next(paths, None)
+                    if path is None:
+                        break
+                    in_flight[executor.submit(check_document, path)] = path
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            pool_broken = False
+            for future in finished:
+                path = in_flight.pop(future)
+                try:
+                    record = future.result()
+                except BrokenProcessPool:
+                    pool_broken = True
+                    if not isolated:
+                        suspects.append(path)
+                        continue
+                    # Файл проверялся один - процесс упал именно на нем
+                    record = {'path': path, 'error': WORKER_CRASH_ERROR}
+                except Exception as e:
+                    record = {'path': path, 'error': str(e)}
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                output.flush()
+                summary.add(record)
+                processed += 1
+
+            if pool_broken:
+                # Остальные задачи упавшего пула тоже завершатся ошибкой - проверяем их заново
+                suspects.extend(in_flight.values())
+                in_flight.clear()
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+                print(f"⚠️ Процесс проверки аварийно завершился, пул перезапущен; "
+                      f"повторно по одному: {len(suspects)} файлов", file=sys.stderr)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if output is not sys.stdout:
+            output.close()
+
+    summary.print_report(processed, time.perf_counter() - started)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Пакетный нормоконтроль PDF-чертежей')
+    parser.add_argument('directory', help='Каталог с PDF-документами (обходится рекурсивно)')
+    parser.add_argument('-o', '--output', default='normcontrol_results.jsonl',
+                        help='Файл JSON Lines с результатами и контрольной точкой ("-" - stdout)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Число процессов (по умолчанию - число ядер)')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f'Каталог не найден: {args.directory}')
+
+    run_batch(args.directory, args.output, args.workers)
+
+
+if __name__ == '__main__':
+    main()
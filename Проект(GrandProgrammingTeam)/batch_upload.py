@@ -0,0 +1,226 @@
+"""Пакетная загрузка документов: много PDF или ZIP-архив в одном запросе.
+
+Файлы пакета сохраняются во временную папку (PDF из архива - по одному,
+потоком, без распаковки всего архива в память) и анализируются в пуле
+процессов. Каждый процесс пула анализирует файл, переносит его в хранилище
+и сохраняет признаки страниц; веб-процесс получает только результат
+проверки, текст для поиска и обозначения. Строки документов всех файлов
+пакета записываются в базу одной транзакцией (AuthSystem.add_documents).
+
+Пул создается при первой пакетной загрузке; процессы запускаются методом
+spawn, так как веб-сервер многопоточный. Если процесс пула аварийно
+завершился (сбой MuPDF на поврежденном PDF, нехватка памяти), пул сломан:
+файлы, которые он проверял, считаются непроверенными, а следующая загрузка
+создает новый пул.
+"""
+import contextlib
+import hashlib
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.utils import secure_filename
+
+BATCH_MAX_FILES = 50
+# Ограничение размера запроса пакетной загрузки (общее для остальных запросов - 16 МБ)
+BATCH_MAX_CONTENT_LENGTH = 256 * 1024 * 1024
+# Суммарный размер PDF, распакованных из архивов одного пакета
+BATCH_MAX_UNPACKED_SIZE = 512 * 1024 * 1024
+BATCH_WORKERS = min(4, os.cpu_count() or 1)
+COPY_BLOCK_SIZE = 1024 * 1024
+# Флаг ZIP: имя записи в UTF-8; без него Windows пишет русские имена в cp866
+ZIP_UTF8_FLAG = 0x800
+
+_executor = None
+
+
+class BatchError(Exception):
+    """Пакет нельзя принять (слишком много файлов, слишком большой архив)"""
+
+
+def _init_worker():
+    """Процесс пула распознает сканы сам, без вложенного пула OCR"""
+    from ocr_fallback import run_ocr_inline
+    run_ocr_inline()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=BATCH_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_init_worker)
+    return _executor
+
+
+def reset_executor(executor: ProcessPoolExecutor):
+    """Сломанный пул больше не используется; следующий get_executor создаст новый"""
+    global _executor
+    if _executor is executor:
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_upload(temp_path: str, storage_path: str) -> tuple:
+    """Задача анализа файла пакета в пуле: (задача, пул); сломанный пул заменяется новым"""
+    executor = get_executor()
+    try:
+        return executor.submit(analyze_upload, temp_path, storage_path), executor
+    except BrokenProcessPool:
+        reset_executor(executor)
+        executor = get_executor()
+        return executor.submit(analyze_upload, temp_path, storage_path), executor
+
+
+def discard_upload(temp_path: str, storage_path: str):
+    """Удаление временного файла, файла в хранилище и признаков непринятого файла пакета"""
+    from page_features import remove_features
+
+    remove_files([temp_path, storage_path])
+    remove_features(storage_path)
+
+
+def discard_batch(submitted: list, files: list):
+    """Уборка пакета, прерванного до записи в базу (клиент отключился).
+
+    submitted - [(задача, временный файл, путь в хранилище)] отправленных в пул
+    файлов. Ожидающие задачи отменяются; выполняющиеся и завершенные убираются,
+    когда процесс пула закончит с файлом. Неотправленные файлы удаляются сразу.
+    """
+    sent = set()
+    for future, temp_path, storage_path in submitted:
+        sent.add(temp_path)
+        if future.cancel():
+            remove_files([temp_path])
+        else:
+            future.add_done_callback(lambda _, paths=(temp_path, storage_path): discard_upload(*paths))
+    remove_files(temp_path for _, temp_path in files if temp_path not in sent)
+
+
+def _zip_member_name(member: zipfile.ZipInfo) -> str:
+    name = member.filename
+    if not member.flag_bits & ZIP_UTF8_FLAG:
+        try:
+            name = name.encode('cp437').decode('cp866')
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            pass
+    return os.path.basename(name.replace('\\', '/'))
+
+
+def _temp_path(upload_folder: str, filename: str) -> str:
+    return os.path.join(upload_folder, f"{uuid.uuid4()}_{secure_filename(filename)}")
+
+
+def _extract_pdfs(archive, archive_name: str, upload_folder: str, files: list, skipped: list, unpacked: list):
+    """PDF из ZIP-архива во временные файлы; unpacked - [распаковано байт] на весь пакет"""
+    from itog import allowed_file
+
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        skipped.append({'filename': archive_name, 'error': 'Архив поврежден или это не ZIP'})
+        return
+    with zip_file:
+        for member in zip_file.infolist():
+            if member.is_dir():
+                continue
+            name = _zip_member_name(member)
+            if not allowed_file(name):
+                skipped.append({'filename': f'{archive_name}/{name}', 'error': 'Не PDF-файл'})
+                continue
+            if len(files) >= BATCH_MAX_FILES:
+                raise BatchError(f'В пакете больше {BATCH_MAX_FILES} файлов')
+            temp_path = _temp_path(upload_folder, name)
+            files.append((name, temp_path))
+            # Размер считается по фактически распакованным байтам, а не по заголовку архива
+            with zip_file.open(member) as source, open(temp_path, 'wb') as target:
+                while True:
+                    block = source.read(COPY_BLOCK_SIZE)
+                    if not block:
+                        break
+                    unpacked[0] += len(block)
+                    if unpacked[0] > BATCH_MAX_UNPACKED_SIZE:
+                        raise BatchError(f'Распакованные файлы больше {BATCH_MAX_UNPACKED_SIZE // (1024 * 1024)} МБ')
+                    target.write(block)
+
+
+def collect_batch_files(uploads: list, upload_folder: str) -> tuple:
+    """Временные файлы пакета: ([(имя, путь)], [пропущенные файлы с причиной]).
+
+    При BatchError уже сохраненные файлы удаляются.
+    """
+    from itog import allowed_file
+
+    files, skipped = [], []
+    unpacked = [0]
+    try:
+        for upload in uploads:
+            name = upload.filename or ''
+            if name.lower().endswith('.zip'):
+                _extract_pdfs(upload.stream, name, upload_folder, files, skipped, unpacked)
+            elif allowed_file(name):
+                if len(files) >= BATCH_MAX_FILES:
+                    raise BatchError(f'В пакете больше {BATCH_MAX_FILES} файлов')
+                temp_path = _temp_path(upload_folder, name)
+                files.append((name, temp_path))
+                upload.save(temp_path)
+            else:
+                skipped.append({'filename': name, 'error': 'Требуется PDF-файл или ZIP-архив'})
+    except BatchError:
+        remove_files(path for _, path in files)
+        raise
+    return files, skipped
+
+
+def remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def analyze_upload(temp_path: str, storage_path: str) -> dict:
+    """Анализ файла пакета (в процессе пула): результат проверки и данные для базы.
+
+    При успехе файл перенесен в storage_path, рядом сохранены признаки
+    страниц; при ошибке временный файл удален, а в ответе есть 'error'.
+    """
+    from designation_codes import document_designations
+    from document_search import search_fields_from_text_data
+    from itog import DESIGNATIONS, doc_analyzer, rule_engine
+    from page_features import remove_features, save_features
+
+    started = time.perf_counter()
+    try:
+        # Подробная диагностика анализатора по каждому файлу пакета не нужна
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            text_data = doc_analyzer.extract_text_from_pdf(temp_path)
+            if text_data.get('error'):
+                raise Exception(text_data['error'])
+            result = rule_engine.run_all_checks({'text_data': text_data})
+        shutil.move(temp_path, storage_path)
+        try:
+            save_features(storage_path, text_data)
+        except Exception as e:
+            # Признаки - только кэш: при ошибке повторная проверка разберет PDF заново
+            print(f"⚠️ Не удалось сохранить признаки страниц {storage_path}: {e}")
+        digest = hashlib.sha256()
+        with open(storage_path, 'rb') as f:
+            for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+                digest.update(block)
+        return {
+            'result': result,
+            'pages': text_data.get('total_pages', 0),
+            'file_hash': digest.hexdigest(),
+            'search_fields': search_fields_from_text_data(text_data),
+            'designations': document_designations(DESIGNATIONS, text_data),
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+    except Exception as e:
+        remove_files([temp_path, storage_path])
+        remove_features(storage_path)
+        return {'error': str(e), 'seconds': round(time.perf_counter() - started, 3)}
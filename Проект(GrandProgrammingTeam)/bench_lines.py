@@ -0,0 +1,38 @@
+"""Отчет о предобработке линий: сколько отрезков остается для анализа.
+
+Запуск: python bench_lines.py [папка_с_pdf]
+"""
+import glob
+import os
+import sys
+import time
+
+import fitz
+
+from line_preprocessing import preprocess_lines, line_count_drop
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'для теста'
+    total_raw = total_analysed = 0
+    for path in sorted(glob.glob(os.path.join(folder, '*.pdf'))):
+        with fitz.open(path) as doc:
+            for page in doc:
+                drawings = page.get_drawings()
+                started = time.perf_counter()
+                stats = preprocess_lines(drawings)['stats']
+                elapsed = time.perf_counter() - started
+                total_raw += stats['raw']
+                total_analysed += stats['analysed']
+                print(f"📄 {os.path.basename(path)}, стр. {page.number + 1}: "
+                      f"отрезков {stats['raw']}, после слияния {stats['merged']}, "
+                      f"штриховка {stats['hatch']}, в анализ {stats['analysed']} "
+                      f"(-{line_count_drop(stats) * 100:.0f}%, {elapsed * 1000:.1f} мс)")
+
+    if total_raw:
+        print(f"📏 Всего: {total_raw} → {total_analysed} "
+              f"(-{(1 - total_analysed / total_raw) * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Микробенчмарк сканера элементов: отдельные re.findall против единого прохода.
+
+Запуск: python bench_patterns.py [количество_повторов]
+"""
+import re
+import sys
+import timeit
+
+from itog import Config, _scan_elements_cached
+
+# Типичный текст поля чертежа и основной надписи (склеенный из span'ов)
+SAMPLE_TEXT = (
+    "РНАТ.123456.001ВО Чертеж общего вида Ra 3,2 Rz50 шероховатость Ra 6.3 "
+    "⌀25 R10 45° 30 град 120±0.1 12.5* 40* 90** 2** *15 Б В Г А-А "
+    "⊥ Б ∥ В—Г 1 * Размеры для справок 2. Обработать поверхность Ж "
+    "Масштаб 1:2 Лист 1 Листов 3 Разраб. Пров. Т.контр. Н.контр. Утв. "
+) * 20
+
+
+def legacy_scan(text: str) -> dict:
+    """Прежняя реализация: десятки findall по некомпилированным строкам"""
+    codes = []
+    for pattern in [r'[А-ЯA-Z]{2,4}[\.\-]\d+[\.\-]\d+[А-ЯA-Z]{2,3}',
+                    r'[А-ЯA-Z]{2,4}\d+\.\d+[А-ЯA-Z]{2,3}']:
+        codes.extend(re.findall(pattern, text, re.IGNORECASE))
+
+    letters = re.findall(r'(?<!\w)[A-ZА-Я](?!\w)', text)
+    dimension_letters = set()
+    for pattern in [r'R\d', r'⌀\d', r'[A-Z]\d', r'\d[A-Z]']:
+        for match in re.findall(pattern, text):
+            if match[0].isalpha():
+                dimension_letters.add(match[0])
+            elif match[1].isalpha():
+                dimension_letters.add(match[1])
+    filtered_letters = []
+    for letter in letters:
+        if (letter not in Config.COMMON_DRAWING_LETTERS and
+            letter not in dimension_letters and
+            letter not in filtered_letters):
+            filtered_letters.append(letter)
+
+    asterisks = re.findall(r'\d+\*+|\*+\d+', text)
+
+    dimensions = []
+    for pattern in [r'\d+[.,]?\d*\s*[ммсм]', r'\d+[.,]?\d*\s*°', r'[±]?\d+[.,]?\d*',
+                    r'R\d+[.,]?\d*', r'⌀\d+[.,]?\d*', r'\d+\s*град', r'\d+\s*deg']:
+        dimensions.extend(re.findall(pattern, text, re.IGNORECASE))
+
+    roughness = []
+    for pattern in [r'R[az]\s*\d+[.,]?\d*', r'R[az]\d+[.,]?\d*',
+                    r'шероховатость\s*R[az]\s*\d+[.,]?\d*']:
+        for match in re.findall(pattern, text, re.IGNORECASE):
+            roughness.append(re.sub(r'\s+', ' ', match.strip()))
+
+    bases = []
+    for symbol in Config.TOLERANCE_SYMBOLS:
+        if symbol in text:
+            bases.extend(re.findall(f'{re.escape(symbol)}[\\s]*([A-Z{Config.BASE_SEPARATOR}]+)', text))
+
+    return {
+        'codes': codes,
+        'letters': filtered_letters,
+        'asterisks': list(set(asterisks)),
+        'dimensions': list(set(dimensions)),
+        'roughness': list(set(roughness)),
+        'bases': bases
+    }
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    # Кэш обходим, чтобы измерять сам проход сканера
+    scan = _scan_elements_cached.__wrapped__
+
+    legacy = legacy_scan(SAMPLE_TEXT)
+    current = scan(SAMPLE_TEXT)
+    assert sorted(set(legacy['codes'])) == sorted(set(current[0])), 'коды не совпадают'
+    assert legacy['letters'] == list(current[1]), 'буквы не совпадают'
+    assert sorted(legacy['asterisks']) == sorted(set(current[2])), 'звездочки не совпадают'
+    assert sorted(legacy['roughness']) == sorted(current[4]), 'шероховатости не совпадают'
+
+    print(f"📏 Длина текста: {len(SAMPLE_TEXT)} символов, повторов: {number}")
+    legacy_time = timeit.timeit(lambda: legacy_scan(SAMPLE_TEXT), number=number)
+    scan_time = timeit.timeit(lambda: scan(SAMPLE_TEXT), number=number)
+    print(f"   Отдельные findall: {legacy_time / number * 1e6:.1f} мкс/вызов")
+    print(f"   Единый сканер:     {scan_time / number * 1e6:.1f} мкс/вызов")
+    print(f"   Ускорение:         x{legacy_time / scan_time:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Время холодного старта: импорт модулей и сборка приложения в новом процессе.
+
+Запуск: python bench_startup.py [количество_повторов]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = [
+    ('import auth', 'import auth'),
+    ('import itog', 'import itog'),
+    ('import app', 'import app'),
+    ('create_app()', 'import app; app.create_app()'),
+    ('первый анализ (импорт PyMuPDF)', 'import itog, fitz'),
+]
+
+
+def measure(code: str, number: int) -> float:
+    """Медиана времени запуска python -c code (секунды)"""
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    times = []
+    # Отдельная рабочая папка, чтобы не создавать uploads/users.db в проекте
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(number):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    baseline = measure('pass', number)
+    print(f"⏱️ Холодный старт (медиана из {number}, интерпретатор без импортов: {baseline * 1000:.0f} мс)")
+    for title, code in SCENARIOS:
+        print(f"   {title:32} {measure(code, number) * 1000:6.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""Загрузка больших документов частями с возобновлением.
+
+Клиент создает сессию загрузки (имя и размер файла), затем отправляет части
+по порядку телом PUT-запроса со смещением; после обрыва связи он узнает,
+сколько байт уже принято, и продолжает с этого места. Файл собирается сразу
+в одном файле .part: каждая часть пишется на диск блоками по мере чтения
+запроса, поэтому ни часть, ни весь файл не держатся в памяти, а сборка в
+конце - это переименование.
+
+Принятый размер - это размер файла .part: часть, запись которой оборвалась,
+обрезается до прежнего размера. SHA-256 считается по мере записи; состояние
+хеша хранится в памяти процесса вместе со смещением, до которого оно
+посчитано. Если следующая часть пришла в другой рабочий процесс (serve.py)
+или процесс перезапускался, хеш один раз досчитывается по файлу с диска.
+
+Файлы сессий лежат в <uploads>/chunked: <id>.json (владелец, имя, размер,
+ожидаемый хеш) и <id>.part. Незавершенные сессии старше UPLOAD_SESSION_TTL
+удаляются при создании новых.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from ttl_cache import TTLCache
+
+SESSIONS_DIR_NAME = 'chunked'
+# Часть должна помещаться в MAX_CONTENT_LENGTH приложения (16 МБ)
+CHUNK_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_SIZE = 1024 * 1024 * 1024
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+WRITE_BLOCK_SIZE = 1024 * 1024
+
+# Состояние хеша незавершенных загрузок этого процесса: {id: (смещение, hashlib)}
+_hash_states = TTLCache(256, UPLOAD_SESSION_TTL)
+_upload_locks = {}
+_upload_locks_guard = threading.Lock()
+
+
+class UploadError(Exception):
+    """Ошибка протокола загрузки; status - HTTP-код ответа"""
+
+    def __init__(self, message: str, status: int = 400, received: int = None):
+        super().__init__(message)
+        self.status = status
+        self.received = received
+
+
+def sessions_dir(upload_folder: str) -> str:
+    return os.path.join(upload_folder, SESSIONS_DIR_NAME)
+
+
+def _meta_path(upload_folder: str, upload_id: str) -> str:
+    return os.path.join(sessions_dir(upload_folder), f'{upload_id}.json')
+
+
+def part_path(upload_folder: str, upload_id: str) -> str:
+    return os.path.join(sessions_dir(upload_folder), f'{upload_id}.part')
+
+
+def _upload_lock(upload_id: str) -> threading.Lock:
+    with _upload_locks_guard:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def _remove_expired(upload_folder: str):
+    """Удаление сессий, в которые не приходили части дольше UPLOAD_SESSION_TTL"""
+    deadline = time.time() - UPLOAD_SESSION_TTL
+    for name in os.listdir(sessions_dir(upload_folder)):
+        upload_id, extension = os.path.splitext(name)
+        if extension != '.json':
+            continue
+        try:
+            last_activity = max(os.path.getmtime(_meta_path(upload_folder, upload_id)),
+                                os.path.getmtime(part_path(upload_folder, upload_id)))
+        except OSError:
+            last_activity = 0
+        if last_activity < deadline:
+            remove_session(upload_folder, upload_id)
+
+
+def create_session(upload_folder: str, user_id: int, filename: str, size: int, sha256: str = None) -> dict:
+    """Новая сессия загрузки; возвращает ее описание для клиента"""
+    if size <= 0:
+        raise UploadError('Пустой файл')
+    if size > MAX_UPLOAD_SIZE:
+        raise UploadError(f'Файл больше {MAX_UPLOAD_SIZE // (1024 * 1024)} МБ', 413)
+    if sha256 is not None and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256.lower())):
+        raise UploadError('Некорректный SHA-256 файла')
+
+    os.makedirs(sessions_dir(upload_folder), exist_ok=True)
+    _remove_expired(upload_folder)
+
+    upload_id = uuid.uuid4().hex
+    meta = {'user_id': user_id, 'filename': filename, 'size': size,
+            'sha256': sha256.lower() if sha256 else None, 'created': time.time()}
+    with open(_meta_path(upload_folder, upload_id), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    open(part_path(upload_folder, upload_id), 'wb').close()
+    _hash_states.set(upload_id, (0, hashlib.sha256()))
+    return describe(upload_id, meta, 0)
+
+
+def load_session(upload_folder: str, upload_id: str, user_id: int) -> dict:
+    """Описание сессии из файла; UploadError 404, если ее нет или она чужая"""
+    if not upload_id.isalnum():
+        raise UploadError('Сессия загрузки не найдена', 404)
+    try:
+        with open(_meta_path(upload_folder, upload_id), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise UploadError('Сессия загрузки не найдена', 404)
+    if meta['user_id'] != user_id:
+        raise UploadError('Сессия загрузки не найдена', 404)
+    return meta
+
+
+def received_size(upload_folder: str, upload_id: str) -> int:
+    try:
+        return os.path.getsize(part_path(upload_folder, upload_id))
+    except OSError:
+        raise UploadError('Сессия загрузки не найдена', 404)
+
+
+def describe(upload_id: str, meta: dict, received: int) -> dict:
+    return {
+        'upload_id': upload_id,
+        'filename': meta['filename'],
+        'size': meta['size'],
+        'received': received,
+        'chunk_size': CHUNK_SIZE,
+        'complete': received == meta['size']
+    }
+
+
+def _hash_state(upload_folder: str, upload_id: str, offset: int):
+    """hashlib-объект, посчитанный ровно по первым offset байтам файла"""
+    state = _hash_states.get(upload_id)
+    if state is not None and state[0] == offset:
+        return state[1]
+    # Часть пришла в другой процесс или после перезапуска: досчитываем хеш по диску
+    digest = hashlib.sha256()
+    with open(part_path(upload_folder, upload_id), 'rb') as f:
+        remaining = offset
+        while remaining:
+            block = f.read(min(WRITE_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest
+
+
+def write_chunk(upload_folder: str, upload_id: str, meta: dict, offset: int, stream, length: int) -> int:
+    """Запись части длиной length со смещения offset из потока stream.
+
+    Часть пишется блоками прямо из запроса; при обрыве файл обрезается до
+    прежнего размера. Возвращает новый принятый размер.
+    """
+    if length <= 0 or length > CHUNK_SIZE:
+        raise UploadError(f'Размер части должен быть от 1 байта до {CHUNK_SIZE} байт')
+
+    with _upload_lock(upload_id):
+        received = received_size(upload_folder, upload_id)
+        if offset != received:
+            # Клиент повторил уже принятую часть или пропустил часть - продолжать с received
+            raise UploadError('Смещение части не совпадает с принятым размером', 409, received)
+        if received + length > meta['size']:
+            raise UploadError('Часть выходит за объявленный размер файла')
+
+        digest = _hash_state(upload_folder, upload_id, received).copy()
+        written = 0
+        with open(part_path(upload_folder, upload_id), 'r+b') as f:
+            f.seek(received)
+            try:
+                while written < length:
+                    block = stream.read(min(WRITE_BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    digest.update(block)
+                    written += len(block)
+            finally:
+                if written != length:
+                    f.truncate(received)
+        if written != length:
+            raise UploadError('Часть получена не полностью', 400, received)
+
+        received += length
+        _hash_states.set(upload_id, (received, digest))
+        return received
+
+
+def finish_session(upload_folder: str, upload_id: str, meta: dict) -> tuple:
+    """Проверка собранного файла: (путь к файлу, SHA-256).
+
+    Файл остается на месте до remove_session; вызывающий переносит его в хранилище.
+    """
+    received = received_size(upload_folder, upload_id)
+    if received != meta['size']:
+        raise UploadError('Файл загружен не полностью', 409, received)
+    file_hash = _hash_state(upload_folder, upload_id, received).hexdigest()
+    if meta.get('sha256') and meta['sha256'] != file_hash:
+        remove_session(upload_folder, upload_id)
+        raise UploadError('SHA-256 собранного файла не совпадает с объявленным; загрузите файл заново', 422)
+    return part_path(upload_folder, upload_id), file_hash
+
+
+def remove_session(upload_folder: str, upload_id: str):
+    """Удаление файлов сессии и состояния хеша"""
+    for path in (_meta_path(upload_folder, upload_id), part_path(upload_folder, upload_id)):
+        if os.path.exists(path):
+            os.remove(path)
+    _hash_states.invalidate(upload_id)
+    with _upload_locks_guard:
+        _upload_locks.pop(upload_id, None)
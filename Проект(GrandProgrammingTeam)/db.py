@@ -0,0 +1,70 @@
+"""Соединения с SQLite, устойчивые к одновременной записи из нескольких процессов.
+
+- журнал WAL: чтение не блокирует запись и наоборот;
+- транзакции начинаются с BEGIN IMMEDIATE: блокировка записи берется сразу,
+  поэтому процессы ждут друг друга (busy timeout), а не получают ошибку
+  при повышении блокировки посреди транзакции;
+- если блокировка не освободилась за время ожидания, оператор повторяется
+  с экспоненциальной паузой.
+
+Соединение открывается на одну операцию и не передается между процессами.
+"""
+import random
+import sqlite3
+import time
+
+from settings import DATABASE_PATH, DB_BUSY_TIMEOUT
+
+DB_RETRY_ATTEMPTS = 5
+DB_RETRY_DELAY = 0.05
+
+
+def _is_locked(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _with_retry(operation, *args):
+    for attempt in range(DB_RETRY_ATTEMPTS):
+        try:
+            return operation(*args)
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e) or attempt == DB_RETRY_ATTEMPTS - 1:
+                raise
+            # Случайная добавка разводит процессы, упершиеся в одну блокировку
+            time.sleep(DB_RETRY_DELAY * (2 ** attempt) * (1 + random.random()))
+
+
+class RetryingCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return _with_retry(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return _with_retry(super().executemany, sql, seq_of_parameters)
+
+
+class RetryingConnection(sqlite3.Connection):
+    def cursor(self, factory=RetryingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        return _with_retry(super().commit)
+
+
+def connect(db_path: str = None) -> sqlite3.Connection:
+    """Новое соединение с базой (по умолчанию settings.DATABASE_PATH)"""
+    return sqlite3.connect(db_path or DATABASE_PATH, timeout=DB_BUSY_TIMEOUT,
+                           isolation_level='IMMEDIATE', factory=RetryingConnection)
+
+
+def enable_wal(db_path: str = None):
+    """Включение журнала WAL (сохраняется в файле базы, достаточно одного раза)"""
+    conn = connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.close()
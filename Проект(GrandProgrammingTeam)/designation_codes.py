@@ -0,0 +1,201 @@
+"""Распознавание обозначений документов и индекс обозначений по всем документам.
+
+Обозначение по ГОСТ 2.201: код организации (2-4 буквы), номер и версия,
+разделенные точкой или дефисом (или номер слитно с кодом), и код типа
+документа из классификатора (СБ, ВО, Э3, ...); у чертежа детали кода типа нет:
+
+    РНАТ.123456.001СБ    РНАТ-123456-001ВО    АБВГ123456.001Э3    РНАТ.123456.002
+
+DesignationRecognizer - конечный автомат: состояния разбирают код
+организации, номер и версию, а код типа распознается по бору (trie) из
+кодов классификатора с выбором самого длинного совпадения. Так находятся и
+коды типа с цифрами (Э3), которые не ловит регулярное выражение сканера.
+
+Для индекса обозначение нормализуется: верхний регистр, латинские буквы,
+совпадающие по начертанию с русскими (A, B, C, E, H, K, M, O, P, T, X), -
+русскими, разделители - точкой. Таблица document_designations хранит
+нормализованные обозначения из основных надписей всех документов; индекс по
+обозначению дает мгновенный поиск документов с тем же обозначением.
+"""
+from collections import namedtuple
+
+DESIGNATIONS_TABLE = 'document_designations'
+ORGANISATION_MIN_LENGTH = 2
+ORGANISATION_MAX_LENGTH = 4
+# Нестандартный (отсутствующий в классификаторе) код типа: 2-3 буквы
+UNKNOWN_TYPE_MIN_LENGTH = 2
+UNKNOWN_TYPE_MAX_LENGTH = 3
+SEPARATORS = frozenset('.-')
+# Обозначения стандартов и нормативных документов (ГОСТ5632-2014) - не коды организаций
+STANDARD_PREFIXES = frozenset({'ГОСТ', 'ОСТ', 'СТО', 'СТП', 'ТУ', 'РД', 'ISO', 'DIN'})
+
+_HOMOGLYPHS = str.maketrans('ABCEHKMOPTXaceopxy', 'АВСЕНКМОРТХасеорху')
+
+Designation = namedtuple('Designation', 'code organisation number version doc_type known_type start end')
+
+
+def normalize_designation(code: str) -> str:
+    """Ключ индекса: верхний регистр, русские буквы вместо латинских двойников, точки"""
+    normalized = code.strip().upper().translate(_HOMOGLYPHS)
+    return ''.join('.' if char in SEPARATORS else char for char in normalized)
+
+
+def _is_letter(char: str) -> bool:
+    return char.isalpha()
+
+
+class DesignationRecognizer:
+    def __init__(self, document_types):
+        """document_types - коды типов документов (ключи Config.DOCUMENT_CODES)"""
+        # Бор кодов типов: переходы по символам и признак конца кода
+        self._trie = [{}]
+        self._terminal = [False]
+        for doc_type in document_types:
+            node = 0
+            for char in doc_type:
+                next_node = self._trie[node].get(char)
+                if next_node is None:
+                    next_node = len(self._trie)
+                    self._trie[node][char] = next_node
+                    self._trie.append({})
+                    self._terminal.append(False)
+                node = next_node
+            self._terminal[node] = True
+
+    def _match_type(self, text: str, position: int) -> int:
+        """Длина самого длинного кода типа из классификатора с позиции position (0 - нет)"""
+        node = 0
+        longest = 0
+        for offset in range(position, len(text)):
+            node = self._trie[node].get(text[offset])
+            if node is None:
+                break
+            if self._terminal[node]:
+                longest = offset - position + 1
+        return longest
+
+    def _is_known_type(self, doc_type: str) -> bool:
+        """Код типа целиком совпадает с кодом из классификатора"""
+        node = 0
+        for char in doc_type:
+            node = self._trie[node].get(char)
+            if node is None:
+                return False
+        return self._terminal[node]
+
+    def _match_number(self, text: str, start: int):
+        """Код организации, номер и версия с позиции start: (организация, номер, версия, конец) или None"""
+        length = len(text)
+        position = start
+        while position < length and _is_letter(text[position]) and position - start < ORGANISATION_MAX_LENGTH:
+            position += 1
+        if position - start < ORGANISATION_MIN_LENGTH or position >= length:
+            return None
+        if _is_letter(text[position]):
+            return None  # более длинное слово, а не код организации
+        organisation = text[start:position]
+        if organisation.upper() in STANDARD_PREFIXES:
+            return None
+
+        # Номер: после разделителя или слитно с кодом организации
+        if text[position] in SEPARATORS:
+            position += 1
+        number_start = position
+        while position < length and text[position].isdigit():
+            position += 1
+        if position == number_start or position >= length or text[position] not in SEPARATORS:
+            return None
+        number = text[number_start:position]
+
+        position += 1
+        version_start = position
+        while position < length and text[position].isdigit():
+            position += 1
+        if position == version_start:
+            return None
+        return organisation, number, text[version_start:position], position
+
+    def _match_at(self, text: str, start: int):
+        """Обозначение, начинающееся в позиции start, или None"""
+        matched = self._match_number(text, start)
+        if matched is None:
+            return None
+        organisation, number, version, position = matched
+
+        # Код типа: сначала классификатор (бор), затем нестандартные 2-3 буквы,
+        # за которыми не идут другие буквы; иначе обозначение без кода типа
+        type_length = self._match_type(text, position)
+        known_type = type_length > 0
+        if not known_type:
+            letters = 0
+            while (position + letters < len(text) and _is_letter(text[position + letters])
+                   and letters <= UNKNOWN_TYPE_MAX_LENGTH):
+                letters += 1
+            if UNKNOWN_TYPE_MIN_LENGTH <= letters <= UNKNOWN_TYPE_MAX_LENGTH:
+                type_length = letters
+        end = position + type_length
+        return Designation(text[start:end], organisation, number, version, text[position:end], known_type, start, end)
+
+    def find_all(self, text: str) -> list:
+        """Все обозначения в тексте в порядке появления"""
+        found = []
+        position = 0
+        length = len(text)
+        while position < length:
+            char = text[position]
+            if _is_letter(char) and (position == 0 or not text[position - 1].isalnum()):
+                designation = self._match_at(text, position)
+                if designation is not None:
+                    found.append(designation)
+                    position = designation.end
+                    continue
+            position += 1
+        return found
+
+    def parse(self, code: str):
+        """Разбор отдельного обозначения: все символы после версии - код типа.
+
+        None, если строка не начинается с кода организации, номера и версии.
+        """
+        matched = self._match_number(code, 0)
+        if matched is None:
+            return None
+        organisation, number, version, position = matched
+        doc_type = code[position:]
+        return Designation(code, organisation, number, version, doc_type, self._is_known_type(doc_type),
+                           0, len(code))
+
+
+def document_designations(recognizer: DesignationRecognizer, text_data: dict) -> list:
+    """Нормализованные обозначения из основных надписей документа (без повторов)"""
+    designations = []
+    for page in text_data.get('pages', []):
+        title_text = page.get('analysis', {}).get('title_block', {}).get('text', '')
+        for designation in recognizer.find_all(title_text):
+            normalized = normalize_designation(designation.code)
+            if normalized not in designations:
+                designations.append(normalized)
+    return designations
+
+
+def create_designations_table(cursor):
+    """Таблица обозначений документов и индекс для поиска по обозначению"""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {DESIGNATIONS_TABLE} (
+            designation TEXT NOT NULL,
+            document_id INTEGER NOT NULL,
+            PRIMARY KEY (designation, document_id),
+            FOREIGN KEY (document_id) REFERENCES documents (id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_{DESIGNATIONS_TABLE}_document
+        ON {DESIGNATIONS_TABLE} (document_id)
+    ''')
+
+
+def index_designations(cursor, document_id: int, designations: list):
+    """Замена обозначений документа в индексе"""
+    cursor.execute(f'DELETE FROM {DESIGNATIONS_TABLE} WHERE document_id = ?', (document_id,))
+    cursor.executemany(f'INSERT OR IGNORE INTO {DESIGNATIONS_TABLE} (designation, document_id) VALUES (?, ?)',
+                       [(designation, document_id) for designation in designations])
@@ -0,0 +1,116 @@
+"""Полнотекстовый поиск по тексту документов (SQLite FTS5).
+
+Для каждого документа в виртуальной таблице document_search хранится текст
+основной надписи, технических требований и поля чертежа, извлеченный
+DocumentAnalyzer, и исходное имя файла. rowid записи равен id документа;
+запись обновляется в той же транзакции, что и сам документ (add_document,
+replace_document, перепроверка).
+
+Запрос пользователя не разбирается как синтаксис FTS5: каждое слово
+становится фразой в кавычках, поэтому обозначение РНАТ.123456.001ВО ищется
+как последовательность лексем "РНАТ 123456 001ВО", а последнее слово -
+по префиксу (поиск по мере ввода). Индексы префиксов из 2 и 3 символов
+ускоряют первые буквы запроса: без них "сл*" на 100 тыс. документов
+перебирает все лексемы индекса. Ранжирование - bm25 с весами столбцов.
+"""
+import html
+import re
+
+SEARCH_TABLE = 'document_search'
+SEARCH_COLUMNS = ('title_block', 'tech_requirements', 'drawing_text', 'filename')
+# Веса bm25 в порядке SEARCH_COLUMNS: совпадение в основной надписи важнее поля чертежа
+SEARCH_WEIGHTS = (10.0, 3.0, 1.0, 5.0)
+SNIPPET_TOKENS = 16
+MAX_QUERY_TERMS = 12
+# Поиск по префиксу - только для слов не короче двух символов (индекс префиксов '2 3')
+MIN_PREFIX_LENGTH = 2
+
+# Маркеры совпадений в snippet(): не встречаются в тексте и переживают html.escape
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+SNIPPET_MARKERS = (_MATCH_START, _MATCH_END)
+_QUERY_TERM = re.compile(r'\S+')
+
+
+def create_search_table(cursor):
+    """Создание таблицы поиска (если ее нет)"""
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+            {', '.join(SEARCH_COLUMNS)},
+            tokenize = "unicode61 remove_diacritics 2",
+            prefix = '2 3'
+        )
+    ''')
+
+
+def search_fields_from_text_data(text_data: dict) -> dict:
+    """Текст для индекса из результата extract_text_from_pdf / analyze_features"""
+    title_parts, drawing_parts = [], []
+    for page in text_data.get('pages', []):
+        # Повтор листа не добавляет в индекс нового текста
+        if page.get('duplicate_of'):
+            continue
+        analysis = page.get('analysis', {})
+        title_parts.append(analysis.get('title_block', {}).get('text', ''))
+        drawing_parts.append(analysis.get('drawing_area', {}).get('text', ''))
+    return {
+        'title_block': '\n'.join(part for part in title_parts if part),
+        'tech_requirements': text_data.get('first_page_tech_requirements', ''),
+        'drawing_text': '\n'.join(part for part in drawing_parts if part)
+    }
+
+
+def index_document(cursor, document_id: int, filename: str, fields: dict):
+    """Запись (или замена) текста документа в индексе"""
+    cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = ?', (document_id,))
+    cursor.execute(f'''
+        INSERT INTO {SEARCH_TABLE} (rowid, title_block, tech_requirements, drawing_text, filename)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (document_id, fields.get('title_block', ''), fields.get('tech_requirements', ''),
+          fields.get('drawing_text', ''), filename))
+
+
+def build_match_query(query: str):
+    """Строка MATCH для FTS5 из запроса пользователя или None, если искать нечего"""
+    words = _QUERY_TERM.findall(query)[:MAX_QUERY_TERMS]
+    if not words:
+        return None
+    # Кавычки внутри фразы FTS5 удваиваются
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    if len(words[-1]) >= MIN_PREFIX_LENGTH:
+        terms[-1] += ' *'
+    return ' '.join(terms)
+
+
+def snippet_html(snippet: str) -> str:
+    """Фрагмент текста с подсветкой совпадений <mark> (остальное экранировано)"""
+    return (html.escape(snippet)
+            .replace(_MATCH_START, '<mark>')
+            .replace(_MATCH_END, '</mark>'))
+
+
+def search_sql(visibility_sql: str) -> tuple:
+    """SQL страницы результатов и общего числа совпадений.
+
+    visibility_sql - условие на documents d, ограничивающее видимые пользователю документы.
+    Параметры страницы: маркеры SNIPPET_MARKERS, строка MATCH, параметры
+    visibility_sql, LIMIT и OFFSET; для подсчета - без маркеров, LIMIT и OFFSET.
+    """
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    page_sql = f'''
+        SELECT d.id, d.original_filename, d.status, d.upload_date, d.developer_name,
+               snippet({SEARCH_TABLE}, -1, ?, ?, '…', {SNIPPET_TOKENS}),
+               bm25({SEARCH_TABLE}, {weights}) AS rank
+        FROM {SEARCH_TABLE}
+        JOIN documents d ON d.id = {SEARCH_TABLE}.rowid
+        WHERE {SEARCH_TABLE} MATCH ? AND {visibility_sql}
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+    '''
+    count_sql = f'''
+        SELECT COUNT(*)
+        FROM {SEARCH_TABLE}
+        JOIN documents d ON d.id = {SEARCH_TABLE}.rowid
+        WHERE {SEARCH_TABLE} MATCH ? AND {visibility_sql}
+    '''
+    return page_sql, count_sql
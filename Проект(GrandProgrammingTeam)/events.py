@@ -0,0 +1,162 @@
+"""Брокер событий для server-sent events (/events).
+
+Изменения статусов, назначения нормоконтролеров и завершение анализа
+публикуются здесь и рассылаются подключенным клиентам, вместо того чтобы
+страницы перезагружали списки документов целиком.
+
+У каждого клиента своя ограниченная очередь: медленный клиент не задерживает
+остальных, при переполнении старые события отбрасываются, а клиент получает
+событие resync и один раз перезагружает страницу.
+
+В многопроцессном режиме (serve.py) у каждого рабочего процесса свой брокер,
+поэтому события дополнительно передаются через таблицу event_log в базе:
+каждый процесс читает ее и раздает новые события своим клиентам.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+CLIENT_BUFFER_SIZE = 100
+HEARTBEAT_INTERVAL = 15.0
+RELAY_POLL_INTERVAL = 0.5
+RELAY_RETENTION_SECONDS = 300
+
+
+class Subscription:
+    def __init__(self, user_id, role: str):
+        self.user_id = user_id
+        self.role = role
+        self.queue = deque(maxlen=CLIENT_BUFFER_SIZE)
+        self.overflowed = False
+        self.condition = threading.Condition()
+
+    def push(self, event: dict):
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.overflowed = True
+            self.queue.append(event)
+            self.condition.notify()
+
+    def wait(self, timeout: float) -> tuple:
+        """(события, было ли переполнение) - ждет не дольше timeout секунд"""
+        with self.condition:
+            if not self.queue and not self.overflowed:
+                self.condition.wait(timeout)
+            events = list(self.queue)
+            self.queue.clear()
+            overflowed, self.overflowed = self.overflowed, False
+        return events, overflowed
+
+
+class EventBroker:
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._relay_db = None
+        self._relay_thread = None
+
+    def enable_relay(self, db_path: str):
+        """Обмен событиями между процессами через таблицу event_log"""
+        from db import connect
+
+        conn = connect(db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS event_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+        self._relay_db = db_path
+
+    def subscribe(self, user_id, role: str) -> Subscription:
+        subscription = Subscription(user_id, role)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if self._relay_db and self._relay_thread is None:
+                self._relay_thread = threading.Thread(target=self._relay_loop, name='event-relay', daemon=True)
+                self._relay_thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event_type: str, data: dict, user_ids=(), roles=()):
+        """Событие для пользователей user_ids и всех пользователей с ролями roles"""
+        event = {'type': event_type, 'data': data, 'user_ids': list(user_ids), 'roles': list(roles)}
+        if self._relay_db:
+            self._write_relay(event)
+        else:
+            self._dispatch(event)
+
+    def _dispatch(self, event: dict):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.user_id in event['user_ids'] or subscription.role in event['roles']:
+                subscription.push(event)
+
+    def _write_relay(self, event: dict):
+        from db import connect
+
+        try:
+            conn = connect(self._relay_db)
+            conn.execute('INSERT INTO event_log (payload, created_at) VALUES (?, ?)',
+                         (json.dumps(event, ensure_ascii=False), time.time()))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            # Событие - только уведомление: при ошибке страница обновится после своего действия
+            print(f"⚠️ Не удалось передать событие {event['type']}: {e}")
+
+    def _relay_loop(self):
+        from db import connect
+
+        conn = connect(self._relay_db)
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM event_log').fetchone()[0]
+        last_cleanup = time.time()
+        while True:
+            time.sleep(RELAY_POLL_INTERVAL)
+            try:
+                rows = conn.execute('SELECT id, payload FROM event_log WHERE id > ? ORDER BY id',
+                                    (last_id,)).fetchall()
+                for event_id, payload in rows:
+                    last_id = event_id
+                    self._dispatch(json.loads(payload))
+                if time.time() - last_cleanup > RELAY_RETENTION_SECONDS:
+                    conn.execute('DELETE FROM event_log WHERE created_at < ?',
+                                 (time.time() - RELAY_RETENTION_SECONDS,))
+                    conn.commit()
+                    last_cleanup = time.time()
+            except Exception as e:
+                print(f"⚠️ Ошибка чтения журнала событий: {e}")
+
+
+def format_sse(event_type: str, data: dict) -> str:
+    """Кадр text/event-stream"""
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_events(subscription: Subscription, broker: 'EventBroker'):
+    """Генератор ответа /events: события подписки и периодический heartbeat"""
+    try:
+        # Клиент переподключается через 3 с, если соединение оборвалось
+        yield 'retry: 3000\n\n'
+        while True:
+            events, overflowed = subscription.wait(HEARTBEAT_INTERVAL)
+            if overflowed:
+                yield format_sse('resync', {})
+            for event in events:
+                yield format_sse(event['type'], event['data'])
+            if not events and not overflowed:
+                yield ': heartbeat\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# Глобальный брокер процесса
+event_broker = EventBroker()
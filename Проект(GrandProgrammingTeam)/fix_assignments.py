@@ -1,9 +1,9 @@
-import sqlite3
+from db import connect
 
 def reassign_all_documents():
     """Перераспределение всех документов между нормоконтролерами"""
     try:
-        conn = sqlite3.connect('users.db')
+        conn = connect()
         cursor = conn.cursor()
         
         # Получаем все документы, ожидающие проверки
@@ -0,0 +1,164 @@
+"""Архив истории статусов завершенных документов.
+
+document_status_history растет с каждой загрузкой и сменой статуса, поэтому
+история документов, завершенных (Согласовано, Снято) больше ARCHIVE_AFTER_DAYS
+дней назад, переносится в отдельный файл базы рядом с основной:
+
+    users.db                      - активные документы (быстрые запросы и копии)
+    users.history-archive.db      - архив истории (копируется редко)
+
+Перенос идет порциями по документам в две транзакции на порцию: строки
+копируются в архив (INSERT OR IGNORE по id), затем удаляются из основной
+базы, а документу ставится признак history_archived. Если процесс прервется
+между ними, строки останутся в обеих базах и будут перенесены повторным
+запуском; get_document_status_history объединяет обе базы без повторов.
+
+Запуск (например, раз в сутки по расписанию):
+    python history_archive.py --db users.db --days 180 --vacuum
+"""
+import argparse
+import os
+import sys
+
+from db import connect, enable_wal
+from settings import DATABASE_PATH
+
+HISTORY_TABLE = 'document_status_history'
+ARCHIVE_SUFFIX = '.history-archive.db'
+FINISHED_STATUSES = ('Согласовано', 'Снято')
+ARCHIVE_AFTER_DAYS = 180
+ARCHIVE_CHUNK_DOCUMENTS = 500
+HISTORY_COLUMNS = 'id, document_id, status, changed_by, changed_by_name, change_date, notes'
+
+
+def archive_path_for(db_path: str) -> str:
+    """Файл архива истории рядом с файлом базы"""
+    return os.path.splitext(db_path)[0] + ARCHIVE_SUFFIX
+
+
+def create_history_index(cursor, schema: str = 'main'):
+    """Покрывающий индекс истории документа: запрос по document_id с сортировкой
+    по (change_date, id) читает только индекс, без сортировки и обращений к таблице"""
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS {schema}.idx_{HISTORY_TABLE}_document
+        ON {HISTORY_TABLE} (document_id, change_date, id, status, changed_by_name, notes)
+    ''')
+
+
+def _create_archive_table(cursor):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS archive.{HISTORY_TABLE} (
+            id INTEGER PRIMARY KEY,
+            document_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            changed_by INTEGER NOT NULL,
+            changed_by_name TEXT NOT NULL,
+            change_date TIMESTAMP,
+            notes TEXT
+        )
+    ''')
+    create_history_index(cursor, 'archive')
+
+
+def read_archived_history(db_path: str, document_id: int) -> list:
+    """Строки истории документа из архива: (id, status, changed_by_name, change_date, notes)"""
+    archive_path = archive_path_for(db_path)
+    if not os.path.exists(archive_path):
+        return []
+    conn = connect(archive_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, status, changed_by_name, change_date, notes FROM {HISTORY_TABLE}
+            WHERE document_id = ? ORDER BY change_date, id
+        ''', (document_id,))
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _select_finished_documents(cursor, older_than_days: int, limit: int) -> list:
+    """Завершенные давно документы, у которых в основной базе еще есть история"""
+    placeholders = ', '.join('?' for _ in FINISHED_STATUSES)
+    cursor.execute(f'''
+        SELECT d.id FROM documents d
+        WHERE d.status IN ({placeholders})
+          AND d.last_status_change < datetime('now', ?)
+          AND EXISTS (SELECT 1 FROM main.{HISTORY_TABLE} h WHERE h.document_id = d.id)
+        ORDER BY d.id
+        LIMIT ?
+    ''', (*FINISHED_STATUSES, f'-{older_than_days} days', limit))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def archive_history(db_path: str = DATABASE_PATH, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                    chunk_size: int = ARCHIVE_CHUNK_DOCUMENTS, vacuum: bool = False) -> dict:
+    """Перенос истории завершенных документов в архив; возвращает число документов и строк.
+
+    vacuum - после переноса сжать основную базу (освобожденные страницы
+    возвращаются файловой системе; база на время блокируется).
+    """
+    archive_path = archive_path_for(db_path)
+    if not os.path.exists(archive_path):
+        enable_wal(archive_path)
+
+    conn = connect(db_path)
+    stats = {'documents': 0, 'rows': 0}
+    try:
+        cursor = conn.cursor()
+        cursor.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+        _create_archive_table(cursor)
+        conn.commit()
+
+        while True:
+            document_ids = _select_finished_documents(cursor, older_than_days, chunk_size)
+            if not document_ids:
+                break
+            batch = ', '.join(str(document_id) for document_id in document_ids)
+
+            # 1. Копия в архив (повторный запуск не создает дублей)
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO archive.{HISTORY_TABLE} ({HISTORY_COLUMNS})
+                SELECT {HISTORY_COLUMNS} FROM main.{HISTORY_TABLE} WHERE document_id IN ({batch})
+            ''')
+            conn.commit()
+
+            # 2. Удаление из основной базы; история этих документов читается и из архива
+            cursor.execute(f'UPDATE documents SET history_archived = 1 WHERE id IN ({batch})')
+            cursor.execute(f'DELETE FROM main.{HISTORY_TABLE} WHERE document_id IN ({batch})')
+            stats['rows'] += cursor.rowcount
+            conn.commit()
+            stats['documents'] += len(document_ids)
+            print(f"📦 В архив перенесена история {stats['documents']} документов ({stats['rows']} записей)",
+                  file=sys.stderr)
+
+        cursor.execute('DETACH DATABASE archive')
+        if vacuum and stats['rows']:
+            conn.isolation_level = None  # VACUUM выполняется вне транзакции
+            cursor.execute('VACUUM')
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Перенос истории статусов завершенных документов в архив')
+    parser.add_argument('--db', default=DATABASE_PATH, help=f'Путь к базе данных (по умолчанию {DATABASE_PATH})')
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help='Переносить документы, завершенные больше указанного числа дней назад')
+    parser.add_argument('--chunk', type=int, default=ARCHIVE_CHUNK_DOCUMENTS,
+                        help='Число документов в одной порции переноса')
+    parser.add_argument('--vacuum', action='store_true', help='Сжать основную базу после переноса')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f'База данных не найдена: {args.db}')
+
+    stats = archive_history(args.db, args.days, args.chunk, args.vacuum)
+    print(f"✅ Перенесено документов: {stats['documents']}, записей истории: {stats['rows']} "
+          f"(архив {archive_path_for(args.db)})", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,28 @@
-from flask import Flask, render_template, request, jsonify
-import os
-import uuid
-from werkzeug.utils import secure_filename
+import hashlib
 import re
 from datetime import datetime
-import fitz  # PyMuPDF
 import math
+import functools
 
-app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['SECRET_KEY'] = 'normcontrol-secret-key-2024'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+from keyword_matcher import KeywordAutomaton
+from designation_codes import DesignationRecognizer
+
+# PyMuPDF, OCR и numpy импортируются при первом анализе, а не при импорте модуля:
+# веб-приложение, дочерние процессы и утилиты запускаются быстрее
 
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
 class Config:
+    # Версия набора правил: увеличивать при любом изменении проверок или порогов,
+    # чтобы сохраненные результаты автопроверки считались устаревшими
+    # 2 - замечания содержат номер страницы и bbox (наложение на превью страниц)
+    # 3 - 1.1.8 считает графику рядом с базой по объединенным линиям без штриховки
+    # 4 - 1.1.1 разбирает код DesignationRecognizer: код типа с заглавными и строчными
+    #     буквами вперемешку - нестандартный формат, а не неизвестный тип
+    # 5 - 1.1.3, 1.1.4 и 1.1.8 проверяются по всем листам документа, а не по каждому листу
+    RULES_VERSION = 5
+
     DOCUMENT_CODES = {
         'СБ': 'Сборочный чертеж',
         'ВО': 'Чертеж общего вида', 
@@ -34,76 +40,327 @@ class Config:
     TOLERANCE_SYMBOLS = ['⏊', '⊥', '∥', '∠', '○', '⌒', '⏋']
     BASE_SEPARATOR = '—'
 
+    # Ключевые слова для поиска технических требований по содержанию
+    TECH_START_KEYWORDS = frozenset({
+        'размеры', 'обработать', 'поверхность', 'допуск', 'шероховатость',
+        'технические', 'требования', '1 *', '2 *', '3 *', '1.', '2.', '3.'
+    })
+    TECH_CONTENT_KEYWORDS = frozenset({
+        'размер', 'обработ', 'поверхност', 'допуск', 'шероховатость',
+        'покрытие', 'защит', 'качество', 'точность', 'сборк', 'свар'
+    })
+    TECH_END_KEYWORDS = frozenset({'примечания', 'литература', 'таблица', 'рисунок', '---'})
+
+    # Буквы, которые часто встречаются на чертежах и не считаются обозначениями
+    COMMON_DRAWING_LETTERS = frozenset({'A', 'B', 'C', 'D', 'X', 'Y', 'Z', 'I', 'V', 'L', 'M', 'N', 'O', 'P', 'R', 'S', 'T', 'H', 'Т', 'Н'})
+
+# =============================================================================
+# COMPILED PATTERNS
+# =============================================================================
+# Единый сканер элементов: коды, шероховатости, размеры, звездочки и отдельные
+# буквы классифицируются за один проход re.finditer. Альтернативы сгруппированы
+# по первому символу (буква / цифра / звездочка), а регистр задан явными
+# классами вместо re.IGNORECASE - так позиции без токенов отбрасываются быстро.
+# Внутри группы порядок важен: код и шероховатость проверяются раньше размеров.
+# Тип документа в конце кода и единица измерения размера не поглощаются,
+# чтобы следующий за ними токен (например, Ra сразу после кода) тоже был найден.
+_LETTER_CLASS = 'А-Яа-яA-Za-z'
+_ELEMENT_SCANNER = re.compile(
+    r'(?:'
+    rf'(?=[{_LETTER_CLASS}])(?:'
+    rf'(?P<code>[{_LETTER_CLASS}]{{2,4}}+(?:[\.\-]\d+[\.\-]|\d+\.)\d+(?=(?P<code_type>[{_LETTER_CLASS}]{{2,3}})))'
+    r'|(?P<roughness>(?P<roughness_prefix>[Шш][Ее][Рр][Оо][Хх][Оо][Вв][Аа][Тт][Оо][Сс][Тт][Ьь]\s*)?'
+    r'(?P<roughness_value>[Rr][AaZz]\s*\d+[.,]?\d*))'
+    r'|(?P<radius>[Rr]\d+[.,]?\d*)'
+    r'|(?P<letter>(?<!\w)[A-ZА-Я](?!\w)))'
+    r'|(?=[\d±⌀])(?P<dimension>\d+[.,]?\d*\s*(?=(?P<dimension_unit>[Гг][Рр][Аа][Дд]|[Dd][Ee][Gg]|°|[мс]))'
+    r'|⌀\d+[.,]?\d*'
+    r'|±?\d+[.,]?\d*)'
+    r')(?P<stars>(?<=\d)\*+)?'
+    r'|(?P<asterisk>\*+(?P<asterisk_number>\d+))'
+)
+
+# Латинские буквы, стоящие вплотную к цифре (R5, 3H) - часть размеров, а не обозначения
+_DIGIT_ADJACENT_LETTER = re.compile(r'(?<=\d)[A-Z]|[A-Z](?=\d)')
+_TRAILING_DIGITS = re.compile(r'\d+$')
+# Шероховатость, слитая с последующим текстом в токен вида кода (Ra3.2мкм)
+_ROUGHNESS_VALUE = re.compile(r'[Rr][AaZz]\s*\d+[.,]?\d*')
+_WHITESPACE = re.compile(r'\s+')
+
+# Символ допуска и следующие за ним обозначения баз
+_TOLERANCE_BASES = re.compile(
+    f'([{"".join(re.escape(s) for s in Config.TOLERANCE_SYMBOLS)}])\\s*([A-Z{Config.BASE_SEPARATOR}]+)'
+)
+
+# Поиск техтребований по содержанию: все группы ключевых слов в одном автомате
+_TECH_KEYWORDS = KeywordAutomaton(
+    Config.TECH_START_KEYWORDS | Config.TECH_CONTENT_KEYWORDS | Config.TECH_END_KEYWORDS
+)
+_NUMBERED_ITEM = re.compile(r'^\d+[\.\*\)]\s')
+_NUMBERED_ITEM_SPACED = re.compile(r'^\d+\s*[\.\*\)]\s')
+_BULLET_ITEM = re.compile(r'^[•\-\*]\s')
+
+# Наименования типов документов (проверка 1.1.1), регистр не учитывается
+_DOCUMENT_NAMES = KeywordAutomaton([name.lower() for name in Config.DOCUMENT_CODES.values()])
+# Разбор обозначения: код организации, номер, версия и код типа по бору классификатора
+DESIGNATIONS = DesignationRecognizer(Config.DOCUMENT_CODES)
+
+# Распознавание размерного числа в отдельном span
+_HAS_DIGIT = re.compile(r'\d')
+_TRAILING_ASTERISKS = re.compile(r'[\*\s]+$')
+_DIMENSION_TEXT = re.compile(
+    r'^[±]?\d+[.,]?\d*[°ммсмR⌀]?$|'
+    r'^R\d+[.,]?\d*$|'
+    r'^⌀\d+[.,]?\d*$|'
+    r'^\d+[.,]?\d*\s*°$|'
+    r'^\d+\s*(град|deg)$',
+    re.IGNORECASE
+)
+_ANGULAR_INDICATORS = ('°', 'град', 'deg', 'угол', '∠')
+
+# Правила согласованности всего документа (проверяются один раз по индексу листов)
+DOCUMENT_RULES = ('1.1.3', '1.1.4', '1.1.8')
+# Номер страницы в текстах замечаний (переписывается для повторяющихся листов)
+_PAGE_REFERENCE = re.compile(r'(Страница |стр\. )(\d+)\b')
+# Ссылка на объект PDF ("12 0 R") в ресурсах страницы
+_OBJECT_REFERENCE = re.compile(r'\b(\d+) 0 R\b')
+
+
+@functools.lru_cache(maxsize=256)
+def _scan_elements_cached(text: str) -> tuple:
+    codes = []
+    letters = []
+    asterisks = []
+    dimensions = set()
+    roughness = set()
+
+    for match in _ELEMENT_SCANNER.finditer(text):
+        letter = match.group('letter')
+        if letter:
+            if letter not in Config.COMMON_DRAWING_LETTERS and letter not in letters:
+                letters.append(letter)
+            continue
+
+        code, rough, radius, dimension, stars = match.group('code', 'roughness', 'radius', 'dimension', 'stars')
+        if code:
+            codes.append(code + match.group('code_type'))
+            for value in _ROUGHNESS_VALUE.findall(text, *match.span()):
+                roughness.add(_WHITESPACE.sub(' ', value.strip()))
+        elif rough:
+            roughness.add(_WHITESPACE.sub(' ', match.group('roughness_value').strip()))
+            if match.group('roughness_prefix'):
+                roughness.add(_WHITESPACE.sub(' ', rough.strip()))
+        elif radius:
+            dimensions.add(radius)
+        elif dimension:
+            dimensions.add(dimension + (match.group('dimension_unit') or ''))
+        else:
+            asterisks.append(match.group('asterisk'))
+            dimensions.add(match.group('asterisk_number'))
+
+        if stars:
+            asterisks.append(_TRAILING_DIGITS.search(code or rough or radius or dimension).group() + stars)
+
+    # Буквы рядом с цифрами (R5, 3H) - часть размеров; проверяем только
+    # когда есть кандидаты в обозначения, а это редкость
+    if letters:
+        dimension_letters = set(_DIGIT_ADJACENT_LETTER.findall(text))
+        letters = [letter for letter in letters if letter not in dimension_letters]
+
+    return (tuple(codes), tuple(letters), tuple(asterisks),
+            tuple(dimensions), tuple(roughness))
+
+
+def scan_elements(text: str) -> dict:
+    """Однопроходное извлечение кодов, букв, звездочек, размеров и шероховатостей"""
+    codes, letters, asterisks, dimensions, roughness = _scan_elements_cached(text)
+    return {
+        'codes': list(codes),
+        'letters': list(letters),
+        'asterisks': list(asterisks),
+        'dimensions': list(dimensions),
+        'roughness': list(roughness)
+    }
+
+
+def find_tolerance_bases(text: str) -> dict:
+    """Символы допусков и обозначения баз после них (в порядке Config.TOLERANCE_SYMBOLS)"""
+    bases_by_symbol = {}
+    for symbol, bases in _TOLERANCE_BASES.findall(text):
+        bases_by_symbol.setdefault(symbol, []).append(bases)
+    return {symbol: bases_by_symbol.get(symbol, [])
+            for symbol in Config.TOLERANCE_SYMBOLS if symbol in text}
+
+def open_pdf(source):
+    """PDF из файла (путь) или из памяти (bytes, memoryview) - без временного файла"""
+    import fitz  # PyMuPDF
+    
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype='pdf')
+
 # =============================================================================
 # PRECISE DOCUMENT ANALYZER
 # =============================================================================
 class DocumentAnalyzer:
-    def extract_text_from_pdf(self, pdf_path: str) -> dict:
-        """Точное извлечение текста с детальным анализом"""
+    def extract_text_from_pdf(self, pdf_path) -> dict:
+        """Точное извлечение текста с детальным анализом.
+        
+        pdf_path - путь к файлу или содержимое PDF в памяти (см. open_pdf).
+        """
+        from ocr_fallback import apply_ocr_fallback
+        
         try:
-            doc = fitz.open(pdf_path)
-            text_data = {'pages': [], 'total_pages': doc.page_count}
+            doc = open_pdf(pdf_path)
+            unique_pages = []
+            # Индекс страницы-оригинала для каждой страницы документа
+            sources = []
+            fingerprints = {}
+            object_digests = {}
+            for page in doc:
+                fingerprint = self._page_fingerprint(doc, page, object_digests)
+                if fingerprint in fingerprints:
+                    # Повтор листа (продолжение, одинаковые форматки) - текст и графику не извлекаем
+                    sources.append(fingerprints[fingerprint])
+                    continue
+                fingerprints[fingerprint] = page.number
+                sources.append(page.number)
+                unique_pages.append({
+                    'raw_text': page.get_text("text", sort=True),
+                    'text_dict': page.get_text("dict", sort=True),
+                    'width': page.rect.width,
+                    'height': page.rect.height,
+                    'drawings': page.get_drawings(),
+                    'page': page
+                })
             
-            # Сначала извлекаем техтребования с первой страницы
-            first_page_tech_requirements = ""
-            if doc.page_count > 0:
-                first_page = doc[0]
-                first_page_text = first_page.get_text("text", sort=True)
-                first_page_dict = first_page.get_text("dict", sort=True)
-                first_page_width = first_page.rect.width
-                first_page_height = first_page.rect.height
-                
-                first_page_tech_requirements = self._extract_tech_requirements_improved(
-                    first_page_dict, first_page_text, first_page_width, first_page_height
-                )['text']
-                
-                print(f"\n📋 ТЕХТРЕБОВАНИЯ С ПЕРВОЙ СТРАНИЦЫ:")
-                print(f"'{first_page_tech_requirements[:200]}...'")
+            # Сканированные страницы без текстового слоя дополняем распознанным текстом
+            apply_ocr_fallback(unique_pages)
             
-            # Анализируем все страницы
-            for page_num in range(doc.page_count):
-                page = doc[page_num]
-                
-                raw_text = page.get_text("text", sort=True)
-                text_dict = page.get_text("dict", sort=True)
-                width = page.rect.width
-                height = page.rect.height
-                drawings = page.get_drawings()
-                
-                print(f"\n📄 СТРАНИЦА {page_num + 1} ({width}x{height})")
-                print("=" * 50)
-                
-                # Детальный анализ страницы
-                try:
-                    analysis = self._analyze_page_details(
-                        text_dict, raw_text, width, height, drawings, page, 
-                        first_page_tech_requirements if page_num == 0 else "",
-                        page_num + 1
-                    )
-                except Exception as e:
-                    print(f"❌ ОШИБКА при анализе страницы {page_num + 1}: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-                    return {'pages': [], 'total_pages': 0, 'error': str(e)}
-                
-                text_data['pages'].append({
-                    'page_number': page_num + 1,
-                    'width': width,
-                    'height': height,
-                    'raw_text': raw_text,
-                    'text_dict': text_dict,
-                    'drawings': drawings,
-                    'analysis': analysis
-                })
+            by_number = {page_data['page'].number: page_data for page_data in unique_pages}
+            pages = []
+            for index, source in enumerate(sources):
+                if source == index:
+                    pages.append(by_number[source])
+                else:
+                    pages.append(dict(by_number[source], page=doc[index], duplicate_of=source + 1))
             
+            text_data = self._analyze_pages(pages)
             doc.close()
-            
-            # Сохраняем техтребования с первой страницы для всех страниц
-            text_data['first_page_tech_requirements'] = first_page_tech_requirements
             return text_data
         except Exception as e:
             return {'pages': [], 'total_pages': 0, 'error': str(e)}
 
+    def _page_fingerprint(self, doc, page, digests: dict) -> str:
+        """Хэш листа: потоки содержимого, ресурсы (шрифты, изображения) и геометрия страницы.
+
+        Ресурсы хэшируются по содержимому, а не по номерам объектов: лист,
+        скопированный в документ вместе со своими шрифтами, тоже считается повтором.
+        digests - кэш хэшей объектов PDF в пределах документа.
+        """
+        digest = hashlib.sha256()
+        digest.update(f'{page.rect}|{page.rotation}'.encode())
+        digest.update(page.read_contents())
+        kind, resources = doc.xref_get_key(page.xref, 'Resources')
+        if kind == 'xref':
+            resources = self._object_digest(doc, int(resources.split()[0]), digests, set())
+        else:
+            resources = _OBJECT_REFERENCE.sub(
+                lambda m: self._object_digest(doc, int(m.group(1)), digests, set()), resources)
+        digest.update(resources.encode())
+        return digest.hexdigest()
+
+    def _object_digest(self, doc, xref: int, digests: dict, visiting: set) -> str:
+        """Хэш объекта PDF с вложенными ссылками, замененными хэшами их содержимого"""
+        if xref in digests:
+            return digests[xref]
+        if xref in visiting:
+            return f'cycle:{xref}'
+        visiting.add(xref)
+        source = doc.xref_object(xref, compressed=True)
+        digest = hashlib.sha256(_OBJECT_REFERENCE.sub(
+            lambda m: self._object_digest(doc, int(m.group(1)), digests, visiting), source).encode())
+        if doc.xref_is_stream(xref):
+            digest.update(doc.xref_stream_raw(xref) or b'')
+        visiting.discard(xref)
+        digests[xref] = digest.hexdigest()
+        return digests[xref]
+
+    def analyze_features(self, features: dict) -> dict:
+        """Анализ по сохраненным признакам страниц (без повторного разбора PDF)"""
+        from page_features import pages_from_features
+        
+        try:
+            return self._analyze_pages(pages_from_features(features))
+        except Exception as e:
+            return {'pages': [], 'total_pages': 0, 'error': str(e)}
+
+    def _analyze_pages(self, pages: list) -> dict:
+        """Анализ страниц, уже извлеченных из PDF или восстановленных из признаков"""
+        text_data = {'pages': [], 'total_pages': len(pages)}
+        
+        # Сначала извлекаем техтребования с первой страницы
+        first_page_tech_requirements = ""
+        if pages:
+            first_page = pages[0]
+            first_page_tech_requirements = self._extract_tech_requirements_improved(
+                first_page['text_dict'], first_page['raw_text'], first_page['width'], first_page['height']
+            )['text']
+            
+            print(f"\n📋 ТЕХТРЕБОВАНИЯ С ПЕРВОЙ СТРАНИЦЫ:")
+            print(f"'{first_page_tech_requirements[:200]}...'")
+        
+        # Анализируем все страницы
+        for page_num, page in enumerate(pages):
+            raw_text = page['raw_text']
+            text_dict = page['text_dict']
+            width = page['width']
+            height = page['height']
+            drawings = page['drawings']
+            duplicate_of = page.get('duplicate_of')
+            
+            print(f"\n📄 СТРАНИЦА {page_num + 1} ({width}x{height})")
+            print("=" * 50)
+            
+            # Первая страница анализируется иначе (техтребования), поэтому ее анализ не переносится
+            if duplicate_of and duplicate_of > 1:
+                print(f"♻️ Лист совпадает со страницей {duplicate_of} - используется ее анализ")
+                text_data['pages'].append(dict(text_data['pages'][duplicate_of - 1],
+                                               page_number=page_num + 1, duplicate_of=duplicate_of))
+                continue
+            
+            # Детальный анализ страницы
+            try:
+                analysis = self._analyze_page_details(
+                    text_dict, raw_text, width, height, drawings, page.get('page'), 
+                    first_page_tech_requirements if page_num == 0 else "",
+                    page_num + 1
+                )
+            except Exception as e:
+                print(f"❌ ОШИБКА при анализе страницы {page_num + 1}: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                return {'pages': [], 'total_pages': 0, 'error': str(e)}
+            
+            page_data = {
+                'page_number': page_num + 1,
+                'width': width,
+                'height': height,
+                'raw_text': raw_text,
+                'text_dict': text_dict,
+                'drawings': drawings,
+                'analysis': analysis
+            }
+            if duplicate_of:
+                page_data['duplicate_of'] = duplicate_of
+            text_data['pages'].append(page_data)
+        
+        text_data['duplicate_pages'] = sum(1 for page in text_data['pages'] if page.get('duplicate_of'))
+        
+        # Сохраняем техтребования с первой страницы для всех страниц
+        text_data['first_page_tech_requirements'] = first_page_tech_requirements
+        return text_data
+
     def _analyze_page_details(self, text_dict: dict, raw_text: str, width: float, height: float, 
                             drawings: list, page, first_page_tech_requirements: str = "", page_num: int = 1) -> dict:
         """Детальный анализ страницы"""
@@ -312,35 +569,27 @@ class DocumentAnalyzer:
         tech_lines = []
         in_tech_section = False
         tech_section_started = False
-        
-        # Ключевые слова для поиска технических требований
-        tech_start_keywords = [
-            'размеры', 'обработать', 'поверхность', 'допуск', 'шероховатость',
-            'технические', 'требования', '1 *', '2 *', '3 *', '1.', '2.', '3.'
-        ]
-        
-        tech_content_keywords = [
-            'размер', 'обработ', 'поверхност', 'допуск', 'шероховатость',
-            'покрытие', 'защит', 'качество', 'точность', 'сборк', 'свар'
-        ]
-        
-        end_keywords = ['примечания', 'литература', 'таблица', 'рисунок', '---']
+        has_tech_content_anywhere = False
         
         for i, line in enumerate(lines):
             clean_line = line.strip()
             if not clean_line:
                 continue
             
+            # Все ключевые слова строки находим одним проходом автомата
+            line_keywords = _TECH_KEYWORDS.matches(clean_line)
+            has_tech_content = not line_keywords.isdisjoint(Config.TECH_CONTENT_KEYWORDS)
+            is_numbered = bool(_NUMBERED_ITEM.match(clean_line))
+            
             # Проверяем начало технических требований
             if not in_tech_section:
                 # Ищем начало по ключевым словам или нумерации
-                if (any(keyword in clean_line.lower() for keyword in tech_start_keywords) or
-                    re.match(r'^\d+[\.\*\)]\s', clean_line) or
-                    re.match(r'^\d+\s*[\.\*\)]\s', clean_line)):
+                if (not line_keywords.isdisjoint(Config.TECH_START_KEYWORDS) or
+                    is_numbered or
+                    _NUMBERED_ITEM_SPACED.match(clean_line)):
                     
                     # Проверяем, что это действительно техническое содержание
-                    has_tech_content = any(keyword in clean_line.lower() for keyword in tech_content_keywords)
-                    if has_tech_content or re.match(r'^\d+[\.\*\)]\s', clean_line):
+                    if has_tech_content or is_numbered:
                         in_tech_section = True
                         tech_section_started = True
                         print(f"📍 Начало техтребований найдено: '{clean_line}'")
@@ -348,32 +597,32 @@ class DocumentAnalyzer:
             # Если мы в разделе технических требований
             if in_tech_section:
                 # Проверяем конец раздела
-                if any(end_keyword in clean_line.lower() for end_keyword in end_keywords):
+                if not line_keywords.isdisjoint(Config.TECH_END_KEYWORDS):
                     print(f"📍 Конец техтребований: '{clean_line}'")
                     break
                 
                 # Добавляем строку если она имеет техническое содержание или является частью нумерованного списка
-                if (any(keyword in clean_line.lower() for keyword in tech_content_keywords) or
-                    re.match(r'^\d+[\.\*\)]\s', clean_line) or
-                    re.match(r'^[•\-\*]\s', clean_line) or
+                if (has_tech_content or
+                    is_numbered or
+                    _BULLET_ITEM.match(clean_line) or
                     tech_section_started):
                     
                     tech_lines.append(clean_line)
+                    has_tech_content_anywhere = has_tech_content_anywhere or has_tech_content
                     
                     # Если это начало следующего раздела после длинного пробела, прекращаем
                     if (len(tech_lines) > 3 and 
                         len(clean_line) < 20 and 
-                        not any(keyword in clean_line.lower() for keyword in tech_content_keywords) and
-                        not re.match(r'^\d+[\.\*\)]\s', clean_line)):
+                        not has_tech_content and
+                        not is_numbered):
                         break
         
         tech_text = "\n".join(tech_lines)
         
-        # Проверяем, что нашли достаточно технического содержания
-        if tech_text and len(tech_text) > 10:
-            tech_word_count = sum(1 for keyword in tech_content_keywords if keyword in tech_text.lower())
-            if tech_word_count >= 1:  # Хотя бы одно техническое ключевое слово
-                return tech_text
+        # Проверяем, что нашли достаточно технического содержания:
+        # хотя бы одно техническое ключевое слово
+        if tech_text and len(tech_text) > 10 and has_tech_content_anywhere:
+            return tech_text
         
         return ""
 
@@ -395,9 +644,13 @@ class DocumentAnalyzer:
         print(f"   Общий текст: {len(drawing_text)} символов")
         print(f"   Техтребования: '{tech_text[:100]}...'")  # Показываем начало текста
         
+        # Один проход сканера по каждому тексту вместо отдельных findall
+        drawing_scan = scan_elements(drawing_text)
+        tech_scan = scan_elements(tech_text)
+        
         # Извлекаем шероховатости из обоих источников
-        drawing_roughness = self._extract_roughness_from_text(drawing_text)
-        tech_roughness = self._extract_roughness_from_text(tech_text)
+        drawing_roughness = drawing_scan['roughness']
+        tech_roughness = tech_scan['roughness']
         
         elements['roughness'] = {
             'drawing': drawing_roughness,
@@ -408,20 +661,13 @@ class DocumentAnalyzer:
         print(f"   Шероховатости в техтребованиях: {tech_roughness}")
         
         # Коды документов
-        code_patterns = [
-            r'[А-ЯA-Z]{2,4}[\.\-]\d+[\.\-]\d+[А-ЯA-Z]{2,3}',
-            r'[А-ЯA-Z]{2,4}\d+\.\d+[А-ЯA-Z]{2,3}',
-        ]
-        
-        for pattern in code_patterns:
-            found_codes = re.findall(pattern, drawing_text, re.IGNORECASE)
-            elements['codes'].extend(found_codes)
-            if found_codes:
-                print(f"   📄 Найдены коды: {found_codes}")
+        elements['codes'] = drawing_scan['codes']
+        if elements['codes']:
+            print(f"   📄 Найдены коды: {elements['codes']}")
         
         # УЛУЧШЕННЫЙ ПОИСК БУКВ - ищем отдельно стоящие заглавные буквы
-        drawing_letters = self._find_standalone_letters(drawing_text)
-        tech_letters = self._find_standalone_letters(tech_text)
+        drawing_letters = drawing_scan['letters']
+        tech_letters = tech_scan['letters']
         
         elements['letters'] = drawing_letters
         elements['tech_letters'] = tech_letters
@@ -432,7 +678,7 @@ class DocumentAnalyzer:
             print(f"   🔤 Найдены буквенные обозначения в техтребованиях: {tech_letters}")
         
         # УЛУЧШЕННЫЙ ПОИСК ЗВЕЗДОЧЕК - исключаем дублирование
-        all_asterisks = re.findall(r'\d+\*+|\*+\d+', drawing_text)
+        all_asterisks = drawing_scan['asterisks']
         
         # Разделяем по типам звездочек
         for ast in all_asterisks:
@@ -453,86 +699,39 @@ class DocumentAnalyzer:
                 ast_name = self._get_asterisk_name(ast_type)
                 print(f"   ⭐ {ast_name}: {elements['asterisks'][ast_type]}")
         
-        # Размеры - улучшенный поиск
-        dimension_patterns = [
-            r'\d+[.,]?\d*\s*[ммсм]',  # с единицами измерения
-            r'\d+[.,]?\d*\s*°',        # явные угловые
-            r'[±]?\d+[.,]?\d*',        # числовые значения
-            r'R\d+[.,]?\d*',           # радиусы
-            r'⌀\d+[.,]?\d*',          # диаметры
-            r'\d+\s*град',             # "45 град"
-            r'\d+\s*deg',              # англ. вариант
-        ]
-        all_dimensions = []
-        for pattern in dimension_patterns:
-            dimensions = re.findall(pattern, drawing_text, re.IGNORECASE)
-            all_dimensions.extend(dimensions)
-        
-        elements['dimensions'] = list(set(all_dimensions))
+        # Размеры - каждый токен в наиболее специфичной форме (R5, ⌀10, 45°, 12.5)
+        elements['dimensions'] = drawing_scan['dimensions']
         
         if elements['dimensions']:
             print(f"   📏 Найдены размеры ({len(elements['dimensions'])} шт): {elements['dimensions'][:10]}")
         
         # Допуски и базы
-        for symbol in Config.TOLERANCE_SYMBOLS:
-            if symbol in drawing_text:
-                elements['tolerances'].append(symbol)
-                print(f"   ⚙️ Найден символ допуска: {symbol}")
-                base_matches = re.findall(f'{re.escape(symbol)}[\\s]*([A-Z{Config.BASE_SEPARATOR}]+)', drawing_text)
-                if base_matches:
-                    elements['bases'].extend(base_matches)
-                    print(f"   🎯 Найдены базы для {symbol}: {base_matches}")
+        for symbol, base_matches in find_tolerance_bases(drawing_text).items():
+            elements['tolerances'].append(symbol)
+            print(f"   ⚙️ Найден символ допуска: {symbol}")
+            if base_matches:
+                elements['bases'].extend(base_matches)
+                print(f"   🎯 Найдены базы для {symbol}: {base_matches}")
         
         return elements
     
     def _extract_roughness_from_text(self, text: str) -> list:
         """Извлекает обозначения шероховатости из текста"""
-        roughness_patterns = [
-            r'R[az]\s*\d+[.,]?\d*',  # Ra 3.2, Rz 50
-            r'R[az]\d+[.,]?\d*',     # Ra3.2, Rz50
-            r'шероховатость\s*R[az]\s*\d+[.,]?\d*',  # шероховатость Ra 3.2
-        ]
-        
-        found_roughness = []
-        for pattern in roughness_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for match in matches:
-                # Нормализуем формат
-                normalized = re.sub(r'\s+', ' ', match.strip())
-                found_roughness.append(normalized)
-        
-        return list(set(found_roughness))  # Убираем дубликаты
+        return scan_elements(text)['roughness']
 
     def _find_standalone_letters(self, text: str) -> list:
         """Поиск отдельно стоящих заглавных букв (не в составе слов или кодов)"""
-        standalone_pattern = r'(?<!\w)[A-ZА-Я](?!\w)'
-        all_letters = re.findall(standalone_pattern, text)
-        
-        common_drawing_letters = {'A', 'B', 'C', 'D', 'X', 'Y', 'Z', 'I', 'V', 'L', 'M', 'N', 'O', 'P', 'R', 'S', 'T','H','Т','Н'}
-        
-        dimension_letters = set()
-        dimension_patterns = [r'R\d', r'⌀\d', r'[A-Z]\d', r'\d[A-Z]']
-        for pattern in dimension_patterns:
-            dimension_matches = re.findall(pattern, text)
-            for match in dimension_matches:
-                if len(match) == 2 and match[0].isalpha():
-                    dimension_letters.add(match[0])
-                elif len(match) == 2 and match[1].isalpha():
-                    dimension_letters.add(match[1])
-        
-        filtered_letters = []
-        for letter in all_letters:
-            if (letter not in common_drawing_letters and 
-                letter not in dimension_letters and
-                letter not in filtered_letters):
-                filtered_letters.append(letter)
-        
-        return filtered_letters
+        return scan_elements(text)['letters']
 
     def _analyze_graphic_elements(self, drawings: list, text_dict: dict, page) -> dict:
         """Анализ графических элементов (линий, стрелок)"""
+        from line_preprocessing import preprocess_lines, line_count_drop
+
         graphic_analysis = {
             'lines': [],
+            'excluded_lines': [],
+            'rects': [],
+            'line_stats': {},
             'arrows': [],
             'dimension_lines': [],
             'extension_lines': [],
@@ -544,28 +743,32 @@ class DocumentAnalyzer:
         print(f"\n📐 АНАЛИЗ ГРАФИЧЕСКИХ ЭЛЕМЕНТОВ:")
         print(f"   Drawing objects: {len(drawings)}")
         
-        # Анализируем линии из drawings
-        for drawing in drawings:
-            items = drawing.get('items', [])
-            for item in items:
-                if item[0] == 'l':  # line
-                    line_data = {
-                        'type': 'line',
-                        'start': item[1],
-                        'end': item[2],
-                        'length': self._calculate_distance(item[1], item[2]),
-                        'angle': self._calculate_angle(item[1], item[2]),
-                        'color': item[3] if len(item) > 3 else (0, 0, 0),
-                        'width': item[4] if len(item) > 4 else 1.0
-                    }
-                    graphic_analysis['lines'].append(line_data)
-                    
-                    # Определяем стрелки (короткие линии под углом)
-                    if 2 <= line_data['length'] <= 8:
-                        if 50 <= abs(line_data['angle']) <= 70 or 110 <= abs(line_data['angle']) <= 130:
-                            graphic_analysis['arrows'].append(line_data)
+        # Слияние раздробленных отрезков и отделение штриховки (line_preprocessing)
+        prepared = preprocess_lines(drawings)
+        for start, end, segments in prepared['lines']:
+            line_data = self._make_line_data(start, end, segments)
+            graphic_analysis['lines'].append(line_data)
+            
+            # Определяем стрелки (короткие линии под углом)
+            if 2 <= line_data['length'] <= 8:
+                if 50 <= abs(line_data['angle']) <= 70 or 110 <= abs(line_data['angle']) <= 130:
+                    graphic_analysis['arrows'].append(line_data)
+        
+        # Штриховка и заливки не анализируются, но остаются с пометкой причины
+        for start, end, segments in prepared['excluded']:
+            line_data = self._make_line_data(start, end, segments)
+            line_data['excluded'] = 'hatch'
+            graphic_analysis['excluded_lines'].append(line_data)
         
-        print(f"   📏 Линий: {len(graphic_analysis['lines'])}")
+        for drawing in drawings:
+            for item in drawing.get('items', []):
+                if item[0] == 're':
+                    graphic_analysis['rects'].append(item[1])
+        
+        stats = prepared['stats']
+        graphic_analysis['line_stats'] = stats
+        print(f"   📏 Линий: {stats['analysed']} (отрезков {stats['raw']}, после слияния {stats['merged']}, "
+              f"штриховка {stats['hatch']}, -{line_count_drop(stats) * 100:.0f}%)")
         print(f"   🏹 Стрелок: {len(graphic_analysis['arrows'])}")
         
         # Анализируем текстовые элементы для определения размерных линий
@@ -579,27 +782,21 @@ class DocumentAnalyzer:
                         bbox = span['bbox']
                         position = [(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2]
 
-                        is_numeric = bool(re.search(r'\d', text))
+                        is_numeric = bool(_HAS_DIGIT.search(text))
                         if not is_numeric:
                             continue
 
-                        core_text = re.sub(r'[\*\s]+$', '', text)
+                        core_text = _TRAILING_ASTERISKS.sub('', text)
                         if not core_text:
                             continue
 
-                        is_dimension = bool(re.match(
-                            r'^[±]?\d+[.,]?\d*[°ммсмR⌀]?$|'
-                            r'^R\d+[.,]?\d*$|'
-                            r'^⌀\d+[.,]?\d*$|'
-                            r'^\d+[.,]?\d*\s*°$|'
-                            r'^\d+\s*(град|deg)$',
-                            core_text, re.IGNORECASE
-                        ))
+                        is_dimension = bool(_DIMENSION_TEXT.match(core_text))
 
                         if not is_dimension:
                             continue
 
-                        is_angular = any(ind in text.lower() for ind in ['°', 'град', 'deg', 'угол', '∠'])
+                        lower_text = text.lower()
+                        is_angular = any(ind in lower_text for ind in _ANGULAR_INDICATORS)
 
                         text_data = {
                             'text': text,
@@ -629,6 +826,19 @@ class DocumentAnalyzer:
         
         return graphic_analysis
 
+    def _make_line_data(self, start, end, segments: int = 1) -> dict:
+        """Описание линии для графического анализа"""
+        return {
+            'type': 'line',
+            'start': start,
+            'end': end,
+            'length': self._calculate_distance(start, end),
+            'angle': self._calculate_angle(start, end),
+            'color': (0, 0, 0),
+            'width': 1.0,
+            'segments': segments
+        }
+
     def _analyze_dimension_elements(self, lines, dimension_texts):
         """Анализ размерных элементов с fallback по ориентации текста"""
         dimension_elements = []
@@ -750,20 +960,36 @@ class PreciseRuleEngine:
         print(f"\n📋 ОБЩИЕ ТЕХТРЕБОВАНИЯ С ПЕРВОЙ СТРАНИЦЫ:")
         print(f"'{first_page_tech_requirements[:200]}...'")
         
+        # Согласованность букв, звездочек и баз - один раз по индексу всего документа
+        document_index = self._build_document_index(text_data)
+        document_violations = self._check_document_consistency(document_index, first_page_tech_requirements)
+        
+        page_violations = {}
         for page in text_data['pages']:
             analysis = page['analysis']
             page_num = page['page_number']
+            page_start = len(violations)
             
             print(f"\n🔍 ПРОВЕРКА СТРАНИЦЫ {page_num}:")
             
+            # Повтор листа с тем же анализом - замечания оригинала с номером этой страницы
+            source = page.get('duplicate_of')
+            if source in page_violations and analysis is text_data['pages'][source - 1]['analysis']:
+                print(f"   ♻️ Лист совпадает со страницей {source} - замечания перенесены")
+                copies = [self._violation_for_page(violation, source, page_num)
+                          for violation in page_violations[source]]
+                violations.extend(copies)
+                page_violations[page_num] = copies
+                continue
+            
             # 1.1.1 - Конкретная проверка кода
             violations.extend(self._check_1_1_1_precise(page, analysis))
             
-            # 1.1.3 - УЛУЧШЕННАЯ проверка буквенных обозначений (используем техтребования с первой страницы)
-            violations.extend(self._check_1_1_3_precise(page, analysis, first_page_tech_requirements))
+            # 1.1.3 - буквенные обозначения (замечания документа, относящиеся к этому листу)
+            violations.extend(document_violations.pop((page_num, '1.1.3'), []))
             
-            # 1.1.4 - УЛУЧШЕННАЯ проверка звездочек (используем техтребования с первой страницы)
-            violations.extend(self._check_1_1_4_precise(page, analysis, first_page_tech_requirements))
+            # 1.1.4 - звездочки (замечания документа, относящиеся к этому листу)
+            violations.extend(document_violations.pop((page_num, '1.1.4'), []))
             
             # 1.1.5 - УЛУЧШЕННАЯ проверка размеров в зоне 30°
             violations.extend(self._check_1_1_5_precise(page, analysis))
@@ -771,11 +997,18 @@ class PreciseRuleEngine:
             # 1.1.6 - УЛУЧШЕННАЯ проверка угловых размеров
             violations.extend(self._check_1_1_6_precise(page, analysis))
             
-            # 1.1.8 - Точная проверка обозначений баз
-            violations.extend(self._check_1_1_8_precise(page, analysis))
+            # 1.1.8 - обозначения баз (замечания документа, относящиеся к этому листу)
+            violations.extend(document_violations.pop((page_num, '1.1.8'), []))
 
             # НОВАЯ ПРОВЕРКА 1.1.9
             violations.extend(self._check_1_1_9_precise(page, analysis, first_page_tech_requirements))
+            
+            # Номер страницы - для наложения замечаний на превью
+            for violation in violations[page_start:]:
+                violation.setdefault('page', page_num)
+            # Повтор листа получает копии только замечаний самого листа
+            page_violations[page_num] = [violation for violation in violations[page_start:]
+                                         if violation['rule_id'] not in DOCUMENT_RULES]
 
         
         
@@ -785,7 +1018,8 @@ class PreciseRuleEngine:
             'total_violations': len(violations),
             'high_severity': len([v for v in violations if v['severity'] == 'high']),
             'medium_severity': len([v for v in violations if v['severity'] == 'medium']),
-            'low_severity': len([v for v in violations if v['severity'] == 'low'])
+            'low_severity': len([v for v in violations if v['severity'] == 'low']),
+            'duplicate_pages': text_data.get('duplicate_pages', 0)
         }
 
         return {
@@ -794,6 +1028,18 @@ class PreciseRuleEngine:
             'is_compliant': len([v for v in violations if v['severity'] in ['high', 'medium']]) == 0
         }
 
+    def _violation_for_page(self, violation: dict, source_page: int, page_num: int) -> dict:
+        """Копия замечания листа source_page для одинакового листа page_num"""
+        def rewrite(match):
+            if int(match.group(2)) != source_page:
+                return match.group(0)  # ссылки на другие листы (например, техтребования стр. 1)
+            return f'{match.group(1)}{page_num}'
+
+        copy = {key: _PAGE_REFERENCE.sub(rewrite, value) if isinstance(value, str) else value
+                for key, value in violation.items()}
+        copy['page'] = page_num
+        return copy
+
     def _check_1_1_1_precise(self, page: dict, analysis: dict) -> list:
         """1.1.1 - КОНКРЕТНАЯ проверка основной надписи (без дублирования)"""
         violations = []
@@ -804,6 +1050,9 @@ class PreciseRuleEngine:
         print(f"   1.1.1 Основная надпись: '{title_text[:50]}...'")
         print(f"   1.1.1 Найдены коды: {found_codes}")
         
+        # Наименования документов из классификатора, встречающиеся в основной надписи
+        title_names = _DOCUMENT_NAMES.matches(title_text)
+        
         # Убираем дубликаты кодов
         unique_codes = list(set(found_codes))
         print(f"   1.1.1 Уникальные коды: {unique_codes}")
@@ -821,8 +1070,9 @@ class PreciseRuleEngine:
         
         # Проверяем только уникальные коды
         for code in unique_codes:
-            doc_type_match = re.search(r'[А-ЯA-Z]{2,3}$', code)
-            if not doc_type_match:
+            designation = DESIGNATIONS.parse(code)
+            if (designation is None or not 2 <= len(designation.doc_type) <= 3
+                    or not designation.doc_type.isupper()):
                 violations.append({
                     'rule_id': '1.1.1',
                     'rule_text': 'Проверка заполнения основной надписи: формат кода',
@@ -833,9 +1083,9 @@ class PreciseRuleEngine:
                 })
                 continue
             
-            doc_type = doc_type_match.group()
+            doc_type = designation.doc_type
             
-            if doc_type not in self.document_codes:
+            if not designation.known_type:
                 violations.append({
                     'rule_id': '1.1.1',
                     'rule_text': 'Проверка заполнения основной надписи: тип документа',
@@ -848,7 +1098,7 @@ class PreciseRuleEngine:
             
             expected_name = self.document_codes[doc_type]
             
-            if expected_name.lower() not in title_text.lower():
+            if expected_name.lower() not in title_names:
                 violations.append({
                     'rule_id': '1.1.1',
                     'rule_text': 'Проверка заполнения основной надписи: соответствие кода и наименования',
@@ -860,16 +1110,71 @@ class PreciseRuleEngine:
         
         return violations
 
-    def _check_1_1_3_precise(self, page: dict, analysis: dict, first_page_tech_requirements: str) -> list:
-        """1.1.3 - УЛУЧШЕННАЯ проверка буквенных обозначений (с использованием техтребований с первой страницы)"""
+    def _build_document_index(self, text_data: dict) -> dict:
+        """Индекс документа за один проход по листам: на каких листах встречаются
+        буквы, звездочки и базы (в порядке первого появления).
+
+        Повтор листа (duplicate_of) новых обозначений не добавляет и в индекс не
+        входит; его номер есть только в списке всех листов 'pages'.
+        """
+        index = {
+            'pages': [],
+            'letters': {},
+            'asterisks': {'single': {}, 'double': {}, 'triple': {}},
+            'bases': {}
+        }
+        for page in text_data['pages']:
+            analysis = page['analysis']
+            page_num = page['page_number']
+            index['pages'].append(page_num)
+            if page.get('duplicate_of'):
+                continue
+            
+            found_elements = analysis['found_elements']
+            for letter in found_elements['letters']:
+                index['letters'].setdefault(letter, []).append(page_num)
+            for ast_type, values in index['asterisks'].items():
+                for value in found_elements['asterisks'][ast_type]:
+                    values.setdefault(value, []).append(page_num)
+            # Каждый экземпляр базы - отдельная запись с номером листа
+            for base in self._find_bases_by_surrounding_graphics(page, analysis, found_elements['letters']):
+                index['bases'].setdefault(base, []).append(page_num)
+        
+        print(f"\n🗂️ ИНДЕКС ДОКУМЕНТА: буквы {list(index['letters'])}, базы {list(index['bases'])}")
+        return index
+
+    def _check_document_consistency(self, index: dict, first_page_tech_requirements: str) -> dict:
+        """Правила согласованности всего документа: {(страница, правило): [замечания]}"""
+        grouped = {}
+        for violation in (self._check_1_1_3_document(index, first_page_tech_requirements)
+                          + self._check_1_1_4_document(index, first_page_tech_requirements)
+                          + self._check_1_1_8_document(index)):
+            grouped.setdefault((violation['page'], violation['rule_id']), []).append(violation)
+        return grouped
+
+    @staticmethod
+    def _pages_of(occurrences: dict, keys) -> list:
+        """Листы, на которых встречается хотя бы один из ключей, по возрастанию"""
+        return sorted({page_num for key in keys for page_num in occurrences[key]})
+
+    @staticmethod
+    def _pages_text(pages: list) -> str:
+        return ', '.join(str(page_num) for page_num in pages)
+
+    def _pages_location(self, pages: list) -> str:
+        if len(pages) == 1:
+            return f'Страница {pages[0]}'
+        return f'Страницы {self._pages_text(pages)}'
+
+    def _check_1_1_3_document(self, index: dict, first_page_tech_requirements: str) -> list:
+        """1.1.3 - согласованность буквенных обозначений всех листов с техтребованиями первой страницы"""
         violations = []
-        page_num = page['page_number']
-        drawing_letters = analysis['found_elements']['letters']
+        drawing_letters = list(index['letters'])
         
         # Используем техтребования с первой страницы для всех страниц
         tech_letters = self._find_standalone_letters(first_page_tech_requirements)
         
-        print(f"   1.1.3 Буквы на чертеже (стр. {page_num}): {drawing_letters}")
+        print(f"   1.1.3 Буквы на чертеже (все листы): {index['letters']}")
         print(f"   1.1.3 Буквы в техтребованиях (с 1 стр.): {tech_letters}")
         
         # Если нет букв ни на чертеже, ни в техтребованиях - это не ошибка
@@ -879,112 +1184,141 @@ class PreciseRuleEngine:
         
         # Случай 1: Буквы есть на чертеже, но нет раздела техтребований
         if drawing_letters and not first_page_tech_requirements.strip():
+            pages = self._pages_of(index['letters'], drawing_letters)
             violations.append({
                 'rule_id': '1.1.3',
                 'rule_text': 'Проверка согласованности буквенных обозначений',
                 'violation': f'На чертеже есть буквы {", ".join(drawing_letters)}, но РАЗДЕЛА технических требований НЕТ для их пояснения',
-                'location': f'Страница {page_num}',
+                'location': self._pages_location(pages),
                 'severity': 'medium',
-                'recommendation': 'Добавьте раздел "Технические требования" на первой странице с пояснениями для каждой буквы'
+                'recommendation': 'Добавьте раздел "Технические требования" на первой странице с пояснениями для каждой буквы',
+                'page': pages[0]
             })
             return violations
         
         # Случай 2: Буквы есть на чертеже, но отсутствуют в техтребованиях
-        missing_in_tech = []
-        for letter in drawing_letters:
-            if letter not in tech_letters:
-                missing_in_tech.append(letter)
+        missing_in_tech = [letter for letter in drawing_letters if letter not in tech_letters]
         
         if missing_in_tech:
+            pages = self._pages_of(index['letters'], missing_in_tech)
             violations.append({
                 'rule_id': '1.1.3',
                 'rule_text': 'Проверка согласованности буквенных обозначений',
-                'violation': f'Буквы {", ".join(missing_in_tech)} ИСПОЛЬЗУЮТСЯ на чертеже (стр. {page_num}), но НЕ ПОЯСНЕНЫ в технических требованиях на первой странице',
-                'location': f'Страница {page_num}, технические требования (стр. 1)',
+                'violation': f'Буквы {", ".join(missing_in_tech)} ИСПОЛЬЗУЮТСЯ на чертеже (стр. {self._pages_text(pages)}), но НЕ ПОЯСНЕНЫ в технических требованиях на первой странице',
+                'location': f'{self._pages_location(pages)}, технические требования (стр. 1)',
                 'severity': 'medium',
-                'recommendation': f'Добавьте в технические требования на первой странице пояснения для букв: {", ".join(missing_in_tech)}'
+                'recommendation': f'Добавьте в технические требования на первой странице пояснения для букв: {", ".join(missing_in_tech)}',
+                'page': pages[0]
             })
         
-        # Случай 3: Буквы есть в техтребованиях, но отсутствуют на чертеже
-        missing_in_drawing = []
-        for letter in tech_letters:
-            if letter not in drawing_letters:
-                missing_in_drawing.append(letter)
+        # Случай 3: Буквы есть в техтребованиях, но не используются ни на одном листе
+        missing_in_drawing = [letter for letter in tech_letters if letter not in index['letters']]
         
         if missing_in_drawing:
+            pages = index['pages']
             violations.append({
                 'rule_id': '1.1.3',
                 'rule_text': 'Проверка согласованности буквенных обозначений',
-                'violation': f'Буквы {", ".join(missing_in_drawing)} УКАЗАНЫ в технических требованиях на первой странице, но НЕ ИСПОЛЬЗУЮТСЯ на чертеже (стр. {page_num})',
-                'location': f'Страница {page_num}, поле чертежа',
+                'violation': f'Буквы {", ".join(missing_in_drawing)} УКАЗАНЫ в технических требованиях на первой странице, но НЕ ИСПОЛЬЗУЮТСЯ на чертеже (стр. {self._pages_text(pages)})',
+                'location': f'{self._pages_location(pages)}, поле чертежа',
                 'severity': 'medium',
-                'recommendation': f'Используйте буквы {", ".join(missing_in_drawing)} на чертеже или удалите их из технических требований на первой странице'
+                'recommendation': f'Используйте буквы {", ".join(missing_in_drawing)} на чертеже или удалите их из технических требований на первой странице',
+                'page': pages[0]
             })
         
         # Если все буквы согласованы
-        if not missing_in_tech and not missing_in_drawing and (drawing_letters or tech_letters):
+        if not missing_in_tech and not missing_in_drawing:
             print(f"   1.1.3 Все буквенные обозначения согласованы - проверка пройдена")
         
         return violations
 
-    def _check_1_1_4_precise(self, page: dict, analysis: dict, first_page_tech_requirements: str) -> list:
-        """1.1.4 - УЛУЧШЕННАЯ проверка звездочек (с использованием техтребований с первой страницы)"""
+    def _check_1_1_4_document(self, index: dict, first_page_tech_requirements: str) -> list:
+        """1.1.4 - согласованность звездочек всех листов с техтребованиями первой страницы"""
         violations = []
-        page_num = page['page_number']
-        asterisks = analysis['found_elements']['asterisks']
-        
-        found_any = False
         
         # Проверяем звездочки на чертеже
         for ast_type in ['single', 'double', 'triple']:
-            ast_list = asterisks[ast_type]
-            if ast_list:
-                found_any = True
-                ast_name = self._get_asterisk_name(ast_type)
-                print(f"   1.1.4 Найдены {ast_name} на стр. {page_num}: {ast_list}")
-                
-                if not first_page_tech_requirements.strip():
-                    violations.append({
-                        'rule_id': '1.1.4',
-                        'rule_text': 'Проверка звездочек',
-                        'violation': f'{ast_name} {", ".join(ast_list)} есть на чертеже (стр. {page_num}), но РАЗДЕЛА технических требований НЕТ для их пояснения',
-                        'location': f'Страница {page_num}, поле чертежа',
-                        'severity': 'medium',
-                        'recommendation': f'Добавьте раздел "Технические требования" на первой странице с пояснениями для {ast_name.lower()}'
-                    })
-                else:
-                    tech_asterisks = self._count_tech_asterisks(first_page_tech_requirements, ast_type)
-                    if tech_asterisks == 0:
-                        violations.append({
-                            'rule_id': '1.1.4',
-                            'rule_text': 'Проверка звездочек',
-                            'violation': f'{ast_name} {", ".join(ast_list)} есть на чертеже (стр. {page_num}), но ОТСУТСТВУЮТ в технических требованиях на первой странице',
-                            'location': f'Страница {page_num}, технические требования (стр. 1)',
-                            'severity': 'medium',
-                            'recommendation': f'Добавьте в технические требования на первой странице пояснения для {ast_name.lower()}'
-                        })
-        
-        # НОВАЯ ПРОВЕРКА: звездочки в техтребованиях без соответствующих размеров на чертеже
-        for ast_type in ['single', 'double', 'triple']:
-            tech_asterisks_count = self._count_tech_asterisks(first_page_tech_requirements, ast_type)
-            drawing_asterisks_count = len(asterisks[ast_type])
+            found = index['asterisks'][ast_type]
+            if not found:
+                continue
+            ast_list = list(found)
+            ast_name = self._get_asterisk_name(ast_type)
+            pages = self._pages_of(found, ast_list)
+            print(f"   1.1.4 Найдены {ast_name} на стр. {self._pages_text(pages)}: {ast_list}")
             
-            if tech_asterisks_count > 0 and drawing_asterisks_count == 0:
-                ast_name = self._get_asterisk_name(ast_type)
+            if not first_page_tech_requirements.strip():
                 violations.append({
                     'rule_id': '1.1.4',
-                    'rule_text': 'Проверка согласованности звездочек',
-                    'violation': f'{ast_name} указаны в технических требованиях на первой странице, но отсутствуют на чертеже (стр. {page_num})',
-                    'location': f'Страница {page_num}, технические требования (стр. 1)',
+                    'rule_text': 'Проверка звездочек',
+                    'violation': f'{ast_name} {", ".join(ast_list)} есть на чертеже (стр. {self._pages_text(pages)}), но РАЗДЕЛА технических требований НЕТ для их пояснения',
+                    'location': f'{self._pages_location(pages)}, поле чертежа',
                     'severity': 'medium',
-                    'recommendation': f'Добавьте на чертеж (стр. {page_num}) размеры с {ast_name.lower()} или удалите их из технических требований на первой странице'
+                    'recommendation': f'Добавьте раздел "Технические требования" на первой странице с пояснениями для {ast_name.lower()}',
+                    'page': pages[0]
+                })
+            elif self._count_tech_asterisks(first_page_tech_requirements, ast_type) == 0:
+                violations.append({
+                    'rule_id': '1.1.4',
+                    'rule_text': 'Проверка звездочек',
+                    'violation': f'{ast_name} {", ".join(ast_list)} есть на чертеже (стр. {self._pages_text(pages)}), но ОТСУТСТВУЮТ в технических требованиях на первой странице',
+                    'location': f'{self._pages_location(pages)}, технические требования (стр. 1)',
+                    'severity': 'medium',
+                    'recommendation': f'Добавьте в технические требования на первой странице пояснения для {ast_name.lower()}',
+                    'page': pages[0]
                 })
         
-        if not found_any:
-            print(f"   1.1.4 Звездочки не найдены на стр. {page_num}")
+        # Звездочки в техтребованиях без соответствующих размеров ни на одном листе
+        pages = index['pages']
+        for ast_type in ['single', 'double', 'triple']:
+            if index['asterisks'][ast_type] or self._count_tech_asterisks(first_page_tech_requirements, ast_type) == 0:
+                continue
+            ast_name = self._get_asterisk_name(ast_type)
+            violations.append({
+                'rule_id': '1.1.4',
+                'rule_text': 'Проверка согласованности звездочек',
+                'violation': f'{ast_name} указаны в технических требованиях на первой странице, но отсутствуют на чертеже (стр. {self._pages_text(pages)})',
+                'location': f'{self._pages_location(pages)}, технические требования (стр. 1)',
+                'severity': 'medium',
+                'recommendation': f'Добавьте на чертеж (стр. {self._pages_text(pages)}) размеры с {ast_name.lower()} или удалите их из технических требований на первой странице',
+                'page': pages[0]
+            })
+        
+        if not any(index['asterisks'].values()):
+            print(f"   1.1.4 Звездочки в документе не найдены")
         
         return violations
 
+    def _zone_30_masks(self, graphic_analysis: dict) -> dict:
+        """Один векторный проход правил 1.1.5 и 1.1.6 по размерным элементам страницы.
+
+        Возвращает маски 'angular' (угловой размер) и 'violation' (размер в зоне 30°
+        с негоризонтальным текстом). Результат сохраняется в graphic_analysis, и
+        второе правило использует уже посчитанные маски.
+        """
+        masks = graphic_analysis.get('zone_30_masks')
+        if masks is not None:
+            return masks
+
+        import numpy as np
+
+        dimension_elements = graphic_analysis['dimension_elements']
+        rotation = np.array([element.get('rotation', 0) for element in dimension_elements], dtype=float)
+        direction = np.array([element.get('dimension_direction') for element in dimension_elements], dtype=float)
+        # Направление не определено (None -> nan) - берем поворот текста
+        direction = np.where(np.isnan(direction), rotation, direction)
+
+        # Те же границы, что в _is_in_30_degree_zone и _is_text_horizontal
+        normalized = np.mod(direction, 180)
+        in_zone = (normalized <= 30) | (normalized >= 150) | ((normalized >= 60) & (normalized <= 120))
+        is_horizontal = (np.abs(rotation) < 10) | (np.abs(rotation - 180) < 10)
+
+        masks = {
+            'angular': np.array([bool(element.get('is_angular', False)) for element in dimension_elements], dtype=bool),
+            'violation': in_zone & ~is_horizontal
+        }
+        graphic_analysis['zone_30_masks'] = masks
+        return masks
+
     def _check_1_1_5_precise(self, page: dict, analysis: dict) -> list:
         """1.1.5 - Проверка размеров в зоне 30°: текст должен быть горизонтальным"""
         violations = []
@@ -997,33 +1331,25 @@ class PreciseRuleEngine:
             print(f"   1.1.5 Размерные элементы не найдены на стр. {page_num}")
             return violations
 
-        analyzer = DocumentAnalyzer()
-        for i, element in enumerate(dimension_elements):
-            if element.get('is_angular', False):
-                continue
+        masks = self._zone_30_masks(graphic_analysis)
+        flagged = (masks['violation'] & ~masks['angular']).nonzero()[0]
+        print(f"   1.1.5 Линейных размеров: {int((~masks['angular']).sum())}, "
+              f"в зоне 30° с негоризонтальным текстом: {len(flagged)}")
 
-            dimension_direction = element.get('dimension_direction')
+        for i in flagged.tolist():
+            element = dimension_elements[i]
             text_rotation = element.get('rotation', 0)
             position = element.get('position', [0, 0])
-            
-            if dimension_direction is None:
-                dimension_direction = text_rotation
-
-            in_zone = analyzer._is_in_30_degree_zone(dimension_direction)
-            is_horizontal = analyzer._is_text_horizontal(text_rotation)
-            
-            print(f"      [{i+1}] Размер: '{element['text']}', направление: {dimension_direction:.1f}°, "
-                  f"поворот текста: {text_rotation:.1f}°, в зоне 30°: {in_zone}, горизонтален: {is_horizontal}")
-
-            if in_zone and not is_horizontal:
-                violations.append({
-                    'rule_id': '1.1.5',
-                    'rule_text': 'Проверка простановки размеров на полке линии выноски при их попадании в зону 30°',
-                    'violation': f'Размер "{element["text"]}" находится в зоне 30°, но текст не горизонтален (угол: {text_rotation:.1f}°)',
-                    'location': f'Страница {page_num}, координаты ({position[0]:.1f}, {position[1]:.1f})',
-                    'severity': 'medium',
-                    'recommendation': 'В зоне 30° от горизонтали/вертикали размерные числа должны быть расположены горизонтально.'
-                })
+            violations.append({
+                'rule_id': '1.1.5',
+                'rule_text': 'Проверка простановки размеров на полке линии выноски при их попадании в зону 30°',
+                'violation': f'Размер "{element["text"]}" находится в зоне 30°, но текст не горизонтален (угол: {text_rotation:.1f}°)',
+                'location': f'Страница {page_num}, координаты ({position[0]:.1f}, {position[1]:.1f})',
+                'page': page_num,
+                'bbox': list(element.get('bbox') or []),
+                'severity': 'medium',
+                'recommendation': 'В зоне 30° от горизонтали/вертикали размерные числа должны быть расположены горизонтально.'
+            })
         return violations
 
     def _check_1_1_6_precise(self, page: dict, analysis: dict) -> list:
@@ -1037,78 +1363,63 @@ class PreciseRuleEngine:
         if not dimension_elements:
             return violations
 
-        analyzer = DocumentAnalyzer()
-        angular_elements = [elem for elem in dimension_elements if elem.get('is_angular', False)]
-        print(f"      Найдено угловых размеров на стр. {page_num}: {len(angular_elements)}")
+        masks = self._zone_30_masks(graphic_analysis)
+        flagged = (masks['violation'] & masks['angular']).nonzero()[0]
+        print(f"      Найдено угловых размеров на стр. {page_num}: {int(masks['angular'].sum())}, "
+              f"в зоне 30° с негоризонтальным текстом: {len(flagged)}")
         
-        for i, element in enumerate(angular_elements):
-            dimension_direction = element.get('dimension_direction')
+        for i in flagged.tolist():
+            element = dimension_elements[i]
             text_rotation = element.get('rotation', 0)
             position = element.get('position', [0, 0])
-            
-            if dimension_direction is None:
-                dimension_direction = text_rotation
-
-            in_zone = analyzer._is_in_30_degree_zone(dimension_direction)
-            is_horizontal = analyzer._is_text_horizontal(text_rotation)
-            
-            print(f"      [{i+1}] Угловой размер: '{element['text']}', направление: {dimension_direction:.1f}°, "
-                  f"поворот текста: {text_rotation:.1f}°, в зоне 30°: {in_zone}, горизонтален: {is_horizontal}")
-
-            if in_zone and not is_horizontal:
-                violations.append({
-                    'rule_id': '1.1.6',
-                    'rule_text': 'Проверка простановки угловых размеров на полке линии выноски при их попадании в зону 30°',
-                    'violation': f'Угловой размер "{element["text"]}" находится в зоне 30°, но текст не горизонтален (угол: {text_rotation:.1f}°)',
-                    'location': f'Страница {page_num}, координаты ({position[0]:.1f}, {position[1]:.1f})',
-                    'severity': 'medium',
-                    'recommendation': 'Угловые размеры в зоне 30° должны быть расположены горизонтально на полке линии-выноски.'
-                })
+            violations.append({
+                'rule_id': '1.1.6',
+                'rule_text': 'Проверка простановки угловых размеров на полке линии выноски при их попадании в зону 30°',
+                'violation': f'Угловой размер "{element["text"]}" находится в зоне 30°, но текст не горизонтален (угол: {text_rotation:.1f}°)',
+                'location': f'Страница {page_num}, координаты ({position[0]:.1f}, {position[1]:.1f})',
+                'page': page_num,
+                'bbox': list(element.get('bbox') or []),
+                'severity': 'medium',
+                'recommendation': 'Угловые размеры в зоне 30° должны быть расположены горизонтально на полке линии-выноски.'
+            })
         return violations
 
-    def _check_1_1_8_precise(self, page: dict, analysis: dict) -> list:
-        """1.1.8 - ТОЧНАЯ проверка обозначений баз"""
-        return self.check_datum_letter_consistency(page, analysis)
+    def _check_1_1_8_document(self, index: dict) -> list:
+        """1.1.8 - Проверка наличия и соответствия буквенных обозначений баз.
 
-    def check_datum_letter_consistency(self, page: dict, analysis: dict) -> list:
-        """1.1.8 - Проверка наличия и соответствия буквенных обозначений баз"""
+        Экземпляры базы считаются по всем листам: база, обозначенная на одном
+        листе и указанная в рамке допуска на другом, имеет пару.
+        """
         violations = []
-        page_num = page['page_number']
-        
-        print(f"   1.1.8 Проверка обозначений баз на стр. {page_num}")
-        
-        all_capital_letters = analysis['found_elements']['letters']
-        print(f"   1.1.8 Все заглавные буквы на чертеже (стр. {page_num}): {all_capital_letters}")
-        
-        declared_bases = self._find_bases_by_surrounding_graphics(page, analysis, all_capital_letters)
-        print(f"   1.1.8 Объявленные базы на чертеже (стр. {page_num}): {declared_bases}")
+        base_pages = index['bases']
         
-        if not declared_bases:
-            print(f"   1.1.8 Базы не найдены на стр. {page_num} - проверка пройдена")
+        if not base_pages:
+            print(f"   1.1.8 Базы не найдены - проверка пройдена")
             return violations
         
-        base_counts = {}
-        for base in declared_bases:
-            base_counts[base] = base_counts.get(base, 0) + 1
+        base_counts = {base: len(pages) for base, pages in base_pages.items()}
+        print(f"   1.1.8 Количество баз по типам: {base_counts}")
         
-        print(f"   1.1.8 Количество баз по типам на стр. {page_num}: {base_counts}")
+        # База без пары - единственный экземпляр; замечание на его листе
+        bases_without_pairs = {}
+        for base_letter, pages in base_pages.items():
+            if len(pages) < 2:
+                bases_without_pairs.setdefault(pages[0], []).append(base_letter)
         
-        bases_without_pairs = []
-        for base_letter, count in base_counts.items():
-            if count < 2:
-                bases_without_pairs.append(base_letter)
-        
-        if bases_without_pairs:
+        for page_num in sorted(bases_without_pairs):
+            bases = bases_without_pairs[page_num]
             violations.append({
                 'rule_id': '1.1.8',
                 'rule_text': 'Проверка наличия и соответствия буквенных обозначений баз',
-                'violation': f'Для баз {", ".join(bases_without_pairs)} найдено только по одному экземпляру на стр. {page_num}, требуется минимум два',
+                'violation': f'Для баз {", ".join(bases)} найдено только по одному экземпляру на стр. {page_num}, требуется минимум два',
                 'location': f'Страница {page_num}, поле чертежа',
                 'severity': 'medium',
-                'recommendation': f'Добавьте второй экземпляр для баз: {", ".join(bases_without_pairs)}'
+                'recommendation': f'Добавьте второй экземпляр для баз: {", ".join(bases)}',
+                'page': page_num
             })
-        else:
-            print(f"   1.1.8 Все базы имеют пары на стр. {page_num} - проверка пройдена")
+        
+        if not bases_without_pairs:
+            print(f"   1.1.8 Все базы имеют пары - проверка пройдена")
         
         return violations
 
@@ -1116,7 +1427,7 @@ class PreciseRuleEngine:
         """Ищет базы по наличию графических элементов вокруг букв"""
         bases = []
         text_dict = page.get('text_dict', {})
-        drawings = page.get('drawings', [])
+        graphic_analysis = analysis['graphic_analysis']
         
         print(f"   1.1.8 Анализ букв на наличие графического окружения")
         
@@ -1144,7 +1455,7 @@ class PreciseRuleEngine:
             letter = instance['letter']
             position = instance['position']
             
-            graphic_elements_count = self._count_nearby_graphic_elements(drawings, position, 20.0)
+            graphic_elements_count = self._count_nearby_graphic_elements(graphic_analysis, position, 20.0)
             
             print(f"   1.1.8 Буква '{letter}' в ({position[0]:.1f}, {position[1]:.1f}): {graphic_elements_count} графических элементов рядом")
             
@@ -1154,31 +1465,26 @@ class PreciseRuleEngine:
         
         return bases
 
-    def _count_nearby_graphic_elements(self, drawings: list, point: tuple, radius: float) -> int:
-        """Считает графические элементы в радиусе от точки"""
+    def _count_nearby_graphic_elements(self, graphic_analysis: dict, point: tuple, radius: float) -> int:
+        """Считает графические элементы в радиусе от точки (без штриховки)"""
         count = 0
-        point_x, point_y = point
         
-        for drawing in drawings:
-            items = drawing.get('items', [])
-            for item in items:
-                if item[0] == 'l':
-                    start = item[1]
-                    end = item[2]
-                    
-                    dist_start = self._calculate_distance(start, point)
-                    dist_end = self._calculate_distance(end, point)
-                    dist_line = self._distance_to_line(start, end, point)
-                    
-                    if dist_start <= radius or dist_end <= radius or dist_line <= radius:
-                        count += 1
-                
-                elif item[0] == 're':
-                    rect = item[1]
-                    center_rect = ((rect[0] + rect[2])/2, (rect[1] + rect[3])/2)
-                    distance = self._calculate_distance(center_rect, point)
-                    if distance <= radius:
-                        count += 1
+        for line in graphic_analysis['lines']:
+            start = line['start']
+            end = line['end']
+            
+            dist_start = self._calculate_distance(start, point)
+            dist_end = self._calculate_distance(end, point)
+            dist_line = self._distance_to_line(start, end, point)
+            
+            if dist_start <= radius or dist_end <= radius or dist_line <= radius:
+                count += 1
+        
+        for rect in graphic_analysis['rects']:
+            center_rect = ((rect[0] + rect[2])/2, (rect[1] + rect[3])/2)
+            distance = self._calculate_distance(center_rect, point)
+            if distance <= radius:
+                count += 1
         
         return count
 
@@ -1197,29 +1503,7 @@ class PreciseRuleEngine:
 
     def _find_standalone_letters(self, text: str) -> list:
         """Поиск отдельно стоящих заглавных букв"""
-        standalone_pattern = r'(?<!\w)[A-ZА-Я](?!\w)'
-        all_letters = re.findall(standalone_pattern, text)
-        
-        common_drawing_letters = {'A', 'B', 'C', 'D', 'X', 'Y', 'Z', 'I', 'V', 'L', 'M', 'N', 'O', 'P', 'R', 'S', 'T','H','Т','Н'}
-        
-        dimension_letters = set()
-        dimension_patterns = [r'R\d', r'⌀\d', r'[A-Z]\d', r'\d[A-Z]']
-        for pattern in dimension_patterns:
-            dimension_matches = re.findall(pattern, text)
-            for match in dimension_matches:
-                if len(match) == 2 and match[0].isalpha():
-                    dimension_letters.add(match[0])
-                elif len(match) == 2 and match[1].isalpha():
-                    dimension_letters.add(match[1])
-        
-        filtered_letters = []
-        for letter in all_letters:
-            if (letter not in common_drawing_letters and 
-                letter not in dimension_letters and
-                letter not in filtered_letters):
-                filtered_letters.append(letter)
-        
-        return filtered_letters
+        return scan_elements(text)['letters']
     
 
     def _check_1_1_9_precise(self, page: dict, analysis: dict, first_page_tech_requirements: str) -> list:
@@ -1347,42 +1631,23 @@ rule_engine = PreciseRuleEngine()
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() == 'pdf'
 
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/analyze', methods=['POST'])
-def analyze_document():
-    if 'file' not in request.files:
-        return jsonify({'error': 'Файл не загружен'}), 400
-        
-    file = request.files['file']
-    if file.filename == '' or not allowed_file(file.filename):
-        return jsonify({'error': 'Требуется PDF-файл'}), 400
-
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_{filename}")
-    file.save(file_path)
+def create_app():
+    """Отдельное веб-приложение анализатора (без авторизации и хранилища)"""
+    from flask import Flask, render_template
+    from normcontrol import normcontrol_bp, AnalysisRequest
     
-    try:
-        text_data = doc_analyzer.extract_text_from_pdf(file_path)
-        document_data = {'text_data': text_data}
-        result = rule_engine.run_all_checks(document_data)
-        
-        os.remove(file_path)
-        
-        return jsonify({
-            'success': True,
-            'result': result
-        })
-        
-    except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        return jsonify({'error': f'Ошибка анализа: {str(e)}'}), 500
+    app = Flask(__name__)
+    # Загруженные PDF анализируются из памяти - папка для временных файлов не нужна
+    app.request_class = AnalysisRequest
+    app.config['SECRET_KEY'] = 'normcontrol-secret-key-2024'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+    
+    app.add_url_rule('/', 'index', lambda: render_template('index.html'))
+    app.register_blueprint(normcontrol_bp)
+    return app
 
 if __name__ == '__main__':
     print("🎯 УЛУЧШЕННЫЙ NormControl запущен!")
     print("📋 Все 8 проверок с детальной диагностикой")
     print("🔍 Подробный вывод в консоль включен")
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,84 @@
+"""Многошаблонный поиск ключевых слов (автомат Ахо-Корасик).
+
+Автомат строится один раз по набору ключевых слов и за один проход по строке
+находит вхождения всех слов сразу, вместо цикла any(k in line for k in ...)
+по каждому списку ключевых слов.
+"""
+
+
+class KeywordAutomaton:
+    def __init__(self, keywords, ignore_case=True):
+        """keywords - список слов или словарь {слово: метка}"""
+        self.ignore_case = ignore_case
+        if not isinstance(keywords, dict):
+            keywords = {keyword: keyword for keyword in keywords}
+
+        # Бор: переходы, метки найденных слов и длины слов в каждом узле
+        self._goto = [{}]
+        self._output = [()]
+        for keyword, label in keywords.items():
+            if ignore_case:
+                keyword = keyword.lower()
+            if not keyword:
+                continue
+            node = 0
+            for char in keyword:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._output.append(())
+                node = next_node
+            self._output[node] += ((label, len(keyword)),)
+
+        self._build_transitions()
+
+    def _build_transitions(self):
+        """Суффиксные ссылки и полная таблица переходов (детерминированный автомат)"""
+        fail = [0] * len(self._goto)
+        self._transitions = [dict(self._goto[0])] + [None] * (len(self._goto) - 1)
+
+        # Обход в ширину: суффиксная ссылка всегда ведет в уже обработанный узел,
+        # поэтому его таблица переходов готова и наследуется целиком
+        queue = list(self._goto[0].values())
+        for node in queue:
+            inherited = self._transitions[fail[node]]
+            transitions = dict(inherited)
+            for char, child in self._goto[node].items():
+                fail[child] = inherited.get(char, 0)
+                transitions[char] = child
+                queue.append(child)
+            self._transitions[node] = transitions
+            self._output[node] += self._output[fail[node]]
+
+        self._labels = [frozenset(label for label, _ in output) for output in self._output]
+
+    def find_all(self, text: str) -> list:
+        """Все вхождения: список (позиция_начала, метка) в порядке окончания слов"""
+        if self.ignore_case:
+            text = text.lower()
+        transitions = self._transitions
+        output = self._output
+        node = 0
+        found = []
+        for position, char in enumerate(text):
+            node = transitions[node].get(char, 0)
+            if output[node]:
+                for label, length in output[node]:
+                    found.append((position - length + 1, label))
+        return found
+
+    def matches(self, text: str) -> set:
+        """Множество меток всех найденных в тексте слов"""
+        if self.ignore_case:
+            text = text.lower()
+        transitions = self._transitions
+        labels = self._labels
+        node = 0
+        found = set()
+        for char in text:
+            node = transitions[node].get(char, 0)
+            if labels[node]:
+                found.update(labels[node])
+        return found
@@ -0,0 +1,187 @@
+"""Подготовка отрезков чертежа перед геометрическим анализом.
+
+Экспорт в PDF дробит размерные и контурные линии на множество коротких
+отрезков 'l' (часто еще и дублирует их), а штриховка и заливки добавляют
+тысячи параллельных отрезков. Все они попадали в graphic_analysis['lines']
+и в подсчет графики вокруг букв, раздувая эвристику стрелок и стоимость
+_analyze_dimension_elements / _count_nearby_graphic_elements.
+
+Этап выполняет два шага:
+
+1. Коллинеарные касающиеся или перекрывающиеся отрезки (одинаковые угол
+   и смещение) сливаются в один; дубликаты исчезают там же. Толщина не
+   учитывается: в сохраненных признаках страниц (page_features) ее нет,
+   а результат не должен зависеть от того, разобран ли PDF заново.
+2. Штриховка: серии из HATCH_MIN_LINES и более параллельных линий с
+   равномерным шагом и перекрывающимися проекциями. Наклонная штриховка
+   (шаг до HATCH_MAX_SPACING) и заливки построчной разверткой любого
+   направления (шаг до FILL_MAX_SPACING) исключаются из анализа; строки
+   таблиц и рамок (горизонталь/вертикаль с крупным шагом) не затрагиваются.
+
+Исключенные линии не удаляются, а возвращаются отдельно с пометкой причины.
+"""
+import numpy as np
+
+# Допуски слияния: угол (градусы), смещение линии и зазор вдоль нее (пункты)
+MERGE_ANGLE_TOLERANCE = 0.5
+MERGE_OFFSET_TOLERANCE = 0.25
+MERGE_GAP_TOLERANCE = 0.5
+
+# Штриховка по ГОСТ 2.306: шаг 1-10 мм; заливки экспортеров - шаг долей пункта
+HATCH_MIN_LINES = 5
+HATCH_MAX_SPACING = 30.0
+FILL_MAX_SPACING = 1.0
+HATCH_SPACING_TOLERANCE = 0.25
+HATCH_ANGLE_BUCKET = 1.0
+# Отклонение от горизонтали/вертикали, начиная с которого линия считается наклонной
+AXIS_ANGLE_TOLERANCE = 5.0
+
+
+def _segments_from_drawings(drawings: list) -> np.ndarray:
+    """Отрезки 'l' всех путей: массив (N, 4)"""
+    coords = []
+    for drawing in drawings:
+        for item in drawing.get('items', []):
+            if item[0] == 'l':
+                start, end = item[1], item[2]
+                coords.append((start[0], start[1], end[0], end[1]))
+    return np.array(coords, dtype=float).reshape(-1, 4)
+
+
+def _merge_collinear(segments: np.ndarray) -> tuple:
+    """Слияние коллинеарных касающихся отрезков.
+
+    Возвращает (отрезки (M, 4), число исходных отрезков в каждом).
+    Отрезки нулевой длины не сливаются и проходят как есть.
+    """
+    dx = segments[:, 2] - segments[:, 0]
+    dy = segments[:, 3] - segments[:, 1]
+    lengths = np.hypot(dx, dy)
+    degenerate = lengths == 0
+
+    theta = np.mod(np.arctan2(dy, dx), np.pi)
+    direction = np.stack([np.cos(theta), np.sin(theta)], axis=1)
+    offset = -segments[:, 0] * direction[:, 1] + segments[:, 1] * direction[:, 0]
+    t_start = segments[:, 0] * direction[:, 0] + segments[:, 1] * direction[:, 1]
+    t_end = segments[:, 2] * direction[:, 0] + segments[:, 3] * direction[:, 1]
+    t_low = np.minimum(t_start, t_end)
+    t_high = np.maximum(t_start, t_end)
+
+    angle_key = np.round(np.degrees(theta) / MERGE_ANGLE_TOLERANCE).astype(np.int64)
+    offset_key = np.round(offset / MERGE_OFFSET_TOLERANCE).astype(np.int64)
+    order = np.lexsort((t_low, offset_key, angle_key))
+
+    merged, counts = [], []
+    current = None
+    for index in order:
+        if degenerate[index]:
+            merged.append(tuple(segments[index]))
+            counts.append(1)
+            continue
+        key = (angle_key[index], offset_key[index])
+        if current is not None and current['key'] == key and t_low[index] <= current['t_high'] + MERGE_GAP_TOLERANCE:
+            current['count'] += 1
+            if t_high[index] > current['t_high']:
+                current['t_high'] = t_high[index]
+                current['end'] = _far_end(segments[index], t_start[index], t_end[index])
+            continue
+        if current is not None:
+            merged.append(current['start'] + current['end'])
+            counts.append(current['count'])
+        current = {
+            'key': key, 't_high': t_high[index], 'count': 1,
+            'start': _near_end(segments[index], t_start[index], t_end[index]),
+            'end': _far_end(segments[index], t_start[index], t_end[index])
+        }
+    if current is not None:
+        merged.append(current['start'] + current['end'])
+        counts.append(current['count'])
+
+    return np.array(merged, dtype=float).reshape(-1, 4), counts
+
+
+def _near_end(segment, t_start, t_end) -> tuple:
+    return (segment[0], segment[1]) if t_start <= t_end else (segment[2], segment[3])
+
+
+def _far_end(segment, t_start, t_end) -> tuple:
+    return (segment[2], segment[3]) if t_start <= t_end else (segment[0], segment[1])
+
+
+def _is_axis_parallel(angle_deg: float) -> bool:
+    return min(angle_deg % 90, 90 - angle_deg % 90) <= AXIS_ANGLE_TOLERANCE
+
+
+def _find_hatching(segments: np.ndarray) -> np.ndarray:
+    """Маска линий, входящих в серии штриховки или заливки"""
+    hatch = np.zeros(len(segments), dtype=bool)
+    if len(segments) < HATCH_MIN_LINES:
+        return hatch
+
+    dx = segments[:, 2] - segments[:, 0]
+    dy = segments[:, 3] - segments[:, 1]
+    theta = np.mod(np.arctan2(dy, dx), np.pi)
+    cos_t, sin_t = np.cos(theta), np.sin(theta)
+    offset = -segments[:, 0] * sin_t + segments[:, 1] * cos_t
+    t_a = segments[:, 0] * cos_t + segments[:, 1] * sin_t
+    t_b = segments[:, 2] * cos_t + segments[:, 3] * sin_t
+    t_low, t_high = np.minimum(t_a, t_b), np.maximum(t_a, t_b)
+    angle_deg = np.degrees(theta)
+    bucket = np.round(angle_deg / HATCH_ANGLE_BUCKET).astype(np.int64)
+
+    order = np.lexsort((offset, bucket))
+    run = []
+    spacing = None
+
+    def close_run():
+        if len(run) >= HATCH_MIN_LINES:
+            axis = _is_axis_parallel(float(angle_deg[run[0]]))
+            if spacing <= FILL_MAX_SPACING or (not axis and spacing <= HATCH_MAX_SPACING):
+                hatch[run] = True
+
+    for index in order:
+        if run:
+            previous = run[-1]
+            step = offset[index] - offset[previous]
+            overlaps = max(t_low[index], t_low[previous]) < min(t_high[index], t_high[previous])
+            same_series = (bucket[index] == bucket[previous] and overlaps and 0 < step <= HATCH_MAX_SPACING and
+                           (spacing is None or abs(step - spacing) <= HATCH_SPACING_TOLERANCE * spacing + 0.05))
+            if same_series:
+                if spacing is None:
+                    spacing = step
+                run.append(index)
+                continue
+            close_run()
+        run = [index]
+        spacing = None
+    close_run()
+    return hatch
+
+
+def preprocess_lines(drawings: list) -> dict:
+    """Слияние отрезков и отделение штриховки.
+
+    Возвращает {'lines': [...], 'excluded': [...], 'stats': {...}}; линии -
+    кортежи (start, end, число исходных отрезков), stats - число
+    исходных отрезков, линий после слияния, линий штриховки и оставшихся.
+    """
+    segments = _segments_from_drawings(drawings)
+    stats = {'raw': len(segments), 'merged': 0, 'hatch': 0, 'analysed': 0}
+    if not len(segments):
+        return {'lines': [], 'excluded': [], 'stats': stats}
+
+    merged, counts = _merge_collinear(segments)
+    hatch = _find_hatching(merged)
+
+    lines, excluded = [], []
+    for index, segment in enumerate(merged.tolist()):
+        line = ((segment[0], segment[1]), (segment[2], segment[3]), counts[index])
+        (excluded if hatch[index] else lines).append(line)
+
+    stats.update(merged=len(merged), hatch=len(excluded), analysed=len(lines))
+    return {'lines': lines, 'excluded': excluded, 'stats': stats}
+
+
+def line_count_drop(stats: dict) -> float:
+    """Доля исходных отрезков, не попавших в анализ"""
+    return 1 - stats['analysed'] / stats['raw'] if stats['raw'] else 0.0
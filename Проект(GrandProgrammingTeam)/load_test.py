@@ -0,0 +1,125 @@
+"""Нагрузочный тест многопроцессного режима: пропускная способность от числа процессов.
+
+Для каждого числа рабочих процессов запускает serve.py во временной папке данных,
+регистрирует разработчика и отправляет документы на /analyze_document (анализ и
+запись в базу) с числом параллельных клиентов, равным 2 x процессов.
+Печатает запросы в секунду, ускорение относительно одного процесса и число
+ошибок (в том числе ошибок блокировки базы).
+
+Запуск: python load_test.py --workers 1 2 4 --requests 40 [--pdf чертеж.pdf]
+"""
+import argparse
+import glob
+import http.cookiejar
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_server(base_url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=2)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Сервер {base_url} не запустился за {timeout:.0f} с')
+
+
+def _multipart(field: str, filename: str, content: bytes) -> tuple:
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def _login_opener(base_url: str):
+    """Клиент с сессией зарегистрированного разработчика"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    user = uuid.uuid4().hex[:8]
+    form = {'username': user, 'password': 'load', 'email': f'{user}@load.test',
+            'first_name': 'Нагрузка', 'last_name': user, 'role': 'developer'}
+    opener.open(base_url + '/register', urllib.parse.urlencode(form).encode())
+    opener.open(base_url + '/login', urllib.parse.urlencode({'username': user, 'password': 'load'}).encode())
+    return opener
+
+
+def run_level(workers: int, pdf_bytes: bytes, requests_count: int) -> dict:
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, NORMCONTROL_DATA_DIR=data_dir)
+        server = subprocess.Popen([sys.executable, os.path.join(PROJECT_DIR, 'serve.py'), '--host', '127.0.0.1',
+                                   '--port', str(port), '--workers', str(workers), '--no-recheck'],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_for_server(base_url)
+            clients = workers * 2
+            openers = [_login_opener(base_url) for _ in range(clients)]
+            body, content_type = _multipart('file', 'load.pdf', pdf_bytes)
+
+            def upload(index: int) -> bool:
+                request = urllib.request.Request(base_url + '/analyze_document', data=body,
+                                                 headers={'Content-Type': content_type})
+                try:
+                    with openers[index % clients].open(request, timeout=300) as response:
+                        return response.status == 200
+                except OSError:
+                    return False
+
+            # Прогрев: первый анализ в каждом процессе загружает PyMuPDF
+            with ThreadPoolExecutor(clients) as executor:
+                list(executor.map(upload, range(clients)))
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(clients) as executor:
+                results = list(executor.map(upload, range(requests_count)))
+            elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait(10)
+
+    return {'workers': workers, 'seconds': elapsed, 'ok': sum(results),
+            'errors': len(results) - sum(results), 'throughput': sum(results) / elapsed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Нагрузочный тест многопроцессного режима')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=40, help='Число загрузок на каждый уровень')
+    parser.add_argument('--pdf', default=None, help='Документ для загрузки (по умолчанию - из папки "для теста")')
+    args = parser.parse_args(argv)
+
+    # По умолчанию - самый крупный из тестовых чертежей
+    pdf_path = args.pdf or max(glob.glob(os.path.join(PROJECT_DIR, 'для теста', '*.pdf')), key=os.path.getsize)
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+
+    print(f"📄 Документ: {os.path.basename(pdf_path)}, загрузок на уровень: {args.requests}, ядер: {os.cpu_count()}")
+    base = None
+    for workers in args.workers:
+        level = run_level(workers, pdf_bytes, args.requests)
+        base = base or level['throughput']
+        speedup = level['throughput'] / base if base else 0.0
+        print(f"   процессов {workers:2}: {level['throughput']:6.2f} док/с, ускорение x{speedup:.2f} "
+              f"(эффективность {speedup / workers * 100:.0f}%), ошибок {level['errors']}")
+
+
+if __name__ == '__main__':
+    main()
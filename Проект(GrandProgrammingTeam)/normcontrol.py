@@ -1,8 +1,28 @@
-from flask import Blueprint, jsonify, request
-import os
-import uuid
-from werkzeug.utils import secure_filename
+from flask import Blueprint, Request, jsonify, request, session
+import io
 from itog import doc_analyzer, rule_engine, allowed_file
+from admission import analysis_admission, AdmissionRejected, count_pages
+
+# Эндпоинты, PDF которых анализируется из памяти: файл запроса принимается в BytesIO
+# (werkzeug иначе пишет файлы больше 500 КБ во временный файл) и на диск
+# записывается, только если документ сохраняется в хранилище
+IN_MEMORY_UPLOAD_ENDPOINTS = {'normcontrol.analyze_document', 'web.analyze_document'}
+
+class AnalysisRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Размер файла ограничен MAX_CONTENT_LENGTH приложения (16 МБ)
+        if self.endpoint in IN_MEMORY_UPLOAD_ENDPOINTS:
+            return io.BytesIO()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+def upload_buffer(file) -> memoryview:
+    """Содержимое загруженного файла без копирования (для fitz.open(stream=...)).
+
+    memoryview нужно освободить до конца запроса (with upload_buffer(file) as data).
+    """
+    if isinstance(file.stream, io.BytesIO):
+        return file.stream.getbuffer()
+    return memoryview(file.read())
 
 # Создаем Blueprint для нормоконтроля
 normcontrol_bp = Blueprint('normcontrol', __name__)
@@ -12,28 +32,29 @@ def analyze_document():
     """Эндпоинт для анализа документа"""
     if 'file' not in request.files:
         return jsonify({'error': 'Файл не загружен'}), 400
-        
+
     file = request.files['file']
     if file.filename == '' or not allowed_file(file.filename):
         return jsonify({'error': 'Требуется PDF-файл'}), 400
 
-    filename = secure_filename(file.filename)
-    file_path = os.path.join('uploads', f"{uuid.uuid4()}_{filename}")
-    file.save(file_path)
-    
-    try:
-        text_data = doc_analyzer.extract_text_from_pdf(file_path)
-        document_data = {'text_data': text_data}
-        result = rule_engine.run_all_checks(document_data)
-        
-        os.remove(file_path)
-        
-        return jsonify({
-            'success': True,
-            'result': result
-        })
-        
-    except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        return jsonify({'error': f'Ошибка анализа: {str(e)}'}), 500
\ No newline at end of file
+    # Без авторизации лимит страниц считается по адресу клиента
+    user_key = session.get('user_id') or request.remote_addr
+    # Документ только проверяется - анализ из памяти, без временного файла
+    with upload_buffer(file) as pdf_data:
+        try:
+            with analysis_admission.admit(user_key, count_pages(pdf_data)):
+                text_data = doc_analyzer.extract_text_from_pdf(pdf_data)
+                document_data = {'text_data': text_data}
+                result = rule_engine.run_all_checks(document_data)
+
+            return jsonify({
+                'success': True,
+                'result': result
+            })
+
+        except AdmissionRejected as e:
+            response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+        except Exception as e:
+            return jsonify({'error': f'Ошибка анализа: {str(e)}'}), 500
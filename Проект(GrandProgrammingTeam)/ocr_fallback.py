@@ -0,0 +1,269 @@
+"""Распознавание текста на сканированных чертежах (страницы без текстового слоя).
+
+Страница без span'ов рендерится PyMuPDF только в зонах, которые читают правила:
+основная надпись и технические требования (границы совпадают с областями в
+DocumentAnalyzer._extract_title_block_improved / _extract_tech_requirements_improved).
+Зоны распознаются Tesseract в пуле процессов, результат превращается в span'ы
+в координатах страницы и подставляется в text_dict, поэтому дальнейший анализ
+и сохранение признаков работают так же, как для векторных PDF.
+
+Результат распознавания кэшируется по хэшу содержимого страницы: повторная
+загрузка того же скана не запускает OCR.
+
+Пул OCR один на процесс, создается при первом скане и запускает процессы
+методом spawn (веб-сервер многопоточный). Процессы пулов пакетной проверки
+(batch_upload, batch_check) вызывают run_ocr_inline и распознают сами, без
+вложенного пула.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from settings import OCR_CACHE_FOLDER
+
+try:
+    import cv2
+    import numpy as np
+    import pytesseract
+    from PIL import Image
+    OCR_AVAILABLE = True
+except ImportError:
+    OCR_AVAILABLE = False
+
+# 300 dpi - оптимум Tesseract для шрифта чертежей 2.5-5 мм; выше - медленнее без выигрыша
+OCR_DPI = 300
+OCR_LANGUAGES = 'rus+eng'
+OCR_CONFIG = '--psm 6'
+OCR_MIN_CONFIDENCE = 30
+
+# Зоны в долях страницы: (x_min, y_min, x_max, y_max)
+OCR_ZONES = {
+    'title_block': (0.6, 0.7, 1.0, 1.0),
+    'tech_requirements': (0.55, 0.0, 1.0, 0.65)
+}
+
+OCR_WORKERS = min(4, os.cpu_count() or 1)
+
+_tesseract_checked = None
+_warned_unavailable = False
+_executor = None
+_executor_lock = threading.Lock()
+_inline = False
+
+
+def run_ocr_inline():
+    """Распознавание в текущем процессе, без пула (инициализатор процессов других пулов)"""
+    global _inline
+    _inline = True
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=OCR_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def _reset_executor(executor: ProcessPoolExecutor):
+    """Упавший пул (процесс убит) заменяется новым при следующем скане"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def ocr_available() -> bool:
+    """Установлены ли библиотеки OCR и исполняемый файл tesseract (проверяется один раз)"""
+    global _tesseract_checked
+    if not OCR_AVAILABLE:
+        return False
+    if _tesseract_checked is None:
+        try:
+            pytesseract.get_tesseract_version()
+            _tesseract_checked = True
+        except Exception:
+            _tesseract_checked = False
+    return _tesseract_checked
+
+
+def page_has_text(text_dict: dict) -> bool:
+    """Есть ли на странице хотя бы один непустой span"""
+    for block in text_dict.get('blocks', []):
+        if block.get('type') != 0:
+            continue
+        for line in block['lines']:
+            for span in line['spans']:
+                if span.get('text', '').strip():
+                    return True
+    return False
+
+
+def page_hash(page) -> str:
+    """Хэш содержимого страницы: потоки команд, изображения и параметры OCR"""
+    digest = hashlib.sha256()
+    digest.update(f'{OCR_DPI}|{OCR_LANGUAGES}|{OCR_CONFIG}|{sorted(OCR_ZONES.items())}'.encode())
+    digest.update(f'{page.rect}|{page.rotation}'.encode())
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(page.parent.xref_stream_raw(image[0]) or b'')
+    return digest.hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(OCR_CACHE_FOLDER, key[:2], key + '.json')
+
+
+def load_cached_spans(key: str):
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_spans(key: str, spans: list):
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(spans, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def render_zone(page, zone: tuple) -> tuple:
+    """PNG зоны страницы и параметры обратного пересчета (x0, y0, масштаб)"""
+    import fitz
+
+    rect = page.rect
+    clip = fitz.Rect(rect.x0 + rect.width * zone[0], rect.y0 + rect.height * zone[1],
+                     rect.x0 + rect.width * zone[2], rect.y0 + rect.height * zone[3])
+    pixmap = page.get_pixmap(dpi=OCR_DPI, clip=clip, colorspace=fitz.csGRAY)
+    return pixmap.tobytes('png'), (clip.x0, clip.y0, OCR_DPI / 72.0)
+
+
+def ocr_zone(png_bytes: bytes, transform: tuple) -> list:
+    """Распознавание одной зоны (выполняется в дочернем процессе).
+
+    Возвращает span'ы строк текста с bbox в координатах страницы.
+    """
+    image = cv2.imdecode(np.frombuffer(png_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    # Бинаризация Оцу убирает серый фон и шум сканера
+    _, image = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    data = pytesseract.image_to_data(Image.fromarray(image), lang=OCR_LANGUAGES, config=OCR_CONFIG,
+                                     output_type=pytesseract.Output.DICT)
+
+    x_offset, y_offset, scale = transform
+    lines = {}
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word or float(data['conf'][i]) < OCR_MIN_CONFIDENCE:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        box = (data['left'][i], data['top'][i],
+               data['left'][i] + data['width'][i], data['top'][i] + data['height'][i])
+        if key in lines:
+            words, line_box = lines[key]
+            words.append(word)
+            lines[key] = (words, (min(line_box[0], box[0]), min(line_box[1], box[1]),
+                                  max(line_box[2], box[2]), max(line_box[3], box[3])))
+        else:
+            lines[key] = ([word], box)
+
+    spans = []
+    for key in sorted(lines):
+        words, box = lines[key]
+        bbox = (x_offset + box[0] / scale, y_offset + box[1] / scale,
+                x_offset + box[2] / scale, y_offset + box[3] / scale)
+        spans.append({'text': ' '.join(words), 'bbox': bbox, 'size': bbox[3] - bbox[1], 'rot': 0})
+    return spans
+
+
+def _merge_zone_spans(zone_results: list) -> list:
+    """Объединение span'ов зон; строки из пересечения зон не дублируются"""
+    spans = []
+    seen = set()
+    for zone_spans in zone_results:
+        for span in zone_spans:
+            key = (span['text'], tuple(round(c) for c in span['bbox']))
+            if key not in seen:
+                seen.add(key)
+                spans.append(span)
+    spans.sort(key=lambda span: (span['bbox'][1], span['bbox'][0]))
+    return spans
+
+
+def apply_ocr_fallback(pages: list) -> int:
+    """Распознает страницы без текстового слоя и дополняет их text_dict/raw_text.
+
+    pages - данные страниц из DocumentAnalyzer.extract_text_from_pdf (с ключом 'page').
+    Возвращает число страниц, для которых получен текст OCR.
+    """
+    global _warned_unavailable
+
+    scanned = [page_data for page_data in pages if not page_has_text(page_data['text_dict'])]
+    if not scanned:
+        return 0
+    if not ocr_available():
+        if not _warned_unavailable:
+            print("⚠️ OCR недоступен: установите pytesseract, opencv-python, pillow и Tesseract")
+            _warned_unavailable = True
+        return 0
+
+    # Кэш проверяем до рендеринга: повторный скан не рендерится и не распознается
+    results = {}
+    tasks = []
+    for index, page_data in enumerate(scanned):
+        key = page_hash(page_data['page'])
+        cached = load_cached_spans(key)
+        if cached is not None:
+            results[index] = cached
+            print(f"📷 OCR страницы {page_data['page'].number + 1}: из кэша")
+            continue
+        for zone in OCR_ZONES.values():
+            tasks.append((index, key, render_zone(page_data['page'], zone)))
+
+    if tasks:
+        zone_results = {}
+        try:
+            if _inline:
+                for index, key, (png_bytes, transform) in tasks:
+                    zone_results.setdefault((index, key), []).append(ocr_zone(png_bytes, transform))
+            else:
+                executor = _get_executor()
+                try:
+                    futures = [(index, key, executor.submit(ocr_zone, png_bytes, transform))
+                               for index, key, (png_bytes, transform) in tasks]
+                    for index, key, future in futures:
+                        zone_results.setdefault((index, key), []).append(future.result())
+                except BrokenProcessPool:
+                    _reset_executor(executor)
+                    raise
+        except Exception as e:
+            # Сбой распознавания не должен мешать анализу остальных страниц
+            print(f"⚠️ Ошибка OCR: {e}")
+            zone_results = {}
+
+        for (index, key), zones in zone_results.items():
+            results[index] = _merge_zone_spans(zones)
+            save_cached_spans(key, results[index])
+            print(f"📷 OCR страницы {scanned[index]['page'].number + 1}: распознано строк {len(results[index])}")
+
+    recognized = 0
+    for index, spans in results.items():
+        if not spans:
+            continue
+        page_data = scanned[index]
+        page_data['text_dict'] = {'blocks': [{'type': 0, 'lines': [{'spans': spans}]}]}
+        page_data['raw_text'] = '\n'.join(span['text'] for span in spans)
+        recognized += 1
+    return recognized
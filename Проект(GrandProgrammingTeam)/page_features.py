@@ -0,0 +1,163 @@
+"""Сохранение извлеченных признаков страниц для повторной проверки без PyMuPDF.
+
+Разбор PDF (get_text("dict") и get_drawings()) - самая дорогая часть анализа.
+Для каждого сохраненного документа рядом с PDF пишется компактный файл
+<документ>.features.npz с колоночным представлением всех страниц: span'ы
+(текст, bbox, поворот, кегль), отрезки и прямоугольники графики, размеры
+страниц и исходный текст. Из него DocumentAnalyzer восстанавливает данные
+страниц и заново строит зоны, элементы и размерные элементы, поэтому
+изменения правил и порогов применяются без повторного разбора PDF.
+"""
+import os
+
+import numpy as np
+
+FEATURES_VERSION = 1
+FEATURES_SUFFIX = '.features.npz'
+
+
+def features_path_for(pdf_path: str) -> str:
+    """Путь к файлу признаков рядом с документом"""
+    return pdf_path + FEATURES_SUFFIX
+
+
+def _pack_strings(strings: list) -> tuple:
+    """Список строк -> (UTF-8 блоб, смещения), пригодные для хранения в npz"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> list:
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+def features_from_text_data(text_data: dict) -> dict:
+    """Колоночные признаки всех страниц из результата extract_text_from_pdf"""
+    page_sizes = []
+    raw_texts = []
+    duplicate_of = []
+    span_page, span_texts, span_bbox, span_rot, span_size = [], [], [], [], []
+    line_page, line_coords = [], []
+    rect_page, rect_coords = [], []
+
+    for page_index, page in enumerate(text_data.get('pages', [])):
+        page_sizes.append((page['width'], page['height']))
+        raw_texts.append(page.get('raw_text', ''))
+        duplicate_of.append(page.get('duplicate_of') or 0)
+        if page.get('duplicate_of'):
+            # Повтор листа: хватает ссылки на оригинал
+            continue
+
+        for block in page.get('text_dict', {}).get('blocks', []):
+            if block['type'] != 0:
+                continue
+            for line in block['lines']:
+                for span in line['spans']:
+                    span_page.append(page_index)
+                    span_texts.append(span.get('text', ''))
+                    span_bbox.append(tuple(span['bbox']))
+                    span_rot.append(span.get('rot', 0))
+                    span_size.append(span.get('size', 10))
+
+        # Анализ использует только отрезки ('l') и прямоугольники ('re')
+        for drawing in page.get('drawings', []):
+            for item in drawing.get('items', []):
+                if item[0] == 'l':
+                    line_page.append(page_index)
+                    line_coords.append((item[1][0], item[1][1], item[2][0], item[2][1]))
+                elif item[0] == 're':
+                    rect = item[1]
+                    rect_page.append(page_index)
+                    rect_coords.append((rect[0], rect[1], rect[2], rect[3]))
+
+    raw_blob, raw_offsets = _pack_strings(raw_texts)
+    span_blob, span_offsets = _pack_strings(span_texts)
+    return {
+        'version': np.array([FEATURES_VERSION], dtype=np.int32),
+        'page_size': np.array(page_sizes, dtype=np.float64).reshape(-1, 2),
+        'raw_text': raw_blob,
+        'raw_text_offsets': raw_offsets,
+        'page_duplicate_of': np.array(duplicate_of, dtype=np.int32),
+        'span_page': np.array(span_page, dtype=np.int32),
+        'span_text': span_blob,
+        'span_text_offsets': span_offsets,
+        'span_bbox': np.array(span_bbox, dtype=np.float64).reshape(-1, 4),
+        'span_rot': np.array(span_rot, dtype=np.float64),
+        'span_size': np.array(span_size, dtype=np.float64),
+        'line_page': np.array(line_page, dtype=np.int32),
+        'line_coords': np.array(line_coords, dtype=np.float64).reshape(-1, 4),
+        'rect_page': np.array(rect_page, dtype=np.int32),
+        'rect_coords': np.array(rect_coords, dtype=np.float64).reshape(-1, 4),
+    }
+
+
+def save_features(pdf_path: str, text_data: dict) -> str:
+    """Сохраняет признаки рядом с документом; возвращает путь к файлу признаков"""
+    path = features_path_for(pdf_path)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez_compressed(f, **features_from_text_data(text_data))
+    os.replace(temp_path, path)
+    return path
+
+
+def load_features(pdf_path: str):
+    """Признаки документа или None, если файла нет или формат устарел"""
+    path = features_path_for(pdf_path)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if int(data['version'][0]) != FEATURES_VERSION:
+            return None
+        return {key: data[key] for key in data.files}
+
+
+def remove_features(pdf_path: str):
+    path = features_path_for(pdf_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def pages_from_features(features: dict) -> list:
+    """Восстанавливает для каждой страницы text_dict, drawings и размеры"""
+    raw_texts = _unpack_strings(features['raw_text'], features['raw_text_offsets'])
+    span_texts = _unpack_strings(features['span_text'], features['span_text_offsets'])
+
+    # Та же структура, что возвращает PyMuPDF, в объеме, нужном анализатору
+    pages = []
+    for index, (width, height) in enumerate(features['page_size'].tolist()):
+        pages.append({
+            'width': width,
+            'height': height,
+            'raw_text': raw_texts[index],
+            'text_dict': {'blocks': [{'type': 0, 'lines': [{'spans': []}]}]},
+            'drawings': [{'items': []}]
+        })
+
+    for page_index, text, bbox, rot, size in zip(features['span_page'].tolist(), span_texts,
+                                                 features['span_bbox'].tolist(),
+                                                 features['span_rot'].tolist(),
+                                                 features['span_size'].tolist()):
+        spans = pages[page_index]['text_dict']['blocks'][0]['lines'][0]['spans']
+        spans.append({'text': text, 'bbox': tuple(bbox), 'rot': rot, 'size': size})
+
+    for page_index, (x0, y0, x1, y1) in zip(features['line_page'].tolist(), features['line_coords'].tolist()):
+        pages[page_index]['drawings'][0]['items'].append(('l', (x0, y0), (x1, y1)))
+
+    for page_index, rect in zip(features['rect_page'].tolist(), features['rect_coords'].tolist()):
+        pages[page_index]['drawings'][0]['items'].append(('re', tuple(rect)))
+
+    # Повторяющиеся листы ссылаются на оригинал (в файлах старого формата ссылок нет)
+    if 'page_duplicate_of' in features:
+        for index, source in enumerate(features['page_duplicate_of'].tolist()):
+            if source:
+                original = pages[source - 1]
+                pages[index].update(text_dict=original['text_dict'], drawings=original['drawings'],
+                                    duplicate_of=source)
+
+    return pages
@@ -0,0 +1,200 @@
+"""Превью страниц сохраненных документов: миниатюры и пирамиды тайлов.
+
+После загрузки документа фоновая задача рендерит PyMuPDF каждую страницу:
+миниатюру шириной THUMBNAIL_WIDTH и пирамиду тайлов TILE_SIZE x TILE_SIZE
+(уровень 0 - вся страница в одном тайле, каждый следующий - в два раза
+крупнее, последний - MAX_TILE_DPI). Результат лежит рядом с документом
+в папке <документ>.previews:
+
+    manifest.json                 - размеры страниц и уровни пирамиды
+    page-<n>/thumb.png            - миниатюра
+    page-<n>/<уровень>/<x>_<y>.png - тайлы
+
+Экран проверки загружает только миниатюры и видимые тайлы, а замечания
+с координатами (bbox) накладываются поверх них, без открытия всего PDF.
+"""
+import json
+import math
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+PREVIEWS_VERSION = 1
+PREVIEWS_SUFFIX = '.previews'
+MANIFEST_NAME = 'manifest.json'
+TILE_SIZE = 256
+THUMBNAIL_WIDTH = 320
+# 150 dpi достаточно, чтобы читать размерные числа 2.5 мм
+MAX_TILE_DPI = 150
+
+_executor = None
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def previews_dir_for(pdf_path: str) -> str:
+    """Папка превью рядом с документом"""
+    return pdf_path + PREVIEWS_SUFFIX
+
+
+def thumbnail_path(pdf_path: str, page_number: int) -> str:
+    return os.path.join(previews_dir_for(pdf_path), f'page-{page_number}', 'thumb.png')
+
+
+def tile_path(pdf_path: str, page_number: int, level: int, x: int, y: int) -> str:
+    return os.path.join(previews_dir_for(pdf_path), f'page-{page_number}', str(level), f'{x}_{y}.png')
+
+
+def pyramid_levels(width: float, height: float) -> list:
+    """Масштабы уровней пирамиды для страницы width x height (в пунктах)"""
+    max_zoom = MAX_TILE_DPI / 72.0
+    zoom = TILE_SIZE / max(width, height)
+    levels = []
+    while zoom < max_zoom:
+        levels.append(zoom)
+        zoom *= 2
+    levels.append(max_zoom)
+    return levels
+
+
+def load_manifest(pdf_path: str):
+    """Описание готовых превью или None, если их еще нет (или они старого формата)"""
+    path = os.path.join(previews_dir_for(pdf_path), MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != PREVIEWS_VERSION:
+        return None
+    return manifest
+
+
+def _render_page(page, page_dir: str) -> dict:
+    import fitz
+
+    rect = page.rect
+    # Дисплей-лист разбирает страницу один раз для всех тайлов и уровней
+    display_list = page.get_displaylist()
+
+    zoom = THUMBNAIL_WIDTH / rect.width
+    display_list.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False).save(os.path.join(page_dir, 'thumb.png'))
+
+    levels = []
+    for level, zoom in enumerate(pyramid_levels(rect.width, rect.height)):
+        level_dir = os.path.join(page_dir, str(level))
+        os.makedirs(level_dir)
+        matrix = fitz.Matrix(zoom, zoom)
+        tile_span = TILE_SIZE / zoom  # сторона тайла в пунктах страницы
+        # Число тайлов - по целым пикселям уровня: погрешность масштаба не дает пустых тайлов
+        width_px, height_px = round(rect.width * zoom), round(rect.height * zoom)
+        columns = math.ceil(width_px / TILE_SIZE)
+        rows = math.ceil(height_px / TILE_SIZE)
+        for y in range(rows):
+            for x in range(columns):
+                clip = fitz.Rect(rect.x0 + x * tile_span, rect.y0 + y * tile_span,
+                                 min(rect.x1, rect.x0 + (x + 1) * tile_span),
+                                 min(rect.y1, rect.y0 + (y + 1) * tile_span))
+                pixmap = display_list.get_pixmap(matrix=matrix, clip=clip, alpha=False)
+                pixmap.save(os.path.join(level_dir, f'{x}_{y}.png'))
+        levels.append({'zoom': zoom, 'columns': columns, 'rows': rows, 'width': width_px, 'height': height_px})
+
+    return {'number': page.number + 1, 'width': rect.width, 'height': rect.height, 'levels': levels}
+
+
+def render_previews(pdf_path: str) -> dict:
+    """Рендер миниатюр и тайлов всех страниц документа; возвращает manifest.
+
+    Превью собираются во временной папке и переименовываются целиком, поэтому
+    читатели видят либо готовый комплект, либо ничего.
+    """
+    import fitz
+
+    target_dir = previews_dir_for(pdf_path)
+    temp_dir = f'{target_dir}.{os.getpid()}.{threading.get_ident()}.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    try:
+        pages = []
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                page_dir = os.path.join(temp_dir, f'page-{page.number + 1}')
+                os.makedirs(page_dir)
+                pages.append(_render_page(page, page_dir))
+        manifest = {'version': PREVIEWS_VERSION, 'tile_size': TILE_SIZE, 'pages': pages}
+        with open(os.path.join(temp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+        shutil.rmtree(target_dir, ignore_errors=True)
+        try:
+            os.rename(temp_dir, target_dir)
+        except OSError:
+            # Тот же документ успел отрендерить другой процесс - его результат равноценен
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return manifest
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+
+def remove_previews(pdf_path: str):
+    """Удаление превью вместе с документом"""
+    shutil.rmtree(previews_dir_for(pdf_path), ignore_errors=True)
+
+
+def _render_job(pdf_path: str):
+    try:
+        if os.path.exists(pdf_path):
+            manifest = render_previews(pdf_path)
+            print(f"🖼️ Превью {os.path.basename(pdf_path)}: страниц {len(manifest['pages'])}")
+    except Exception as e:
+        # Превью - только ускорение просмотра: документ остается доступен через /view_document
+        print(f"⚠️ Не удалось построить превью {pdf_path}: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard(pdf_path)
+
+
+def schedule_previews(pdf_path: str) -> bool:
+    """Постановка рендера превью в фоновую очередь (одна задача на документ).
+
+    Возвращает False, если превью этого документа уже строятся.
+    """
+    global _executor
+    with _pending_lock:
+        if pdf_path in _pending:
+            return False
+        _pending.add(pdf_path)
+        if _executor is None:
+            # Один поток: рендер не отнимает у запросов больше одного ядра
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='previews')
+    _executor.submit(_render_job, pdf_path)
+    return True
+
+
+def violation_overlays(violations: list, manifest: dict) -> dict:
+    """Замечания по страницам для наложения на превью.
+
+    Координаты bbox переводятся в доли ширины и высоты страницы, поэтому
+    одна и та же рамка подходит для миниатюры и любого уровня тайлов.
+    Замечания без bbox попадают в список страницы без рамки.
+    """
+    page_sizes = {page['number']: (page['width'], page['height']) for page in manifest['pages']}
+    overlays = {number: [] for number in page_sizes}
+    for violation in violations:
+        page_number = violation.get('page')
+        if page_number not in page_sizes:
+            continue
+        width, height = page_sizes[page_number]
+        overlay = {
+            'rule_id': violation.get('rule_id'),
+            'severity': violation.get('severity'),
+            'violation': violation.get('violation'),
+            'rect': None
+        }
+        bbox = violation.get('bbox')
+        if bbox and len(bbox) == 4:
+            overlay['rect'] = [bbox[0] / width, bbox[1] / height, bbox[2] / width, bbox[3] / height]
+        overlays[page_number].append(overlay)
+    return overlays
@@ -0,0 +1,176 @@
+"""Повторная проверка сохраненных документов по текущим правилам.
+
+Для каждого документа из таблицы documents загружаются сохраненные признаки
+страниц (page_features) и правила прогоняются без разбора PDF. Если признаков
+нет или их формат устарел, PDF разбирается один раз и признаки записываются
+рядом с ним. Обновляются auto_check_result и rules_version (версия набора
+правил Config.RULES_VERSION), текст документа в полнотекстовом индексе,
+обозначения из основной надписи (так индексируются и документы, загруженные
+до появления индексов) и счетчики замечаний по правилам; статусы
+документов и история не меняются.
+
+Пример: python recheck_documents.py --db users.db --stale --chunk 50 --pause 0.5
+"""
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+
+from db import connect
+from designation_codes import document_designations, index_designations
+from document_search import index_document, search_fields_from_text_data
+from itog import Config, DESIGNATIONS, doc_analyzer, rule_engine
+from page_features import load_features, save_features
+from settings import DATABASE_PATH, resolve_data_path
+from workload_stats import record_document_violations
+
+
+def recheck_document(pdf_path: str) -> tuple:
+    """(результат проверки, источник данных: 'features' или 'pdf', текст для поиска, обозначения)"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        features = load_features(pdf_path)
+        if features is not None:
+            text_data = doc_analyzer.analyze_features(features)
+            source = 'features'
+        else:
+            text_data = doc_analyzer.extract_text_from_pdf(pdf_path)
+            source = 'pdf'
+            if not text_data.get('error'):
+                save_features(pdf_path, text_data)
+
+        if text_data.get('error'):
+            raise Exception(text_data['error'])
+        result = rule_engine.run_all_checks({'text_data': text_data})
+    return result, source, search_fields_from_text_data(text_data), document_designations(DESIGNATIONS, text_data)
+
+
+def _select_documents(cursor, only_stale: bool) -> list:
+    if only_stale:
+        cursor.execute('''
+            SELECT id, filename, original_filename FROM documents
+            WHERE rules_version IS NULL OR rules_version != ?
+            ORDER BY id
+        ''', (Config.RULES_VERSION,))
+    else:
+        cursor.execute('SELECT id, filename, original_filename FROM documents ORDER BY id')
+    return cursor.fetchall()
+
+
+def _write_results(conn, updates: list):
+    """Короткая транзакция на порцию результатов.
+
+    Условие по filename не дает затереть результат (и записи индексов)
+    документа, который пользователь успел заменить новой версией во время
+    перепроверки.
+    """
+    cursor = conn.cursor()
+    for (result, violations, rules_version, document_id, stored_path, original_filename,
+         search_fields, designations) in updates:
+        cursor.execute('''
+            UPDATE documents SET auto_check_result = ?, rules_version = ?
+            WHERE id = ? AND filename = ?
+        ''', (result, rules_version, document_id, stored_path))
+        if cursor.rowcount:
+            index_document(cursor, document_id, original_filename, search_fields)
+            index_designations(cursor, document_id, designations)
+            record_document_violations(cursor, document_id, violations)
+    conn.commit()
+
+
+def recheck_all(db_path: str = DATABASE_PATH, chunk_size: int = 100, only_stale: bool = False,
+                pause: float = 0.0, stop_event: threading.Event = None) -> dict:
+    """Перепроверка документов; изменения фиксируются порциями по chunk_size.
+
+    only_stale - только документы, проверенные другой версией правил;
+    pause - пауза между порциями (секунды), чтобы не мешать работе пользователей.
+    """
+    # Соединение с busy timeout и повторами: при занятой базе ждем, а не падаем
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    documents = _select_documents(cursor, only_stale)
+
+    stats = {'total': len(documents), 'features': 0, 'pdf': 0, 'missing': 0, 'errors': 0}
+    print(f"📁 Документов к перепроверке: {len(documents)} (версия правил {Config.RULES_VERSION})", file=sys.stderr)
+
+    started = time.perf_counter()
+    pending_updates = []
+    try:
+        for document_id, stored_path, original_filename in documents:
+            pdf_path = resolve_data_path(stored_path)
+            if stop_event is not None and stop_event.is_set():
+                break
+            if not os.path.exists(pdf_path):
+                stats['missing'] += 1
+                print(f"⚠️ Файл документа {document_id} не найден: {pdf_path}", file=sys.stderr)
+                continue
+            try:
+                result, source, search_fields, designations = recheck_document(pdf_path)
+            except Exception as e:
+                stats['errors'] += 1
+                print(f"❌ Ошибка перепроверки документа {document_id}: {e}", file=sys.stderr)
+                continue
+
+            stats[source] += 1
+            pending_updates.append((str(result), result['violations'], Config.RULES_VERSION, document_id, stored_path,
+                                    original_filename, search_fields, designations))
+            if len(pending_updates) >= chunk_size:
+                _write_results(conn, pending_updates)
+                pending_updates = []
+                if pause > 0:
+                    time.sleep(pause)
+
+        if pending_updates:
+            _write_results(conn, pending_updates)
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    checked = stats['features'] + stats['pdf']
+    throughput = checked / elapsed if elapsed > 0 else 0.0
+    print(f"\n📊 ИТОГИ ПЕРЕПРОВЕРКИ", file=sys.stderr)
+    print(f"   По сохраненным признакам: {stats['features']}", file=sys.stderr)
+    print(f"   С разбором PDF: {stats['pdf']}", file=sys.stderr)
+    print(f"   Файл не найден: {stats['missing']}, ошибки: {stats['errors']}", file=sys.stderr)
+    print(f"   Перепроверено {checked} за {elapsed:.1f} с ({throughput:.2f} док/с)", file=sys.stderr)
+    return stats
+
+
+def start_background_recheck(db_path: str = DATABASE_PATH, chunk_size: int = 20, pause: float = 1.0):
+    """Фоновая перепроверка устаревших результатов в потоке веб-приложения.
+
+    Возвращает (поток, событие остановки).
+    """
+    stop_event = threading.Event()
+
+    def run():
+        try:
+            recheck_all(db_path, chunk_size, only_stale=True, pause=pause, stop_event=stop_event)
+        except Exception as e:
+            print(f"❌ Ошибка фоновой перепроверки: {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=run, name='background-recheck', daemon=True)
+    thread.start()
+    return thread, stop_event
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Перепроверка всех документов по текущим правилам')
+    parser.add_argument('--db', default=DATABASE_PATH, help=f'Путь к базе данных (по умолчанию {DATABASE_PATH})')
+    parser.add_argument('--chunk', type=int, default=100,
+                        help='Число документов в одной транзакции обновления')
+    parser.add_argument('--stale', action='store_true',
+                        help='Только документы, проверенные другой версией правил')
+    parser.add_argument('--pause', type=float, default=0.0,
+                        help='Пауза между порциями в секундах (щадящий режим для рабочей базы)')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f'База данных не найдена: {args.db}')
+
+    recheck_all(args.db, args.chunk, only_stale=args.stale, pause=args.pause)
+
+
+if __name__ == '__main__':
+    main()
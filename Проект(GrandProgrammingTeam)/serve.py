@@ -0,0 +1,132 @@
+"""Многопроцессный режим веб-сервиса (pre-fork, без общих данных между процессами).
+
+Главный процесс открывает слушающий сокет и запускает N рабочих процессов;
+каждый из них сам вызывает create_app() (база, папки, анализатор - свои в каждом
+процессе) и обслуживает запросы на общем сокете. Главный процесс перезапускает
+упавшие рабочие процессы; фоновая перепроверка устаревших результатов
+выполняется одним отдельным процессом.
+
+Пример: python serve.py --workers 4 --port 8000
+Под gunicorn то же самое: gunicorn -w 4 -b 0.0.0.0:8000 "app:create_app()"
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def _worker(fd: int, host: str, port: int, threads: bool):
+    """Рабочий процесс: собственное приложение и соединения с базой"""
+    import contextlib
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    def stop(signum, frame):
+        # Процессы пулов (пакетная загрузка, OCR) сами не замечают завершения
+        # родителя - завершаем их вместе с рабочим процессом
+        for child in multiprocessing.active_children():
+            child.terminate()
+        os._exit(0)
+
+    # Свои обработчики: процессы, перезапущенные после установки обработчиков
+    # в главном процессе, иначе унаследовали бы их и не завершались по SIGTERM
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    app = create_app({'EVENTS_RELAY': True})
+    server = make_server(host, port, app, threaded=threads, fd=fd)
+    # Подробная диагностика анализатора в многопроцессном режиме не печатается
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        server.serve_forever()
+
+
+def _recheck_worker():
+    """Фоновая перепроверка в отдельном процессе: главный процесс остается однопоточным,
+    чтобы перезапуск рабочих процессов через fork был безопасным"""
+    import settings
+    from recheck_documents import recheck_all
+
+    recheck_all(settings.DATABASE_PATH, chunk_size=20, only_stale=True, pause=1.0)
+
+
+def run(host: str = '0.0.0.0', port: int = 8000, workers: int = None, threads: bool = True,
+        background_recheck: bool = True):
+    if not hasattr(os, 'fork'):
+        sys.exit('Многопроцессный режим требует ОС с fork(); в Windows запускайте python app.py')
+
+    workers = workers or os.cpu_count() or 1
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+
+    context = multiprocessing.get_context('fork')
+    # Процессы не daemon: у daemon-процесса не может быть дочерних, а рабочие процессы
+    # запускают пулы (пакетная загрузка, OCR). Останавливаются они в finally ниже
+    processes = []
+    recheck_process = None
+
+    def start_worker():
+        process = context.Process(target=_worker, args=(listener.fileno(), host, port, threads), daemon=False)
+        process.start()
+        return process
+
+    for _ in range(workers):
+        processes.append(start_worker())
+
+    print(f"🎯 NormControl: {workers} рабочих процессов на http://{host}:{port}", file=sys.stderr)
+
+    if background_recheck:
+        recheck_process = context.Process(target=_recheck_worker, daemon=False)
+        recheck_process.start()
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    try:
+        while not stopping:
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    print(f"⚠️ Рабочий процесс {process.pid} завершился (код {process.exitcode}), перезапуск",
+                          file=sys.stderr)
+                    processes[index] = start_worker()
+            time.sleep(0.5)
+    finally:
+        children = processes + ([recheck_process] if recheck_process else [])
+        for process in children:
+            process.terminate()
+        for process in children:
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        listener.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Многопроцессный запуск веб-сервиса нормоконтроля')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Число рабочих процессов (по умолчанию - число ядер)')
+    parser.add_argument('--no-threads', action='store_true',
+                        help='Один запрос за раз в каждом процессе')
+    parser.add_argument('--no-recheck', action='store_true',
+                        help='Не запускать фоновую перепроверку устаревших результатов')
+    args = parser.parse_args(argv)
+
+    run(args.host, args.port, args.workers, not args.no_threads, not args.no_recheck)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Пути к данным приложения.
+
+Все пути абсолютные и не зависят от текущей папки процесса, поэтому веб-сервер,
+его рабочие процессы и утилиты (batch_check, recheck_documents) работают с одними
+и теми же файлами. Переопределяются переменными окружения:
+
+    NORMCONTROL_DATA_DIR   - корневая папка данных (по умолчанию папка проекта)
+    NORMCONTROL_DATABASE   - файл базы SQLite (по умолчанию <данные>/users.db)
+    NORMCONTROL_DB_TIMEOUT - ожидание блокировки базы, секунды (по умолчанию 30)
+    NORMCONTROL_SENDFILE   - файлы документов отдает фронтальный прокси:
+                             x-accel (nginx) или x-sendfile (Apache, lighttpd)
+    NORMCONTROL_ACCEL_PREFIX - internal-location nginx, указывающий на папку storage
+                             (по умолчанию /protected-storage/)
+"""
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.abspath(os.environ.get('NORMCONTROL_DATA_DIR', BASE_DIR))
+
+DATABASE_PATH = os.path.abspath(os.environ.get('NORMCONTROL_DATABASE', os.path.join(DATA_DIR, 'users.db')))
+UPLOAD_FOLDER = os.path.join(DATA_DIR, 'uploads')
+STORAGE_FOLDER = os.path.join(DATA_DIR, 'storage')
+OCR_CACHE_FOLDER = os.path.join(DATA_DIR, 'ocr_cache')
+
+DB_BUSY_TIMEOUT = float(os.environ.get('NORMCONTROL_DB_TIMEOUT', 30))
+
+SENDFILE_MODE = os.environ.get('NORMCONTROL_SENDFILE', '').lower()
+ACCEL_REDIRECT_PREFIX = os.environ.get('NORMCONTROL_ACCEL_PREFIX', '/protected-storage/')
+
+
+def resolve_data_path(path: str) -> str:
+    """Абсолютный путь к файлу; относительные пути старых записей - от папки данных"""
+    if os.path.isabs(path):
+        return path
+    return os.path.join(DATA_DIR, path)
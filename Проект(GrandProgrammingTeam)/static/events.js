@@ -0,0 +1,91 @@
+// Обновление страниц по событиям сервера (/events) вместо перезагрузки списков.
+// События: document_status (смена статуса), document_assigned (документ передан
+// нормоконтролёру), analysis_completed (завершена автоматическая проверка).
+
+const documentEventHandlers = [];
+
+// Подписка страницы на события документов: handler(type, data)
+function onDocumentEvent(handler) {
+    documentEventHandlers.push(handler);
+}
+
+// Какие статусы попадают в списки пользователя (у нормоконтролёра - только очередь проверки)
+function isStatusVisible(status) {
+    const visible = document.body.dataset.visibleStatuses || '*';
+    return status !== null && status !== undefined &&
+        (visible === '*' || visible.split('|').includes(status));
+}
+
+// Счетчики статистики: элементы с data-stat-statuses="*" или "Статус1|Статус2"
+function applyStatusDelta(previousStatus, status) {
+    document.querySelectorAll('[data-stat-statuses]').forEach(element => {
+        const statuses = element.dataset.statStatuses;
+        const counts = s => isStatusVisible(s) && (statuses === '*' || statuses.split('|').includes(s));
+        let value = parseInt(element.textContent, 10) || 0;
+        if (counts(previousStatus)) value -= 1;
+        if (counts(status)) value += 1;
+        element.textContent = value;
+    });
+}
+
+function statusBadgeClass(status) {
+    return 'status-badge status-' + status.replace(/ /g, '-').toLowerCase();
+}
+
+function showEventToast(message) {
+    let container = document.getElementById('eventToasts');
+    if (!container) {
+        container = document.createElement('div');
+        container.id = 'eventToasts';
+        container.className = 'event-toasts';
+        document.body.appendChild(container);
+    }
+    const toast = document.createElement('div');
+    toast.className = 'event-toast';
+    toast.textContent = message;
+    container.appendChild(toast);
+    setTimeout(() => toast.remove(), 6000);
+}
+
+function describeDocumentEvent(type, data) {
+    if (type === 'document_status') {
+        return `«${data.filename}»: ${data.previous_status || '—'} → ${data.status}`;
+    }
+    if (type === 'document_assigned') {
+        return `«${data.filename}» передан на нормоконтроль`;
+    }
+    return `Проверка «${data.filename}» завершена: ${data.status}, замечаний: ${data.total_violations}`;
+}
+
+function handleDocumentEvent(type, data) {
+    // document_assigned сопровождает уже учтенное изменение статуса - счетчики не трогаем
+    if (type !== 'document_assigned') {
+        applyStatusDelta(data.previous_status, data.status);
+    }
+    if (isStatusVisible(data.status) || isStatusVisible(data.previous_status)) {
+        showEventToast(describeDocumentEvent(type, data));
+    }
+    documentEventHandlers.forEach(handler => handler(type, data));
+}
+
+// После собственного действия страница обновится по событию; без поддержки
+// EventSource в браузере - как раньше, перезагрузкой
+function afterDocumentChange() {
+    if (!window.EventSource) {
+        location.reload();
+    }
+}
+
+function connectDocumentEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    const source = new EventSource('/events');
+    ['document_status', 'document_assigned', 'analysis_completed'].forEach(type => {
+        source.addEventListener(type, event => handleDocumentEvent(type, JSON.parse(event.data)));
+    });
+    // Клиент отстал и часть событий потеряна - один раз перечитываем страницу
+    source.addEventListener('resync', () => location.reload());
+}
+
+document.addEventListener('DOMContentLoaded', connectDocumentEvents);
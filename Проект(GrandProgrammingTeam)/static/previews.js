@@ -0,0 +1,162 @@
+// Просмотр страниц документа по миниатюрам и тайлам (/document_preview) с наложением замечаний.
+// Загружаются только миниатюры и тайлы, попавшие в видимую область, а не весь PDF.
+
+const previewState = {documentId: null, data: null, page: null, level: 0};
+
+function previewUrl(path) {
+    return `/document_preview/${previewState.documentId}/${path}?v=${previewState.data.version}`;
+}
+
+async function showPreview(documentId, attempt = 0) {
+    previewState.documentId = documentId;
+    const modal = document.getElementById('previewModal');
+    const thumbnails = document.getElementById('previewThumbnails');
+    modal.style.display = 'block';
+    if (attempt === 0) {
+        thumbnails.innerHTML = '<p>Загрузка превью...</p>';
+        document.getElementById('previewViewer').innerHTML = '';
+        document.getElementById('previewViolations').innerHTML = '';
+    }
+
+    try {
+        const response = await fetch('/document_preview/' + documentId);
+        const result = await response.json();
+        if (response.status === 202) {
+            // Превью строятся в фоне - повторяем запрос, пока окно открыто
+            thumbnails.innerHTML = '<p>⏳ Превью страниц готовятся...</p>';
+            if (attempt < 30 && modal.style.display === 'block' && previewState.documentId === documentId) {
+                setTimeout(() => showPreview(documentId, attempt + 1), 2000);
+            }
+            return;
+        }
+        if (!result.success) {
+            thumbnails.innerHTML = `<p>Ошибка: ${result.error}</p>`;
+            return;
+        }
+        previewState.data = result;
+        document.getElementById('previewTitle').textContent = 'Страницы документа ' + result.filename;
+        renderPreviewThumbnails();
+        openPreviewPage(result.pages[0].number);
+    } catch (error) {
+        thumbnails.innerHTML = `<p>Ошибка соединения: ${error.message}</p>`;
+    }
+}
+
+// Рамки замечаний поверх картинки: координаты - доли ширины и высоты страницы
+function addOverlayFrames(container, overlays) {
+    overlays.forEach(overlay => {
+        if (!overlay.rect) return;
+        const frame = document.createElement('div');
+        frame.className = `preview-overlay ${overlay.severity}`;
+        frame.title = `${overlay.rule_id}: ${overlay.violation}`;
+        frame.style.left = (overlay.rect[0] * 100) + '%';
+        frame.style.top = (overlay.rect[1] * 100) + '%';
+        frame.style.width = ((overlay.rect[2] - overlay.rect[0]) * 100) + '%';
+        frame.style.height = ((overlay.rect[3] - overlay.rect[1]) * 100) + '%';
+        container.appendChild(frame);
+    });
+}
+
+function renderPreviewThumbnails() {
+    const thumbnails = document.getElementById('previewThumbnails');
+    thumbnails.innerHTML = '';
+    previewState.data.pages.forEach(page => {
+        const item = document.createElement('div');
+        item.className = 'preview-thumbnail';
+        item.dataset.page = page.number;
+        item.onclick = () => openPreviewPage(page.number);
+        item.innerHTML = `<div class="preview-thumbnail-image">
+                <img src="${previewUrl(page.number + '/thumb.png')}" alt="Страница ${page.number}">
+            </div>
+            <span class="preview-page-label">Стр. ${page.number}${page.overlays.length ? ' · замечаний: ' + page.overlays.length : ''}</span>`;
+        addOverlayFrames(item.querySelector('.preview-thumbnail-image'), page.overlays);
+        thumbnails.appendChild(item);
+    });
+}
+
+function openPreviewPage(pageNumber) {
+    const page = previewState.data.pages.find(p => p.number === pageNumber);
+    previewState.page = page;
+    document.querySelectorAll('.preview-thumbnail').forEach(item => {
+        item.classList.toggle('active', Number(item.dataset.page) === pageNumber);
+    });
+
+    // Начальный уровень - самый крупный, который помещается в окно по ширине
+    const viewer = document.getElementById('previewViewer');
+    const fitting = page.levels.filter(level => level.width <= viewer.clientWidth);
+    previewState.level = fitting.length ? fitting.length - 1 : 0;
+    renderPreviewLevel();
+
+    const list = document.getElementById('previewViolations');
+    list.innerHTML = page.overlays.length ? '' : '<p>На этой странице замечаний нет</p>';
+    page.overlays.forEach(overlay => {
+        const item = document.createElement('div');
+        item.className = `violation-item ${overlay.severity}`;
+        item.innerHTML = `<strong>${overlay.rule_id}</strong> ${overlay.violation}`;
+        if (overlay.rect) {
+            item.style.cursor = 'pointer';
+            item.title = 'Показать на странице';
+            item.onclick = () => zoomToOverlay(overlay);
+        }
+        list.appendChild(item);
+    });
+}
+
+function renderPreviewLevel() {
+    const page = previewState.page;
+    const level = page.levels[previewState.level];
+    const tileSize = previewState.data.tile_size;
+    const viewer = document.getElementById('previewViewer');
+
+    const canvas = document.createElement('div');
+    canvas.className = 'preview-canvas';
+    canvas.style.width = level.width + 'px';
+    canvas.style.height = level.height + 'px';
+    for (let y = 0; y < level.rows; y++) {
+        for (let x = 0; x < level.columns; x++) {
+            const tile = document.createElement('img');
+            // Браузер загружает только тайлы, попавшие в видимую область окна
+            tile.loading = 'lazy';
+            tile.className = 'preview-tile';
+            tile.style.left = (x * tileSize) + 'px';
+            tile.style.top = (y * tileSize) + 'px';
+            tile.src = previewUrl(`${page.number}/${previewState.level}/${x}_${y}.png`);
+            canvas.appendChild(tile);
+        }
+    }
+    addOverlayFrames(canvas, page.overlays);
+    viewer.innerHTML = '';
+    viewer.appendChild(canvas);
+    document.getElementById('previewZoomLabel').textContent =
+        Math.round(level.zoom * 72) + ' dpi';
+}
+
+// Смена уровня пирамиды с сохранением точки в центре окна
+function zoomPreview(step) {
+    const levels = previewState.page.levels;
+    const next = Math.min(levels.length - 1, Math.max(0, previewState.level + step));
+    if (next === previewState.level) return;
+    const viewer = document.getElementById('previewViewer');
+    const old = levels[previewState.level];
+    const centerX = (viewer.scrollLeft + viewer.clientWidth / 2) / old.width;
+    const centerY = (viewer.scrollTop + viewer.clientHeight / 2) / old.height;
+    previewState.level = next;
+    renderPreviewLevel();
+    viewer.scrollLeft = centerX * levels[next].width - viewer.clientWidth / 2;
+    viewer.scrollTop = centerY * levels[next].height - viewer.clientHeight / 2;
+}
+
+function zoomToOverlay(overlay) {
+    const levels = previewState.page.levels;
+    previewState.level = levels.length - 1;
+    renderPreviewLevel();
+    const level = levels[previewState.level];
+    const viewer = document.getElementById('previewViewer');
+    viewer.scrollLeft = (overlay.rect[0] + overlay.rect[2]) / 2 * level.width - viewer.clientWidth / 2;
+    viewer.scrollTop = (overlay.rect[1] + overlay.rect[3]) / 2 * level.height - viewer.clientHeight / 2;
+}
+
+function closePreviewModal() {
+    document.getElementById('previewModal').style.display = 'none';
+    previewState.documentId = null;
+}
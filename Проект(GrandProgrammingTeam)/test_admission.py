@@ -0,0 +1,70 @@
+"""Порядок очереди допуска к анализу (admission.py): python -m unittest test_admission"""
+import threading
+import time
+import unittest
+from unittest import mock
+
+from admission import AdmissionController
+
+
+class AdmissionQueueOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('admission.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.controller = AdmissionController(max_concurrent=1, aging=1.0)
+        self.order = []
+        self.threads = []
+
+    def _wait_for_queue(self, length: int):
+        deadline = time.time() + 5
+        while len(self.controller._waiting) < length:
+            self.assertLess(time.time(), deadline, 'запрос не встал в очередь')
+            time.sleep(0.01)
+
+    def _enqueue(self, user_key: str, pages: int):
+        def request():
+            with self.controller.admit(user_key, pages):
+                self.order.append(user_key)
+
+        thread = threading.Thread(target=request)
+        thread.start()
+        self.threads.append(thread)
+        self._wait_for_queue(len(self.threads))
+
+    def _release(self, holder):
+        holder.__exit__(None, None, None)
+        for thread in self.threads:
+            thread.join(5)
+        return self.order
+
+    def _occupy(self):
+        holder = self.controller.admit('holder', 1)
+        holder.__enter__()
+        return holder
+
+    def test_smaller_document_first(self):
+        holder = self._occupy()
+        self._enqueue('big', 25)
+        self._enqueue('small', 20)
+        self.assertEqual(self._release(holder), ['small', 'big'])
+
+    def test_waiting_lowers_cost(self):
+        # Через 10 с ожидания документ из 20 страниц стоит 10 - раньше нового из 25
+        holder = self._occupy()
+        self._enqueue('old', 20)
+        self.now += 10
+        self._enqueue('new', 25)
+        self.assertEqual(self._release(holder), ['old', 'new'])
+
+    def test_long_wait_beats_smaller_document(self):
+        holder = self._occupy()
+        self._enqueue('old', 40)
+        self.now += 30
+        self._enqueue('new', 20)
+        self.assertEqual(self._release(holder), ['old', 'new'])
+
+
+if __name__ == '__main__':
+    unittest.main()
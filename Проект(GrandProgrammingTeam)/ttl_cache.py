@@ -0,0 +1,47 @@
+"""Небольшой потокобезопасный LRU-кэш с ограничением времени жизни записей.
+
+Используется для ответов, которые часто запрашиваются страницами
+(история статусов, замечания документа). Записи явно сбрасываются при
+изменении документа в этом процессе; время жизни ограничивает устаревание,
+если документ изменил другой процесс (serve.py, фоновая перепроверка).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 256, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Значение по ключу или None, если записи нет или она устарела"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
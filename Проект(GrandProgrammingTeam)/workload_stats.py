@@ -0,0 +1,282 @@
+"""Материализованная статистика нагрузки нормоконтролёров и частоты замечаний.
+
+Панель статистики не сканирует documents и document_status_history: агрегаты
+хранятся в отдельных таблицах и обновляются в тех же транзакциях, что и
+сами документы.
+
+- document_status_counts - число документов по (статус, нормоконтролёр);
+  ведется триггерами на documents, поэтому учитывает любые изменения статуса
+  и назначения (в том числе из assign_controller.py и fix_assignments.py).
+  Длина очереди нормоконтролёра - сумма по статусам очереди.
+- controller_review_stats и controller_review_histogram - число проверок,
+  суммарное время и гистограмма времени проверки (часы) по нормоконтролёрам;
+  пишутся в update_document_status. Процентили считаются по гистограмме в
+  пределах наименьшего и наибольшего записанного времени нормоконтролёра.
+- document_rule_counts и rule_violation_stats - замечания документа по
+  правилам и их сумма по всем документам; при замене документа или
+  перепроверке старые счетчики документа вычитаются.
+
+Нормоконтролёр 0 - документ никому не назначен.
+"""
+import ast
+from collections import Counter
+
+STATUS_COUNTS_TABLE = 'document_status_counts'
+REVIEW_STATS_TABLE = 'controller_review_stats'
+REVIEW_HISTOGRAM_TABLE = 'controller_review_histogram'
+DOCUMENT_RULES_TABLE = 'document_rule_counts'
+RULE_STATS_TABLE = 'rule_violation_stats'
+UNASSIGNED_CONTROLLER = 0
+
+# Верхние границы корзин гистограммы времени проверки (часы); последняя корзина - больше недели
+REVIEW_TIME_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 24, 48, 72, 120, 168)
+REVIEW_PERCENTILES = (50, 90)
+
+
+def review_time_bucket(hours: float) -> int:
+    """Номер корзины гистограммы для времени проверки"""
+    for bucket, upper in enumerate(REVIEW_TIME_BUCKETS):
+        if hours <= upper:
+            return bucket
+    return len(REVIEW_TIME_BUCKETS)
+
+
+def histogram_percentile(histogram: dict, percentile: float, min_hours: float = None, max_hours: float = None):
+    """Процентиль по гистограмме {корзина: число}: линейная интерполяция внутри корзины.
+
+    min_hours и max_hours - наименьшее и наибольшее записанное время: корзина
+    сужается до них, иначе для проверок за минуты первая корзина (0-0,25 ч)
+    дала бы процентили в десятки раз больше любого реального значения.
+    Для последней (открытой) корзины без max_hours возвращается ее нижняя граница.
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = total * percentile / 100
+    seen = 0
+    for bucket in range(len(REVIEW_TIME_BUCKETS) + 1):
+        count = histogram.get(bucket, 0)
+        if count and seen + count >= target:
+            lower = REVIEW_TIME_BUCKETS[bucket - 1] if bucket else 0.0
+            upper = REVIEW_TIME_BUCKETS[bucket] if bucket < len(REVIEW_TIME_BUCKETS) else None
+            if min_hours is not None:
+                lower = max(lower, min_hours)
+            if max_hours is not None:
+                upper = max_hours if upper is None else min(upper, max_hours)
+            if upper is None:
+                return lower
+            upper = max(upper, lower)
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return None
+
+
+def _table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def create_stats_tables(cursor) -> bool:
+    """Таблицы и триггеры статистики; True, если таблицы созданы только что (их надо заполнить)"""
+    created = not _table_exists(cursor, STATUS_COUNTS_TABLE)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {STATUS_COUNTS_TABLE} (
+            status TEXT NOT NULL,
+            controller_id INTEGER NOT NULL,
+            documents INTEGER NOT NULL,
+            PRIMARY KEY (status, controller_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {REVIEW_STATS_TABLE} (
+            controller_id INTEGER PRIMARY KEY,
+            reviews INTEGER NOT NULL,
+            total_hours REAL NOT NULL,
+            min_hours REAL,
+            max_hours REAL
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {REVIEW_HISTOGRAM_TABLE} (
+            controller_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            reviews INTEGER NOT NULL,
+            PRIMARY KEY (controller_id, bucket)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {DOCUMENT_RULES_TABLE} (
+            document_id INTEGER NOT NULL,
+            rule_id TEXT NOT NULL,
+            violations INTEGER NOT NULL,
+            PRIMARY KEY (document_id, rule_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {RULE_STATS_TABLE} (
+            rule_id TEXT PRIMARY KEY,
+            documents INTEGER NOT NULL,
+            violations INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+    # Счетчики документов по статусу и нормоконтролёру ведут триггеры
+    add_document = f'''
+        INSERT INTO {STATUS_COUNTS_TABLE} (status, controller_id, documents)
+        VALUES (NEW.status, coalesce(NEW.current_controller_id, {UNASSIGNED_CONTROLLER}), 1)
+        ON CONFLICT (status, controller_id) DO UPDATE SET documents = documents + 1;
+    '''
+    remove_document = f'''
+        UPDATE {STATUS_COUNTS_TABLE} SET documents = documents - 1
+        WHERE status = OLD.status AND controller_id = coalesce(OLD.current_controller_id, {UNASSIGNED_CONTROLLER});
+    '''
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS documents_status_counts_insert AFTER INSERT ON documents
+        BEGIN {add_document} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS documents_status_counts_update
+        AFTER UPDATE OF status, current_controller_id ON documents
+        WHEN OLD.status IS NOT NEW.status OR OLD.current_controller_id IS NOT NEW.current_controller_id
+        BEGIN {remove_document} {add_document} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS documents_status_counts_delete AFTER DELETE ON documents
+        BEGIN {remove_document} END
+    ''')
+    return created
+
+
+def record_review(cursor, controller_id: int, hours: float):
+    """Учет одной проверки документа нормоконтролёром (hours - время проверки)"""
+    record_reviews(cursor, controller_id, [hours])
+
+
+def record_reviews(cursor, controller_id: int, hours_list: list):
+    """Учет нескольких проверок нормоконтролёра: одна запись на корзину гистограммы"""
+    if not hours_list:
+        return
+    cursor.execute(f'''
+        INSERT INTO {REVIEW_STATS_TABLE} (controller_id, reviews, total_hours, min_hours, max_hours)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (controller_id) DO UPDATE SET
+            reviews = reviews + excluded.reviews,
+            total_hours = total_hours + excluded.total_hours,
+            min_hours = min(coalesce(min_hours, excluded.min_hours), excluded.min_hours),
+            max_hours = max(coalesce(max_hours, excluded.max_hours), excluded.max_hours)
+    ''', (controller_id, len(hours_list), sum(hours_list), min(hours_list), max(hours_list)))
+    buckets = Counter(review_time_bucket(hours) for hours in hours_list)
+    cursor.executemany(f'''
+        INSERT INTO {REVIEW_HISTOGRAM_TABLE} (controller_id, bucket, reviews) VALUES (?, ?, ?)
+        ON CONFLICT (controller_id, bucket) DO UPDATE SET reviews = reviews + excluded.reviews
+    ''', [(controller_id, bucket, reviews) for bucket, reviews in buckets.items()])
+
+
+def record_document_violations(cursor, document_id: int, violations: list):
+    """Замена счетчиков замечаний документа по правилам (новый документ, замена, перепроверка)"""
+    cursor.execute(f'SELECT rule_id, violations FROM {DOCUMENT_RULES_TABLE} WHERE document_id = ?',
+                   (document_id,))
+    old_counts = cursor.fetchall()
+    if old_counts:
+        cursor.executemany(f'''
+            UPDATE {RULE_STATS_TABLE} SET documents = documents - 1, violations = violations - ?
+            WHERE rule_id = ?
+        ''', [(count, rule_id) for rule_id, count in old_counts])
+        cursor.execute(f'DELETE FROM {DOCUMENT_RULES_TABLE} WHERE document_id = ?', (document_id,))
+
+    counts = Counter(violation.get('rule_id') for violation in violations if violation.get('rule_id'))
+    cursor.executemany(f'INSERT INTO {DOCUMENT_RULES_TABLE} (document_id, rule_id, violations) VALUES (?, ?, ?)',
+                       [(document_id, rule_id, count) for rule_id, count in counts.items()])
+    cursor.executemany(f'''
+        INSERT INTO {RULE_STATS_TABLE} (rule_id, documents, violations) VALUES (?, 1, ?)
+        ON CONFLICT (rule_id) DO UPDATE SET documents = documents + 1, violations = violations + excluded.violations
+    ''', list(counts.items()))
+
+
+def _stored_violations(auto_check_result: str) -> list:
+    try:
+        return ast.literal_eval(auto_check_result).get('violations', [])
+    except (ValueError, SyntaxError, AttributeError):
+        return []
+
+
+def rebuild_stats(cursor):
+    """Заполнение статистики по существующим документам (при появлении таблиц в старой базе).
+
+    Время проверки в documents хранится только для последней проверки
+    документа, поэтому по старым документам учитывается одна проверка.
+    """
+    for table in (STATUS_COUNTS_TABLE, REVIEW_STATS_TABLE, REVIEW_HISTOGRAM_TABLE,
+                  DOCUMENT_RULES_TABLE, RULE_STATS_TABLE):
+        cursor.execute(f'DELETE FROM {table}')
+
+    cursor.execute(f'''
+        INSERT INTO {STATUS_COUNTS_TABLE} (status, controller_id, documents)
+        SELECT status, coalesce(current_controller_id, {UNASSIGNED_CONTROLLER}), COUNT(*)
+        FROM documents GROUP BY 1, 2
+    ''')
+    cursor.execute('''
+        SELECT current_controller_id, controller_review_time FROM documents
+        WHERE current_controller_id IS NOT NULL AND controller_review_time > 0
+    ''')
+    for controller_id, hours in cursor.fetchall():
+        record_review(cursor, controller_id, hours)
+    cursor.execute('SELECT id, auto_check_result FROM documents WHERE auto_check_result IS NOT NULL')
+    for document_id, auto_check_result in cursor.fetchall():
+        record_document_violations(cursor, document_id, _stored_violations(auto_check_result))
+
+
+def read_stats(cursor, queue_statuses: tuple) -> dict:
+    """Сводка для панели статистики: только чтение агрегатов"""
+    cursor.execute(f'SELECT status, controller_id, documents FROM {STATUS_COUNTS_TABLE} WHERE documents > 0')
+    status_counts = cursor.fetchall()
+    cursor.execute(f'SELECT controller_id, reviews, total_hours, min_hours, max_hours FROM {REVIEW_STATS_TABLE}')
+    review_stats = {row[0]: row[1:] for row in cursor.fetchall()}
+    cursor.execute(f'SELECT controller_id, bucket, reviews FROM {REVIEW_HISTOGRAM_TABLE}')
+    histograms = {}
+    for controller_id, bucket, reviews in cursor.fetchall():
+        histograms.setdefault(controller_id, {})[bucket] = reviews
+    cursor.execute(f'''
+        SELECT rule_id, documents, violations FROM {RULE_STATS_TABLE}
+        WHERE documents > 0 ORDER BY documents DESC, rule_id
+    ''')
+    rule_stats = cursor.fetchall()
+
+    total_documents = sum(row[2] for row in status_counts)
+    by_status = Counter()
+    queues = Counter()
+    for status, controller_id, documents in status_counts:
+        by_status[status] += documents
+        if status in queue_statuses:
+            queues[controller_id] += documents
+
+    controllers = {}
+    for controller_id in set(queues) | set(review_stats):
+        if controller_id == UNASSIGNED_CONTROLLER:
+            continue
+        reviews, total_hours, min_hours, max_hours = review_stats.get(controller_id, (0, 0.0, None, None))
+        histogram = histograms.get(controller_id, {})
+        controllers[controller_id] = {
+            'controller_id': controller_id,
+            'queue_length': queues.get(controller_id, 0),
+            'reviews': reviews,
+            'mean_review_hours': total_hours / reviews if reviews else None,
+            **{f'p{p}_review_hours': histogram_percentile(histogram, p, min_hours, max_hours)
+               for p in REVIEW_PERCENTILES}
+        }
+
+    return {
+        'total_documents': total_documents,
+        'documents_by_status': dict(by_status),
+        'unassigned_queue_length': queues.get(UNASSIGNED_CONTROLLER, 0),
+        'controllers': controllers,
+        'rules': [
+            {
+                'rule_id': rule_id,
+                'documents': documents,
+                'violations': violations,
+                'document_share': documents / total_documents if total_documents else 0.0
+            }
+            for rule_id, documents, violations in rule_stats
+        ]
+    }